@@ -0,0 +1,145 @@
+# app/admission.py
+"""
+Admission control in front of the Agent layer.
+
+A burst of guests must not turn into a burst of Agent runs: past the service's rate limit every
+run just retries and backs off until the 30 s deadline, and nobody gets an answer. Instead:
+
+  - at most AGENT_MAX_INFLIGHT turns talk to the Agent at once (0 = no limit);
+  - the rest wait in a bounded queue (AGENT_QUEUE_MAX) that is fair across sessions: waiters are
+    kept per sid and a freed slot goes to the next session in round-robin order, so one guest
+    tapping chips cannot starve the others;
+  - a waiter gets AGENT_QUEUE_WAIT_SECS; when the queue is full or the wait runs out the turn is
+    shed at once (AdmissionRejected) and the caller answers with its fallback briefing plus a
+    `retry_after` hint (AGENT_BUSY_RETRY_SECS) the UI uses to say "HARCi is thinking…" and retry.
+
+Everything runs on the event loop; no locks needed.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+try:
+    from .metrics import ADMISSION_WAIT
+except Exception:
+    from metrics import ADMISSION_WAIT  # type: ignore
+
+AGENT_MAX_INFLIGHT    = int(os.getenv("AGENT_MAX_INFLIGHT", "32"))
+AGENT_QUEUE_MAX       = int(os.getenv("AGENT_QUEUE_MAX", "256"))
+AGENT_QUEUE_WAIT_SECS = float(os.getenv("AGENT_QUEUE_WAIT_SECS", "8"))
+AGENT_BUSY_RETRY_SECS = float(os.getenv("AGENT_BUSY_RETRY_SECS", "3"))
+
+
+class AdmissionRejected(Exception):
+    """The turn was shed: queue full or waited too long. `retry_after` is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """One caller's place: admitted right away, or waiting in its session's queue."""
+    __slots__ = ("sid", "state", "position", "_fut", "_t0")
+
+    def __init__(self, sid: str):
+        self.sid = sid
+        self.state = "admitted"        # admitted | waiting | released
+        self.position = 0              # queue depth when it joined (0 = not queued)
+        self._fut: Optional[asyncio.Future] = None
+        self._t0 = time.perf_counter()
+
+    @property
+    def queued(self) -> bool:
+        return self.state == "waiting"
+
+
+class AdmissionController:
+    def __init__(self, *, limit: int = AGENT_MAX_INFLIGHT, queue_max: int = AGENT_QUEUE_MAX,
+                 max_wait: float = AGENT_QUEUE_WAIT_SECS, retry_after: float = AGENT_BUSY_RETRY_SECS):
+        self.limit = limit
+        self.queue_max = queue_max
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.waiting = 0
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self.counters = {"admitted": 0, "queued": 0, "shed_full": 0, "shed_timeout": 0}
+
+    def enter(self, sid: Optional[str]) -> Ticket:
+        """Take a slot or a place in the queue; AdmissionRejected when the queue is full."""
+        t = Ticket(sid or "")
+        if self.limit <= 0 or (self.inflight < self.limit and not self.waiting):
+            self.inflight += 1
+            self.counters["admitted"] += 1
+            return t
+        if self.waiting >= self.queue_max:
+            self.counters["shed_full"] += 1
+            raise AdmissionRejected("queue_full", self.retry_after)
+        t.state = "waiting"
+        t._fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(t.sid, deque()).append(t)
+        self.waiting += 1
+        t.position = self.waiting
+        self.counters["queued"] += 1
+        return t
+
+    async def wait(self, t: Ticket):
+        """Return once admitted; AdmissionRejected after max_wait in the queue."""
+        if t.state == "waiting":
+            try:
+                done, _ = await asyncio.wait((t._fut,), timeout=self.max_wait)
+            except BaseException:
+                self.release(t)
+                raise
+            if not done:
+                self.release(t)
+                self.counters["shed_timeout"] += 1
+                ADMISSION_WAIT.observe(time.perf_counter() - t._t0, "shed")
+                raise AdmissionRejected("timeout", self.retry_after)
+            self.counters["admitted"] += 1
+        ADMISSION_WAIT.observe(time.perf_counter() - t._t0, "admitted")
+
+    def release(self, t: Ticket):
+        """Give back the slot (or the place in the queue). Idempotent."""
+        if t.state == "admitted":
+            self.inflight -= 1
+            self._grant()
+        elif t.state == "waiting":
+            q = self._queues.get(t.sid)
+            if q is not None:
+                q.remove(t)
+                if not q:
+                    del self._queues[t.sid]
+            self.waiting -= 1
+        t.state = "released"
+
+    def _grant(self):
+        while self.inflight < self.limit and self._queues:
+            sid, q = next(iter(self._queues.items()))
+            t = q.popleft()
+            if q:
+                self._queues.move_to_end(sid)   # round-robin: this session's next waiter goes last
+            else:
+                del self._queues[sid]
+            self.waiting -= 1
+            self.inflight += 1
+            t.state = "admitted"
+            t._fut.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, sid: Optional[str]):
+        t = self.enter(sid)
+        try:
+            await self.wait(t)
+            yield t
+        finally:
+            self.release(t)
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "inflight": self.inflight, "waiting": self.waiting,
+                "queue_max": self.queue_max, "sessions_waiting": len(self._queues), **self.counters}
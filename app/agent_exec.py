@@ -0,0 +1,236 @@
+# app/agent_exec.py
+"""
+Async execution layer for Azure AI Agents calls.
+
+The handlers in main.py are `async def`, but the Agents SDK they were written
+against is synchronous. `AgentOps` gives them one awaitable surface either way:
+  - if the SDK's aio client is usable (azure.ai.projects.aio + aiohttp), calls are awaited natively;
+  - otherwise each sync call is pushed onto a bounded thread pool so the event loop keeps serving
+    /speech-token, static files and other guests while Azure is slow.
+"""
+import os
+import time
+import asyncio
+import logging
+import contextvars
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Optional, List, Any
+
+try:
+    from .metrics import AGENT_STAGE, AGENT_STAGE_ERRORS
+except Exception:
+    from metrics import AGENT_STAGE, AGENT_STAGE_ERRORS  # type: ignore
+
+log = logging.getLogger("harci.agent")
+
+# auto = use the aio client when installed; 1 = require it; 0 = always use the thread pool
+AGENT_ASYNC_CLIENT     = os.getenv("AGENT_ASYNC_CLIENT", "auto").lower()
+AGENT_EXECUTOR_WORKERS = int(os.getenv("AGENT_EXECUTOR_WORKERS", "32"))
+AGENT_RUN_TIMEOUT_SECS = float(os.getenv("AGENT_RUN_TIMEOUT_SECS", "30"))
+
+TERMINAL_RUN_STATES = ("completed", "failed", "cancelled", "expired")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Bounded pool shared by every blocking Agents call (sync SDK fallback)."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=AGENT_EXECUTOR_WORKERS, thread_name_prefix="harci-agent")
+    return _EXECUTOR
+
+
+def shutdown_executor():
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking callable on the agent pool and await its result. The caller's context
+    (log correlation ids) goes with it."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), partial(ctx.run, fn, *args, **kwargs))
+
+
+def async_sdk_available() -> bool:
+    """True when the aio AIProjectClient and its aiohttp transport are both importable."""
+    if AGENT_ASYNC_CLIENT in ("0", "false", "no"):
+        return False
+    try:
+        return bool(
+            importlib.util.find_spec("azure.ai.projects.aio")
+            and importlib.util.find_spec("azure.identity.aio")
+            and importlib.util.find_spec("aiohttp")
+        )
+    except Exception:
+        return False
+
+
+def run_status(run) -> str:
+    # RunStatus is a str-Enum; compare on its value, not on str(enum).
+    s = getattr(run, "status", None)
+    return str(getattr(s, "value", s) or "").lower()
+
+
+def event_name(event_type) -> str:
+    """AgentStreamEvent -> its wire name, e.g. 'thread.message.delta'."""
+    return str(getattr(event_type, "value", event_type) or "")
+
+
+def is_run_event(name: str) -> bool:
+    """thread.run.<status> events carry the ThreadRun; thread.run.step.* carry a RunStep, whose id is not
+    the run's (cancelling it would leave the run going)."""
+    return name.startswith("thread.run.") and not name.startswith("thread.run.step.")
+
+
+class _PumpError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_PUMP_DONE = object()
+
+
+class AgentOps:
+    """Awaitable facade over `AIProjectClient.agents`, sync or aio."""
+
+    def __init__(self, client, *, is_async: bool):
+        self.client = client
+        self.agents = client.agents
+        self.is_async = is_async
+
+    async def _call(self, stage: str, fn, *args, **kwargs):
+        """Await one SDK call, timed into harci_agent_stage_seconds{stage} (see metrics)."""
+        t0 = time.perf_counter()
+        try:
+            if self.is_async:
+                return await fn(*args, **kwargs)
+            return await run_blocking(fn, *args, **kwargs)
+        except Exception:
+            AGENT_STAGE_ERRORS.inc(stage)
+            raise
+        finally:
+            AGENT_STAGE.observe(time.perf_counter() - t0, stage)
+
+    @property
+    def can_get_message(self) -> bool:
+        return callable(getattr(self.agents.messages, "get", None))
+
+    @property
+    def can_stream(self) -> bool:
+        """False for SDK versions without runs.stream (the only reason to skip streaming for good)."""
+        return callable(getattr(self.agents.runs, "stream", None))
+
+    async def create_thread(self):
+        return await self._call("thread_create", self.agents.threads.create)
+
+    async def delete_thread(self, thread_id: str):
+        return await self._call("thread_delete", self.agents.threads.delete, thread_id)
+
+    async def create_message(self, thread_id: str, content: str, role: str = "user"):
+        return await self._call("message_create", self.agents.messages.create, thread_id=thread_id, role=role, content=content)
+
+    async def create_run(self, thread_id: str, agent_id: str, additional_instructions: Optional[str] = None):
+        return await self._call(
+            "run_create",
+            self.agents.runs.create,
+            thread_id=thread_id,
+            agent_id=agent_id,
+            additional_instructions=additional_instructions,
+        )
+
+    async def get_run(self, thread_id: str, run_id: str):
+        return await self._call("run_get", self.agents.runs.get, thread_id=thread_id, run_id=run_id)
+
+    async def cancel_run(self, thread_id: str, run_id: str):
+        return await self._call("run_cancel", self.agents.runs.cancel, thread_id=thread_id, run_id=run_id)
+
+    async def list_runs(self, thread_id: str, limit: int = 3) -> List[Any]:
+        """The thread's newest runs, newest first (first page only; the pager would walk the whole history)."""
+        if self.is_async:
+            async def first_page():
+                out = []
+                async for r in self.agents.runs.list(thread_id=thread_id, limit=limit):
+                    out.append(r)
+                    if len(out) >= limit:
+                        break
+                return out
+            return await self._call("run_list", first_page)
+        return await self._call("run_list", lambda: list(islice(self.agents.runs.list(thread_id=thread_id, limit=limit), limit)))
+
+    async def get_message(self, thread_id: str, message_id: str):
+        return await self._call("message_get", self.agents.messages.get, thread_id=thread_id, message_id=message_id)
+
+    async def list_messages(self, **kwargs) -> List[Any]:
+        # Paged iterators fetch lazily, so the sync one is drained on the pool, not on the loop.
+        if self.is_async:
+            async def drain():
+                return [m async for m in self.agents.messages.list(**kwargs)]
+            return await self._call("message_list", drain)
+        return await self._call("message_list", lambda: list(self.agents.messages.list(**kwargs)))
+
+    async def stream_run(self, thread_id: str, agent_id: str, additional_instructions: Optional[str] = None):
+        """Create a run via the streaming API and yield (event_name, event_data) as events arrive.
+        Timed as run_create (until the first event) and run_complete (first event to end of stream)."""
+        t0 = time.perf_counter()
+        t_first = None
+        stage = "run_create"
+        try:
+            async for item in self._stream_events(thread_id, agent_id, additional_instructions):
+                if t_first is None:
+                    t_first = time.perf_counter()
+                    AGENT_STAGE.observe(t_first - t0, "run_create")
+                    stage = "run_complete"
+                yield item
+        except Exception:
+            AGENT_STAGE_ERRORS.inc(stage)
+            raise
+        finally:
+            if t_first is not None:
+                AGENT_STAGE.observe(time.perf_counter() - t_first, "run_complete")
+
+    async def _stream_events(self, thread_id: str, agent_id: str, additional_instructions: Optional[str] = None):
+        kwargs = dict(thread_id=thread_id, agent_id=agent_id, additional_instructions=additional_instructions)
+        if self.is_async:
+            async with await self.agents.runs.stream(**kwargs) as stream:
+                async for event_type, event_data, _ in stream:
+                    yield event_name(event_type), event_data
+            return
+
+        # Sync SDK: drain the blocking iterator on the pool and hand events back through a queue.
+        loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue()
+
+        def pump():
+            try:
+                with self.agents.runs.stream(**kwargs) as stream:
+                    for event_type, event_data, _ in stream:
+                        loop.call_soon_threadsafe(q.put_nowait, (event_name(event_type), event_data))
+            except BaseException as e:
+                loop.call_soon_threadsafe(q.put_nowait, _PumpError(e))
+            finally:
+                loop.call_soon_threadsafe(q.put_nowait, _PUMP_DONE)
+
+        fut = loop.run_in_executor(get_executor(), pump)
+        while True:
+            item = await q.get()
+            if item is _PUMP_DONE:
+                break
+            if isinstance(item, _PumpError):
+                raise item.exc
+            yield item
+        await fut
+
+    async def close(self):
+        if self.is_async:
+            try:
+                await self.client.close()
+            except Exception:
+                pass
@@ -0,0 +1,156 @@
+# app/answer_cache.py
+"""
+Shared answers for the quick-chip prompts (Agenda, Venue Map, Speakers, Help, ...).
+
+Only allowlisted prompts are cached (ANSWER_CACHE_PROMPTS, compared after normalisation).
+The key is the normalised prompt + a hash of the event context the Agent is given
+(`build_assist_preamble` without the clock) + for "now / next" style prompts, a time bucket,
+so those answers never outlive ANSWER_CACHE_TIME_BUCKET_SECS.
+
+Entries expire after ANSWER_CACHE_TTL_SECS and the table is LRU-bounded by ANSWER_CACHE_MAX.
+Concurrent misses for one key are coalesced: the first request runs the Agent, the others
+wait for its answer (and fall back to their own run if it fails).
+"""
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger("harci.answers")
+
+ANSWER_CACHE              = os.getenv("ANSWER_CACHE", "1").lower() in ("1", "true", "yes")
+ANSWER_CACHE_PROMPTS      = os.getenv("ANSWER_CACHE_PROMPTS", "Agenda,Venue Map,Speakers,Help")
+ANSWER_CACHE_TTL_SECS     = float(os.getenv("ANSWER_CACHE_TTL_SECS", "900"))
+ANSWER_CACHE_MAX          = int(os.getenv("ANSWER_CACHE_MAX", "256"))
+ANSWER_CACHE_TIME_BUCKET  = float(os.getenv("ANSWER_CACHE_TIME_BUCKET_SECS", "300"))
+ANSWER_CACHE_WAIT_SECS    = float(os.getenv("ANSWER_CACHE_WAIT_SECS", "30"))  # follower wait on a leader
+
+_TIME_WORDS = re.compile(r"\b(now|next|current(ly)?|today|tonight|upcoming|later|soon|starting|ongoing)\b")
+
+
+def normalize_prompt(text: str) -> str:
+    s = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return " ".join(s.split())
+
+
+def is_time_sensitive(norm: str) -> bool:
+    return bool(_TIME_WORDS.search(norm))
+
+
+def context_hash(*parts: str) -> str:
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class AnswerCache:
+    def __init__(self, prompts: str = ANSWER_CACHE_PROMPTS, *, enabled: bool = ANSWER_CACHE,
+                 ttl: float = ANSWER_CACHE_TTL_SECS, max_entries: int = ANSWER_CACHE_MAX,
+                 time_bucket: float = ANSWER_CACHE_TIME_BUCKET):
+        self.enabled = enabled
+        self.allow = {normalize_prompt(p) for p in prompts.split(",") if p.strip()}
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.time_bucket = max(1.0, time_bucket)
+        self._entries: "OrderedDict[str, Tuple[dict, float, str]]" = OrderedDict()  # key -> (payload, expires, prompt)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0,
+                         "expired": 0, "invalidated": 0, "skipped": 0,
+                         "thread_appends": 0, "thread_append_failures": 0}
+
+    def key_for(self, text: str, ctx: str) -> Optional[str]:
+        """Cache key for `text`, or None when the prompt isn't cacheable."""
+        if not self.enabled:
+            return None
+        norm = normalize_prompt(text)
+        if norm not in self.allow:
+            return None
+        key = f"{norm}|{ctx}"
+        if is_time_sensitive(norm):
+            key += f"|t{int(time.time() // self.time_bucket)}"
+        return key
+
+    def _ttl_for(self, key: str) -> float:
+        if "|t" not in key:
+            return self.ttl
+        bucket_end = (int(time.time() // self.time_bucket) + 1) * self.time_bucket
+        return max(1.0, min(self.ttl, bucket_end - time.time()))
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        payload, expires_at, _ = item
+        if expires_at <= time.time():
+            self._entries.pop(key, None)
+            self.counters["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    async def lookup(self, key: str) -> Optional[dict]:
+        """A stored answer, or the answer of a request already computing this key; None on a miss."""
+        payload = self.get(key)
+        if payload is not None:
+            self.counters["hits"] += 1
+            return payload
+        fut = self._inflight.get(key)
+        if fut is not None:
+            try:
+                payload = await asyncio.wait_for(asyncio.shield(fut), ANSWER_CACHE_WAIT_SECS)
+            except Exception:
+                payload = None
+            if payload is not None:
+                self.counters["coalesced"] += 1
+                return payload
+        self.counters["misses"] += 1
+        return None
+
+    def claim(self, key: str) -> bool:
+        """Become the request that fills `key`. False when another request already is."""
+        if key in self._inflight:
+            return False
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return True
+
+    def _settle(self, key: str, payload: Optional[dict]):
+        fut = self._inflight.pop(key, None)
+        if fut is not None and not fut.done():
+            fut.set_result(payload)
+
+    def fill(self, key: str, payload: dict):
+        self._entries[key] = (payload, time.time() + self._ttl_for(key), key.split("|", 1)[0])
+        self._entries.move_to_end(key)
+        self.counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+        self._settle(key, payload)
+
+    def abandon(self, key: str):
+        """The claiming request produced nothing cacheable; release any waiters to run their own turn."""
+        self._settle(key, None)
+
+    def invalidate(self, prompt: Optional[str] = None) -> int:
+        if prompt:
+            norm = normalize_prompt(prompt)
+            keys = [k for k, (_, _, p) in self._entries.items() if p == norm]
+        else:
+            keys = list(self._entries)
+        for k in keys:
+            self._entries.pop(k, None)
+        self.counters["invalidated"] += len(keys)
+        return len(keys)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["coalesced"] + self.counters["misses"]
+        served = self.counters["hits"] + self.counters["coalesced"]
+        return {
+            "enabled": self.enabled,
+            "prompts": sorted(self.allow),
+            "entries": len(self._entries),
+            "hit_ratio": round(served / lookups, 3) if lookups else None,
+            **self.counters,
+        }
@@ -0,0 +1,188 @@
+# app/credentials.py
+"""
+Token-caching wrappers for the Azure credential used by the Agents client.
+
+`DefaultAzureCredential` walks its chain and talks to AAD/IMDS whenever the SDK's bearer policy
+asks for a token, i.e. on the request path. These wrappers
+  - prefetch the token at startup (main.py's init stage), so the chain walk happens before traffic;
+  - serve it from cache while it has more than AGENT_TOKEN_MIN_VALID_SECS left;
+  - renew it in the background once it is within AGENT_TOKEN_REFRESH_AHEAD_SECS of expiry
+    (`refresh_due()`, driven by a lifespan task), well before the SDK policy's own 5-minute window.
+Requests carrying CAE `claims` always go to the inner credential.
+
+AZURE_CREDENTIAL=static swaps DefaultAzureCredential for a fixed bearer token
+(AZURE_STATIC_TOKEN) — only for local stand-ins such as scripts/fake_azure.py.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger("harci.credentials")
+
+AGENT_TOKEN_SCOPE              = os.getenv("AGENT_TOKEN_SCOPE", "https://ai.azure.com/.default")
+AGENT_TOKEN_REFRESH_AHEAD_SECS = float(os.getenv("AGENT_TOKEN_REFRESH_AHEAD_SECS", "900"))
+AGENT_TOKEN_MIN_VALID_SECS     = float(os.getenv("AGENT_TOKEN_MIN_VALID_SECS", "330"))
+AZURE_CREDENTIAL               = os.getenv("AZURE_CREDENTIAL", "default").lower()   # default | static
+AZURE_STATIC_TOKEN             = os.getenv("AZURE_STATIC_TOKEN", "local-fake-token")
+
+_Key = Tuple[Tuple[str, ...], Optional[str]]
+
+
+def _key(scopes, kwargs) -> _Key:
+    return tuple(scopes), kwargs.get("tenant_id")
+
+
+class _TokenCache:
+    def __init__(self, inner, refresh_ahead: float, min_valid: float):
+        self.inner = inner
+        self.refresh_ahead = refresh_ahead
+        self.min_valid = min_valid
+        self._tokens: Dict[_Key, object] = {}          # key -> AccessToken
+        self._requests: Dict[_Key, Tuple[tuple, dict]] = {}
+        self.counters = {"hits": 0, "fetches": 0, "refreshes": 0, "refresh_failures": 0}
+
+    def _fresh(self, key: _Key, min_left: float):
+        tok = self._tokens.get(key)
+        if tok is not None and tok.expires_on - time.time() > min_left:
+            return tok
+        return None
+
+    def _store(self, key: _Key, scopes, kwargs, tok):
+        self._tokens[key] = tok
+        self._requests[key] = (tuple(scopes), dict(kwargs))
+        self.counters["fetches"] += 1
+
+    def _due(self):
+        now = time.time()
+        return [k for k, t in self._tokens.items() if t.expires_on - now <= self.refresh_ahead]
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            **self.counters,
+            "tokens": {" ".join(k[0]): round(t.expires_on - now) for k, t in self._tokens.items()},
+        }
+
+
+class PrefetchingCredential(_TokenCache):
+    """Sync TokenCredential (called from the agent thread pool)."""
+
+    def __init__(self, inner, *, refresh_ahead: float = AGENT_TOKEN_REFRESH_AHEAD_SECS,
+                 min_valid: float = AGENT_TOKEN_MIN_VALID_SECS):
+        super().__init__(inner, refresh_ahead, min_valid)
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes, **kwargs):
+        if kwargs.get("claims"):
+            return self.inner.get_token(*scopes, **kwargs)
+        key = _key(scopes, kwargs)
+        tok = self._fresh(key, self.min_valid)
+        if tok is not None:
+            self.counters["hits"] += 1
+            return tok
+        with self._lock:
+            tok = self._fresh(key, self.min_valid)
+            if tok is None:
+                tok = self.inner.get_token(*scopes, **kwargs)
+                self._store(key, scopes, kwargs, tok)
+            return tok
+
+    async def prefetch(self, scope: str = AGENT_TOKEN_SCOPE):
+        await asyncio.to_thread(self.get_token, scope)
+
+    async def refresh_due(self):
+        for key in self._due():
+            scopes, kwargs = self._requests[key]
+            try:
+                tok = await asyncio.to_thread(self.inner.get_token, *scopes, **kwargs)
+            except Exception as e:
+                self.counters["refresh_failures"] += 1
+                log.warning("background token refresh failed (%s): %s", " ".join(scopes), e)
+                continue
+            with self._lock:
+                self._tokens[key] = tok
+            self.counters["refreshes"] += 1
+
+    def close(self):
+        close = getattr(self.inner, "close", None)
+        if callable(close):
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncPrefetchingCredential(_TokenCache):
+    """aio AsyncTokenCredential counterpart."""
+
+    def __init__(self, inner, *, refresh_ahead: float = AGENT_TOKEN_REFRESH_AHEAD_SECS,
+                 min_valid: float = AGENT_TOKEN_MIN_VALID_SECS):
+        super().__init__(inner, refresh_ahead, min_valid)
+        self._lock = asyncio.Lock()
+
+    async def get_token(self, *scopes, **kwargs):
+        if kwargs.get("claims"):
+            return await self.inner.get_token(*scopes, **kwargs)
+        key = _key(scopes, kwargs)
+        tok = self._fresh(key, self.min_valid)
+        if tok is not None:
+            self.counters["hits"] += 1
+            return tok
+        async with self._lock:
+            tok = self._fresh(key, self.min_valid)
+            if tok is None:
+                tok = await self.inner.get_token(*scopes, **kwargs)
+                self._store(key, scopes, kwargs, tok)
+            return tok
+
+    async def prefetch(self, scope: str = AGENT_TOKEN_SCOPE):
+        await self.get_token(scope)
+
+    async def refresh_due(self):
+        for key in self._due():
+            scopes, kwargs = self._requests[key]
+            try:
+                self._tokens[key] = await self.inner.get_token(*scopes, **kwargs)
+            except Exception as e:
+                self.counters["refresh_failures"] += 1
+                log.warning("background token refresh failed (%s): %s", " ".join(scopes), e)
+                continue
+            self.counters["refreshes"] += 1
+
+    async def close(self):
+        await self.inner.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class StaticTokenCredential:
+    """Sync TokenCredential returning AZURE_STATIC_TOKEN, valid for an hour from each call."""
+
+    def __init__(self, token: str = AZURE_STATIC_TOKEN, ttl: float = 3600):
+        self.token = token
+        self.ttl = ttl
+
+    def get_token(self, *scopes, **kwargs):
+        from azure.core.credentials import AccessToken
+        return AccessToken(self.token, int(time.time() + self.ttl))
+
+    def close(self):
+        pass
+
+
+class AsyncStaticTokenCredential(StaticTokenCredential):
+    async def get_token(self, *scopes, **kwargs):
+        return StaticTokenCredential.get_token(self, *scopes, **kwargs)
+
+    async def close(self):
+        pass
@@ -0,0 +1,89 @@
+# app/http_pool.py
+"""
+Application-lifetime HTTP clients for the Speech STS and Avatar relay endpoints.
+
+One pooled `httpx.AsyncClient` per Speech region, so token calls reuse warm TCP+TLS
+connections (and HTTP/2 when `h2` is installed) instead of handshaking on every request.
+The registry is created and closed by the FastAPI lifespan hook in main.py.
+"""
+import os
+import asyncio
+import logging
+import importlib.util
+from typing import Dict, Optional
+
+import httpx
+
+log = logging.getLogger("harci.http")
+
+SPEECH_HTTP_POOL        = os.getenv("SPEECH_HTTP_POOL", "1").lower() in ("1", "true", "yes")
+SPEECH_HTTP2            = os.getenv("SPEECH_HTTP2", "1").lower() in ("1", "true", "yes")
+SPEECH_HTTP_MAX_CONN    = int(os.getenv("SPEECH_HTTP_MAX_CONN", "50"))
+SPEECH_HTTP_KEEPALIVE   = int(os.getenv("SPEECH_HTTP_KEEPALIVE", "20"))
+SPEECH_HTTP_KEEPALIVE_S = float(os.getenv("SPEECH_HTTP_KEEPALIVE_SECS", "60"))
+SPEECH_HTTP_CONNECT_S   = float(os.getenv("SPEECH_HTTP_CONNECT_SECS", "3"))
+SPEECH_HTTP_READ_S      = float(os.getenv("SPEECH_HTTP_READ_SECS", "10"))
+
+
+def _http2_available() -> bool:
+    return SPEECH_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+class HttpClientRegistry:
+    """Lazily creates one AsyncClient per key (Speech region); all closed together on shutdown."""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._closed = False
+        self.http2 = _http2_available()
+        self.limits = httpx.Limits(
+            max_connections=SPEECH_HTTP_MAX_CONN,
+            max_keepalive_connections=SPEECH_HTTP_KEEPALIVE,
+            keepalive_expiry=SPEECH_HTTP_KEEPALIVE_S,
+        )
+        self.timeout = httpx.Timeout(SPEECH_HTTP_READ_S, connect=SPEECH_HTTP_CONNECT_S)
+
+    def get(self, key: str) -> httpx.AsyncClient:
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+            self._clients[key] = client
+        return client
+
+    def stats(self) -> dict:
+        return {"http2": self.http2, "clients": sorted(self._clients)}
+
+    async def aclose(self):
+        self._closed = True
+        clients, self._clients = list(self._clients.values()), {}
+        results = await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+        for r in results:
+            if isinstance(r, Exception):
+                log.warning("http client close failed: %s", r)
+
+
+_REGISTRY: Optional[HttpClientRegistry] = None
+
+
+def start_registry() -> HttpClientRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = HttpClientRegistry()
+        log.info("Speech HTTP pool ready (http2=%s)", _REGISTRY.http2)
+    return _REGISTRY
+
+
+async def stop_registry():
+    global _REGISTRY
+    if _REGISTRY is not None:
+        reg, _REGISTRY = _REGISTRY, None
+        await reg.aclose()
+
+
+async def request(region: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send through the region's pooled client (or a one-shot client when pooling is disabled)."""
+    if not SPEECH_HTTP_POOL:
+        async with httpx.AsyncClient(timeout=SPEECH_HTTP_READ_S) as client:
+            return await client.request(method, url, **kwargs)
+    # Works before the lifespan hook has run too (e.g. tests driving the ASGI app directly)
+    return await start_registry().get(region).request(method, url, **kwargs)
@@ -0,0 +1,301 @@
+# app/knowledge.py
+"""
+Local answers for the questions that have fixed answers (agenda slots, rooms, speakers, FAQ),
+so they cost no Agent run and still work while Azure is down.
+
+EVENT_CONTENT_FILE (YAML or JSON) holds the event content, see app/content/event.example.yaml:
+
+  event:    name, venue, map {url, alt}
+  agenda:   [{time, title, room, speaker, description, keywords}]
+  speakers: [{name, role, company, bio, image {url, alt}, keywords}]
+  venue:    [{name, location, directions, image, keywords}]
+  faq:      [{q, a, briefing_md, image, keywords}]
+
+Every entry becomes one document with a ready answer in the payload shape (narration /
+briefing_md / image); `narration` or `briefing_md` on an entry override the generated text.
+Each section also gets an overview document ("Agenda", "Speakers", "Venue Map").
+
+Retrieval is BM25 (k1/b below) over an inverted index whose postings carry precomputed
+per-document term weights, so a lookup is a few dict reads and additions — a few microseconds
+for an event-sized corpus, no NumPy needed. A match is only used when it is confident:
+
+  - confidence = share of the query's IDF mass found in the best document (query words the
+    content never mentions, e.g. "parking", pull it down), >= KNOWLEDGE_MIN_CONFIDENCE;
+  - the best document beats the runner-up by KNOWLEDGE_MIN_MARGIN (relative BM25 score).
+
+Otherwise the turn goes to the Agent. When the Agent is unavailable the fallback takes the best
+match at KNOWLEDGE_FALLBACK_CONFIDENCE, margin ignored, before the generic brief.
+"""
+import os
+import re
+import json
+import math
+import time
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger("harci.knowledge")
+
+EVENT_CONTENT_FILE            = os.getenv("EVENT_CONTENT_FILE", "")
+KNOWLEDGE_MIN_CONFIDENCE      = float(os.getenv("KNOWLEDGE_MIN_CONFIDENCE", "0.75"))
+KNOWLEDGE_MIN_MARGIN          = float(os.getenv("KNOWLEDGE_MIN_MARGIN", "0.15"))
+KNOWLEDGE_FALLBACK_CONFIDENCE = float(os.getenv("KNOWLEDGE_FALLBACK_CONFIDENCE", "0.4"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from have how i in is it its me my of on or
+please show should tell that the this to was what when where which who whom will with would you
+your about any there get find know let lets give today time start here
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    out = []
+    for w in _WORD.findall((text or "").lower()):
+        if w in _STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]   # crude plural folding: "speakers" ~ "speaker", "sessions" ~ "session"
+        out.append(w)
+    return out
+
+
+def _image(v) -> Optional[dict]:
+    if isinstance(v, str) and v:
+        return {"url": v, "alt": ""}
+    if isinstance(v, dict) and v.get("url"):
+        return {"url": v["url"], "alt": v.get("alt", "")}
+    return None
+
+
+def _s(v) -> str:
+    return str(v).strip() if v is not None else ""
+
+
+def _first_sentence(text: str) -> str:
+    m = re.match(r"(.+?[.!?])(\s|$)", text or "")
+    return m.group(1) if m else (text or "")
+
+
+class _Doc:
+    __slots__ = ("title", "fields", "payload")
+
+    def __init__(self, title: str, fields: List[Tuple[str, int]], payload: dict):
+        self.title = title
+        self.fields = fields            # (text, weight): weight repeats the field's terms
+        self.payload = payload
+
+
+def _payload(entry: dict, narration: str, briefing_md: str, image=None) -> dict:
+    return {"narration": _s(entry.get("narration")) or narration,
+            "briefing_md": _s(entry.get("briefing_md")) or briefing_md,
+            "image": _image(entry.get("image")) or image}
+
+
+def _keywords(entry: dict) -> str:
+    kw = entry.get("keywords") or []
+    return " ".join(kw) if isinstance(kw, list) else _s(kw)
+
+
+def build_documents(content: dict) -> List[_Doc]:
+    """Turn the content file into answerable documents (entries + one overview per section)."""
+    event = content.get("event") or {}
+    event_map = _image(event.get("map"))
+    docs: List[_Doc] = []
+
+    agenda = [a for a in content.get("agenda") or [] if isinstance(a, dict) and a.get("title")]
+    for a in agenda:
+        title, when, room, who = _s(a["title"]), _s(a.get("time")), _s(a.get("room")), _s(a.get("speaker"))
+        narration = f"{title} is at {when}" if when else title
+        narration += f" in {room}" if room else ""
+        narration += f", with {who}." if who else "."
+        md = [f"### {title}"] + [f"- {k}: {v}" for k, v in (("Time", when), ("Room", room), ("Speaker", who)) if v]
+        if a.get("description"):
+            md.append(f"- {_s(a['description'])}")
+        docs.append(_Doc(title, [(title, 3), (_keywords(a), 3), (who, 2), (room, 1), (when, 1),
+                                 (_s(a.get("description")), 1), ("session", 1)],
+                         _payload(a, narration, "\n".join(md))))
+    if agenda:
+        lines = [f"- {_s(a.get('time'))} {_s(a['title'])}" + (f" ({_s(a['room'])})" if a.get("room") else "")
+                 for a in agenda]
+        first = agenda[0]
+        narration = f"Here is today's agenda. It starts with {_s(first['title'])}" + \
+                    (f" at {_s(first['time'])}." if first.get("time") else ".")
+        docs.append(_Doc("Agenda", [("agenda schedule program timetable sessions today", 3)],
+                         {"narration": narration, "briefing_md": "### Agenda\n" + "\n".join(lines), "image": None}))
+
+    speakers = [s for s in content.get("speakers") or [] if isinstance(s, dict) and s.get("name")]
+    for sp in speakers:
+        name, role, company, bio = _s(sp["name"]), _s(sp.get("role")), _s(sp.get("company")), _s(sp.get("bio"))
+        talks = [a for a in agenda if name.lower() in _s(a.get("speaker")).lower()]
+        who = f"{role} at {company}" if role and company else (role or company)
+        narration = f"{name}" + (f" is {who}." if who else ".")
+        if bio:
+            narration += " " + _first_sentence(bio)
+        if talks:
+            narration += f" Catch them at {_s(talks[0]['title'])}" + \
+                         (f", {_s(talks[0]['time'])}." if talks[0].get("time") else ".")
+        md = [f"### {name}"] + ([f"- {who}"] if who else []) + ([f"- {bio}"] if bio else [])
+        md += [f"- Session: {_s(a['title'])}" + (f" ({_s(a.get('time'))})" if a.get("time") else "") for a in talks]
+        docs.append(_Doc(name, [(name, 3), (_keywords(sp), 3), (role, 1), (company, 1), (bio, 1), ("bio profile", 1)],
+                         _payload(sp, narration, "\n".join(md))))
+    if speakers:
+        lines = [f"- **{_s(s['name'])}**" + (f" — {_s(s.get('role'))}" if s.get("role") else "") for s in speakers]
+        names = ", ".join(_s(s["name"]) for s in speakers[:3])
+        docs.append(_Doc("Speakers", [("speakers lineup presenters panelists", 3)],
+                         {"narration": f"Today's speakers include {names}.",
+                          "briefing_md": "### Speakers\n" + "\n".join(lines), "image": None}))
+
+    venue = [v for v in content.get("venue") or [] if isinstance(v, dict) and v.get("name")]
+    for v in venue:
+        name, where, how = _s(v["name"]), _s(v.get("location")), _s(v.get("directions"))
+        narration = f"{name} is {where}." if where else f"{name}."
+        if how:
+            narration += " " + how
+        md = [f"### {name}"] + [f"- {x}" for x in (where, how) if x]
+        docs.append(_Doc(name, [(name, 3), (_keywords(v), 3), (where, 1), (how, 1), ("room location", 1)],
+                         _payload(v, narration, "\n".join(md), event_map)))
+    if venue or event_map:
+        lines = [f"- {_s(v['name'])}: {_s(v.get('location'))}" for v in venue]
+        where = _s(event.get("venue"))
+        docs.append(_Doc("Venue Map", [("venue map floor plan rooms layout directions", 3), (where, 1)],
+                         {"narration": "The venue map is on screen." + (f" We're at {where}." if where else ""),
+                          "briefing_md": "### Venue\n" + "\n".join(lines), "image": event_map}))
+
+    for f in content.get("faq") or []:
+        if not isinstance(f, dict) or not f.get("q") or not f.get("a"):
+            continue
+        q, a = _s(f["q"]), _s(f["a"])
+        docs.append(_Doc(q, [(q, 3), (_keywords(f), 3), (a, 1)], _payload(f, a, f"### {q}\n- {a}")))
+    return docs
+
+
+def load_content(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as fh:
+        raw = fh.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError(f"{path}: PyYAML is needed for YAML content files (or use JSON)") from None
+        data = yaml.safe_load(raw)
+    else:
+        data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a mapping at the top level")
+    return data
+
+
+class KnowledgeIndex:
+    def __init__(self, path: str = EVENT_CONTENT_FILE, *, min_confidence: float = KNOWLEDGE_MIN_CONFIDENCE,
+                 min_margin: float = KNOWLEDGE_MIN_MARGIN, fallback_confidence: float = KNOWLEDGE_FALLBACK_CONFIDENCE):
+        self.path = path
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.fallback_confidence = fallback_confidence
+        self._docs: List[_Doc] = []
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}   # term -> [(doc, bm25 weight)]
+        self._idf: Dict[str, float] = {}
+        self._unseen_idf = 0.0
+        self.loaded_at = 0.0
+        self.counters = {"lookups": 0, "hits": 0, "fallback_hits": 0, "low_confidence": 0, "ambiguous": 0,
+                         "no_match": 0}
+        self._lookup_ns = 0
+        self._lookup_max_ns = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._docs)
+
+    def load(self, path: Optional[str] = None) -> int:
+        """(Re)build the index from the content file. Keeps the previous index if it fails."""
+        path = self.path if path is None else path
+        self.path = path
+        if not path:
+            self._install([])
+            return 0
+        try:
+            docs = build_documents(load_content(path))
+        except Exception as e:
+            log.warning("knowledge: could not load %s: %s", path, e)
+            return len(self._docs)
+        self._install(docs)
+        log.info("knowledge: %d documents from %s", len(docs), path)
+        return len(docs)
+
+    def _install(self, docs: List[_Doc]):
+        tfs: List[Dict[str, int]] = []
+        df: Dict[str, int] = defaultdict(int)
+        for d in docs:
+            tf: Dict[str, int] = defaultdict(int)
+            for text, weight in d.fields:
+                for t in tokenize(text):
+                    tf[t] += weight
+            tfs.append(tf)
+            for t in tf:
+                df[t] += 1
+        n = len(docs)
+        avg_len = (sum(sum(tf.values()) for tf in tfs) / n) if n else 1.0
+        idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+        postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for i, tf in enumerate(tfs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(tf.values()) / avg_len)
+            for t, f in tf.items():
+                postings[t].append((i, idf[t] * f * (BM25_K1 + 1) / (f + norm)))
+        self._docs, self._postings, self._idf = docs, dict(postings), idf
+        self._unseen_idf = math.log(1 + (n + 0.5) / 0.5) if n else 0.0
+        self.loaded_at = time.time()
+
+    def search(self, text: str) -> Optional[Tuple[_Doc, float, float]]:
+        """Best document with its confidence and margin over the runner-up, or None."""
+        terms = set(tokenize(text))
+        if not terms or not self._docs:
+            return None
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, float] = defaultdict(float)
+        total_idf = 0.0
+        for t in terms:
+            total_idf += self._idf.get(t, self._unseen_idf)
+            for i, w in self._postings.get(t, ()):
+                scores[i] += w
+                matched[i] += self._idf[t]
+        if not scores:
+            return None
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:2]
+        best, top = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        return self._docs[best], matched[best] / total_idf, (top - second) / top
+
+    def answer(self, text: str, *, fallback: bool = False) -> Optional[dict]:
+        """A payload copy when the match is confident enough, else None (ask the Agent)."""
+        t0 = time.perf_counter_ns()
+        try:
+            self.counters["lookups"] += 1
+            found = self.search(text)
+            if found is None:
+                self.counters["no_match"] += 1
+                return None
+            doc, confidence, margin = found
+            if confidence < (self.fallback_confidence if fallback else self.min_confidence):
+                self.counters["low_confidence"] += 1
+                return None
+            if not fallback and margin < self.min_margin:
+                self.counters["ambiguous"] += 1
+                return None
+            self.counters["fallback_hits" if fallback else "hits"] += 1
+            return dict(doc.payload)
+        finally:
+            dt = time.perf_counter_ns() - t0
+            self._lookup_ns += dt
+            self._lookup_max_ns = max(self._lookup_max_ns, dt)
+
+    def stats(self) -> dict:
+        n = self.counters["lookups"]
+        return {"path": self.path, "documents": len(self._docs), "terms": len(self._postings),
+                "loaded_at": self.loaded_at, "min_confidence": self.min_confidence, "min_margin": self.min_margin,
+                "lookup_avg_us": round(self._lookup_ns / n / 1000, 1) if n else 0.0,
+                "lookup_max_us": round(self._lookup_max_ns / 1000, 1), **self.counters}
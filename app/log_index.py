@@ -0,0 +1,382 @@
+# app/log_index.py
+"""
+Incremental index over the transcript directory (see transcripts), for post-event analysis without
+re-reading tens of thousands of small files.
+
+`update()` remembers, per file, how many bytes it has consumed and parses only what was appended
+since — complete records only, a record still being written is picked up next time. All three
+transcript outputs are understood: text (SessLog_/Feedback_<sid>.txt, "User:/HARCi:/Briefing:"),
+per-session jsonl and rolling segments.
+
+Turns go into a columnar store under LOG_INDEX_DIR, one flat binary file per column:
+
+  turns.ts.f64   arrival time (text logs carry none: the file's mtime stands in)
+  turns.sid.u32  session, an id into sids.dict
+  turns.q.u32    normalized question, an id into questions.dict
+  turns.src.u8   answer source, an index into SOURCES (text logs: recognised from the fallback texts)
+  turns.ms.f32   request-to-answer time in ms (NaN when not recorded: text logs, older records)
+
+plus feedback.jsonl. Dictionaries are append-only, one JSON string per line. meta.json is replaced
+atomically after the columns are appended and records the committed row counts and file offsets;
+bytes past them (an interrupted update) are truncated on the next run, so nothing is counted twice.
+
+Queries mmap the column files and read them through typed memoryviews — no parsing, no copies —
+so counting questions over a million turns is a C-level Counter() pass.
+
+Run it from scripts/index_logs.py, or in the app with LOG_INDEX=1 (every LOG_INDEX_INTERVAL_SECS;
+GET /api/admin/log-index).
+"""
+import os
+import re
+import json
+import math
+import mmap
+import time
+import logging
+import threading
+from array import array
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .answer_cache import normalize_prompt
+    from .transcripts import TRANSCRIPT_DIR
+except Exception:
+    from answer_cache import normalize_prompt  # type: ignore
+    from transcripts import TRANSCRIPT_DIR  # type: ignore
+
+log = logging.getLogger("harci.log_index")
+
+LOG_INDEX               = os.getenv("LOG_INDEX", "0").lower() in ("1", "true", "yes")
+LOG_INDEX_DIR           = os.getenv("LOG_INDEX_DIR") or os.path.join(TRANSCRIPT_DIR, "_index")
+LOG_INDEX_INTERVAL_SECS = float(os.getenv("LOG_INDEX_INTERVAL_SECS", "300"))
+
+SOURCES = ("unknown", "agent", "cache", "knowledge", "offline", "unavailable", "busy", "failed", "empty")
+FAILED_SOURCES = ("unavailable", "busy", "failed", "empty")
+_SRC = {s: i for i, s in enumerate(SOURCES)}
+
+# Text transcripts carry no source: recognise the canned replies of main._unavailable_payload & co.
+_TEXT_SOURCES = (("I couldn’t reach the agent service", "unavailable"), ("Agent run failed.", "failed"),
+                 ("No agent reply found.", "empty"))
+
+COLUMNS = (("ts", "d"), ("sid", "I"), ("q", "I"), ("src", "B"), ("ms", "f"))
+_EXT = {"d": "f64", "I": "u32", "B": "u8", "f": "f32"}
+
+_FILE_RE = re.compile(r"^(SessLog|Feedback)_(.+)\.(txt|jsonl)$|^transcript-.+\.jsonl$")
+_TURN_RE = re.compile(r"^User: (.*?): (.*?)\nHARCi: (.*?)\nBriefing: (.*)$", re.S)
+_FEEDBACK_RE = re.compile(r"^Time: (.*?)\nName: (.*?)\nSession: (.*?)\nFeedback: (.*)$", re.S)
+
+
+def _complete_text(buf: bytes, start: bytes) -> int:
+    """Bytes of `buf` that hold whole text records: each ends with a blank line, the next starts with `start`."""
+    if buf.endswith(b"\n\n"):
+        return len(buf)
+    i = buf.rfind(b"\n\n" + start)
+    return i + 2 if i >= 0 else 0
+
+
+def _text_source(narration: str) -> str:
+    for prefix, source in _TEXT_SOURCES:
+        if narration.startswith(prefix):
+            return source
+    return "unknown"
+
+
+def _percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, math.ceil(p * len(sorted_vals)) - 1))
+    return round(sorted_vals[k], 1)
+
+
+class _Dictionary:
+    """Append-only string <-> id table persisted as one JSON string per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.bytes = 0
+        self._pending: List[str] = []
+
+    def load(self, count: int, size: int):
+        self.values, self.ids, self._pending = [], {}, []
+        self.bytes = size
+        if not count or not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            raw = f.read(size)
+        for line in raw.splitlines()[:count]:
+            value = json.loads(line)
+            self.ids[value] = len(self.values)
+            self.values.append(value)
+
+    def id_for(self, value: str) -> int:
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+            self._pending.append(json.dumps(value, ensure_ascii=False) + "\n")
+        return i
+
+    def flush(self):
+        if not self._pending:
+            return
+        data = "".join(self._pending).encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.truncate(self.bytes)    # drop whatever an interrupted update left behind
+            f.write(data)
+        self.bytes += len(data)
+        self._pending = []
+
+
+class LogIndex:
+    def __init__(self, directory: str = TRANSCRIPT_DIR, index_dir: str = LOG_INDEX_DIR):
+        self.directory = directory
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._sids = _Dictionary(os.path.join(index_dir, "sids.dict"))
+        self._questions = _Dictionary(os.path.join(index_dir, "questions.dict"))
+        self._meta: dict = {}
+        self.last_update: dict = {}
+        self._load_meta()
+
+    # ---- persistence ---------------------------------------------------------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _column_path(self, name: str, code: str) -> str:
+        return self._path(f"turns.{name}.{_EXT[code]}")
+
+    def _load_meta(self):
+        try:
+            with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                self._meta = json.load(f)
+        except FileNotFoundError:
+            self._meta = {}
+        self._meta.setdefault("version", 1)
+        self._meta.setdefault("rows", 0)
+        self._meta.setdefault("feedback_bytes", 0)
+        self._meta.setdefault("feedback_rows", 0)
+        self._meta.setdefault("dicts", {"sids": [0, 0], "questions": [0, 0]})
+        self._meta.setdefault("files", {})
+        self._sids.load(*self._meta["dicts"]["sids"])
+        self._questions.load(*self._meta["dicts"]["questions"])
+
+    def _commit(self, cols: Dict[str, array], feedback: List[str]):
+        os.makedirs(self.index_dir, exist_ok=True)
+        rows = self._meta["rows"]
+        for name, code in COLUMNS:
+            path = self._column_path(name, code)
+            with open(path, "ab") as f:
+                f.truncate(rows * array(code).itemsize)
+                cols[name].tofile(f)
+        if feedback:
+            data = "".join(feedback).encode("utf-8")
+            with open(self._path("feedback.jsonl"), "ab") as f:
+                f.truncate(self._meta["feedback_bytes"])
+                f.write(data)
+            self._meta["feedback_bytes"] += len(data)
+            self._meta["feedback_rows"] += len(feedback)
+        self._sids.flush()
+        self._questions.flush()
+        self._meta["rows"] = rows + len(cols["ts"])
+        self._meta["dicts"] = {"sids": [len(self._sids.values), self._sids.bytes],
+                               "questions": [len(self._questions.values), self._questions.bytes]}
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._meta, f, separators=(",", ":"))
+        os.replace(tmp, self._path("meta.json"))
+
+    # ---- indexing ------------------------------------------------------------
+    def update(self) -> dict:
+        """Index whatever was appended since the last call. Returns what was read."""
+        with self._lock:
+            t0 = time.perf_counter()
+            cols = {name: array(code) for name, code in COLUMNS}
+            feedback: List[str] = []
+            files = self._meta["files"]
+            scanned = changed = read_bytes = 0
+            try:
+                entries = list(os.scandir(self.directory))
+            except FileNotFoundError:
+                entries = []
+            for entry in entries:
+                m = _FILE_RE.match(entry.name)
+                if m is None or not entry.is_file():
+                    continue
+                scanned += 1
+                st = entry.stat()
+                offset = files.get(entry.name, 0)
+                if st.st_size < offset:   # truncated or replaced: start over
+                    offset = 0
+                if st.st_size == offset:
+                    continue
+                with open(entry.path, "rb") as f:
+                    f.seek(offset)
+                    buf = f.read(st.st_size - offset)
+                used = self._parse(entry.name, m, buf, st.st_mtime, cols, feedback)
+                if used:
+                    files[entry.name] = offset + used
+                    changed += 1
+                    read_bytes += used
+            try:
+                self._commit(cols, feedback)
+            except Exception:
+                self._load_meta()     # back to the last committed state; the next update retries
+                raise
+            self.last_update = {"files_scanned": scanned, "files_changed": changed, "bytes": read_bytes,
+                                "turns": len(cols["ts"]), "feedback": len(feedback),
+                                "ms": round((time.perf_counter() - t0) * 1000, 1), "at": time.time()}
+            return self.last_update
+
+    def _parse(self, name: str, m, buf: bytes, mtime: float, cols: Dict[str, array], feedback: List[str]) -> int:
+        if name.endswith(".jsonl"):
+            used = buf.rfind(b"\n") + 1
+            for line in buf[:used].splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("kind") == "feedback":
+                    feedback.append(json.dumps({"sid": rec.get("sid") or "", "ts": rec.get("ts"), "name": rec.get("name", ""),
+                                                "feedback": rec.get("feedback", "")}, ensure_ascii=False) + "\n")
+                else:
+                    self._add_turn(cols, rec.get("ts") or mtime, rec.get("sid") or "", rec.get("text", ""),
+                                   rec.get("source") or _text_source(rec.get("narration", "")), rec.get("ms"))
+            return used
+
+        kind, sid = m.group(1), m.group(2)
+        if kind == "Feedback":
+            used = _complete_text(buf, b"Time: ")
+            for chunk in buf[:used].decode("utf-8", "replace").rstrip("\n").split("\n\nTime: "):
+                fm = _FEEDBACK_RE.match(chunk if chunk.startswith("Time: ") else "Time: " + chunk)
+                if fm is None:
+                    continue
+                try:
+                    ts = datetime.strptime(fm.group(1), "%Y-%m-%d %H:%M:%S UTC").replace(tzinfo=timezone.utc).timestamp()
+                except ValueError:
+                    ts = mtime
+                feedback.append(json.dumps({"sid": fm.group(3) or sid, "ts": ts, "name": fm.group(2),
+                                            "feedback": fm.group(4)}, ensure_ascii=False) + "\n")
+            return used
+
+        used = _complete_text(buf, b"User: ")
+        for chunk in buf[:used].decode("utf-8", "replace").rstrip("\n").split("\n\nUser: "):
+            tm = _TURN_RE.match(chunk if chunk.startswith("User: ") else "User: " + chunk)
+            if tm is not None:
+                self._add_turn(cols, mtime, sid, tm.group(2), _text_source(tm.group(3)), None)
+        return used
+
+    def _add_turn(self, cols: Dict[str, array], ts: float, sid: str, text: str, source: str, ms):
+        cols["ts"].append(float(ts))
+        cols["sid"].append(self._sids.id_for(sid))
+        cols["q"].append(self._questions.id_for(normalize_prompt(text)))
+        cols["src"].append(_SRC.get(source, 0))
+        cols["ms"].append(float(ms) if ms is not None else math.nan)
+
+    # ---- queries -------------------------------------------------------------
+    @contextmanager
+    def _columns(self, *names: str):
+        """Typed, zero-copy views of the committed rows of the named columns."""
+        rows = self._meta["rows"]
+        codes = dict(COLUMNS)
+        maps, views = [], []
+        try:
+            for name in names:
+                code = codes[name]
+                size = rows * array(code).itemsize
+                if not size:
+                    views.append(memoryview(b"").cast(code))
+                    continue
+                with open(self._column_path(name, code), "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                maps.append(mm)
+                views.append(memoryview(mm)[:size].cast(code))
+            yield views
+        finally:
+            for v in views:
+                v.release()
+            for mm in maps:
+                mm.close()
+
+    def summary(self) -> dict:
+        """Turns, sessions, answer sources, failure rate and latency percentiles per source."""
+        with self._columns("sid", "src", "ms") as (sid, src, ms):
+            rows = len(src)
+            by_source = Counter(src)
+            lat: Dict[int, List[float]] = defaultdict(list)
+            for s, v in zip(src, ms):
+                if v == v:    # not NaN
+                    lat[s].append(v)
+            sessions = len(set(sid))
+        failed = sum(by_source[_SRC[s]] for s in FAILED_SOURCES)
+        latency = {}
+        for s, vals in sorted(lat.items()):
+            vals.sort()
+            latency[SOURCES[s]] = {"n": len(vals), "p50": _percentile(vals, 0.5), "p90": _percentile(vals, 0.9),
+                                   "p99": _percentile(vals, 0.99)}
+        return {"turns": rows, "sessions": sessions, "questions": len(self._questions.values),
+                "feedback": self._meta["feedback_rows"],
+                "sources": {SOURCES[s]: n for s, n in sorted(by_source.items())},
+                "failure_rate": round(failed / rows, 4) if rows else 0.0, "latency_ms": latency}
+
+    def top_questions(self, n: int = 20) -> List[dict]:
+        """Most asked (normalized) questions, with their sessions, answer sources and failures."""
+        with self._columns("q", "sid", "src") as (q, sid, src):
+            top = Counter(q).most_common(n)
+            wanted = {qid for qid, _ in top}
+            sources: Dict[int, Counter] = {qid: Counter() for qid in wanted}
+            sessions: Dict[int, set] = {qid: set() for qid in wanted}
+            for qi, si, s in zip(q, sid, src):
+                if qi in wanted:
+                    sources[qi][s] += 1
+                    sessions[qi].add(si)
+        out = []
+        for qid, count in top:
+            by = {SOURCES[s]: c for s, c in sources[qid].most_common()}
+            out.append({"question": self._questions.values[qid], "count": count, "sessions": len(sessions[qid]),
+                        "sources": by, "failures": sum(by.get(s, 0) for s in FAILED_SOURCES)})
+        return out
+
+    def precompute_candidates(self, n: int = 10, min_count: int = 2) -> List[dict]:
+        """Frequent questions still answered by Agent runs: candidates for ANSWER_CACHE_PROMPTS or the content file."""
+        out = []
+        for row in self.top_questions(max(n * 5, 50)):
+            runs = sum(row["sources"].get(s, 0) for s in ("agent", "unknown") + FAILED_SOURCES)
+            if row["question"] and row["count"] >= min_count and runs:
+                out.append({**row, "agent_runs": runs})
+        out.sort(key=lambda r: r["agent_runs"], reverse=True)
+        return out[:n]
+
+    def session(self, sid: str) -> dict:
+        """One guest's turns (question, source, ms) and feedback."""
+        sid_id = self._sids.ids.get(sid)
+        turns = []
+        if sid_id is not None:
+            with self._columns("sid", "q", "src", "ms", "ts") as (sids, q, src, ms, ts):
+                for i, s in enumerate(sids):
+                    if s == sid_id:
+                        turns.append({"ts": ts[i], "question": self._questions.values[q[i]], "source": SOURCES[src[i]],
+                                      "ms": None if ms[i] != ms[i] else round(ms[i], 1)})
+        return {"sid": sid, "turns": turns, "feedback": [f for f in self.feedback() if f["sid"] == sid]}
+
+    def feedback(self) -> List[dict]:
+        size = self._meta["feedback_bytes"]
+        if not size:
+            return []
+        with open(self._path("feedback.jsonl"), "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [json.loads(line) for line in mm[:size].splitlines() if line]
+
+    def feedback_by_session(self) -> Dict[str, List[dict]]:
+        out: Dict[str, List[dict]] = defaultdict(list)
+        for f in self.feedback():
+            out[f["sid"]].append(f)
+        return dict(out)
+
+    def stats(self) -> dict:
+        return {"directory": self.directory, "index_dir": self.index_dir, "rows": self._meta["rows"],
+                "files": len(self._meta["files"]), "last_update": self.last_update}
@@ -0,0 +1,232 @@
+# app/log_pipeline.py
+"""
+Logging off the event loop.
+
+`setup_logging()` replaces basicConfig: every logger (ours, the Azure SDK's, uvicorn's) hands its
+records to one `BoundedQueueHandler`, and a `QueueListener` thread formats and writes them
+(stderr, plus LOG_FILE rotating). On the calling thread a record costs a context lookup, merging
+msg % args (so it shows the values at call time) and a put_nowait — no traceback rendering, no I/O.
+
+  - Bounded: at LOG_QUEUE_MAX pending records new ones are dropped and counted per level, so a
+    slow disk or a log storm never backs up request handling.
+  - Dedup: a traceback from the same logger + exception type + raising line is rendered once per
+    LOG_DEDUP_WINDOW_SECS; repeats within the window are still logged, as the message alone with
+    a `repeat` count. An Azure outage that fails every request then costs one traceback a minute.
+  - Correlation: `CorrelationMiddleware` binds a request id (incoming X-Request-ID or a new one,
+    echoed back), the session cookie and the arrival time into context variables; every record
+    carries both ids, also from Agent calls on the thread pool (run_blocking copies the context).
+  - LOG_FORMAT=json (default) writes one JSON object per line; text keeps the old layout.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+LOG_FORMAT             = os.getenv("LOG_FORMAT", "json").lower()           # json | text
+LOG_QUEUE_MAX          = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_DEDUP_WINDOW_SECS  = float(os.getenv("LOG_DEDUP_WINDOW_SECS", "60"))
+LOG_CAPTURE_UVICORN    = os.getenv("LOG_CAPTURE_UVICORN", "1").lower() in ("1", "true", "yes")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s :: %(message)s"
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("harci_request_id", default="")
+session_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("harci_session_id", default="")
+request_start_var: contextvars.ContextVar[float] = contextvars.ContextVar("harci_request_start", default=0.0)
+
+
+def request_elapsed_ms() -> Optional[float]:
+    """Milliseconds since the current request arrived (None outside a request)."""
+    start = request_start_var.get()
+    return (time.perf_counter() - start) * 1000 if start else None
+
+
+def bind_session(sid: Optional[str]):
+    """Tag the rest of this request (and tasks it starts) with the guest's session id."""
+    if sid:
+        session_id_var.set(sid)
+
+
+class JsonFormatter(logging.Formatter):
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("request_id", "session_id"):
+            val = getattr(record, key, "")
+            if val:
+                out[key] = val
+        repeat = getattr(record, "repeat", 0)
+        if repeat:
+            out["repeat"] = repeat
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Non-blocking enqueue with drop counters and traceback dedup; see module docstring."""
+
+    def __init__(self, q: "queue.Queue", *, dedup_window: float = LOG_DEDUP_WINDOW_SECS):
+        super().__init__(q)
+        self.dedup_window = dedup_window
+        self._seen: Dict[tuple, list] = {}     # key -> [window_start, repeats]
+        self.counters = {"enqueued": 0, "deduped": 0}
+        self.dropped: Dict[str, int] = {}
+
+    def _dedup(self, record: logging.LogRecord):
+        exc_type, _, tb = record.exc_info
+        while tb is not None and tb.tb_next is not None:
+            tb = tb.tb_next
+        where = (tb.tb_frame.f_code.co_filename, tb.tb_lineno) if tb is not None else None
+        key = (record.name, exc_type, where)
+        now = time.monotonic()
+        seen = self._seen.get(key)
+        if seen is None or now - seen[0] >= self.dedup_window:
+            if len(self._seen) > 1000:
+                self._seen.clear()
+            self._seen[key] = [now, 0]
+            if seen is not None and seen[1]:
+                record.repeat = seen[1]   # repeats suppressed in the window that just ended
+            return
+        seen[1] += 1
+        self.counters["deduped"] += 1
+        record.exc_info = None
+        record.exc_text = None
+        record.repeat = seen[1]
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # msg % args is merged here, at call time: args may be mutated before the listener gets to the
+        # record. The rest of the formatting (JSON, traceback) happens on the listener thread.
+        record = copy.copy(record)
+        try:
+            msg = record.getMessage()
+        except Exception:   # bad format string: keep the record rather than losing it in handleError
+            msg = f"{record.msg} {record.args!r}"
+        record.message = record.msg = msg
+        record.args = None
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        if record.exc_info and record.exc_info[0] is not None and self.dedup_window > 0:
+            self._dedup(record)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.counters["enqueued"] += 1
+        except queue.Full:
+            self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+    def handleError(self, record: logging.LogRecord):
+        pass
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "max": self.queue.maxsize, **self.counters,
+                "dropped": dict(self.dropped)}
+
+
+_HANDLER: Optional[BoundedQueueHandler] = None
+_LISTENER: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = "INFO", log_file: Optional[str] = None) -> BoundedQueueHandler:
+    """Route the root logger through the queue; idempotent (re-import, reload)."""
+    global _HANDLER, _LISTENER
+    lvl = getattr(logging, str(level).upper(), logging.INFO)
+    root = logging.getLogger()
+    root.setLevel(lvl)
+    if _HANDLER is not None:
+        return _HANDLER
+
+    fmt = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    sinks = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        sinks.append(RotatingFileHandler(log_file, maxBytes=2_000_000, backupCount=3, encoding="utf-8"))
+    for h in sinks:
+        h.setLevel(lvl)
+        h.setFormatter(fmt)
+
+    _HANDLER = BoundedQueueHandler(queue.Queue(maxsize=max(1, LOG_QUEUE_MAX)))
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(_HANDLER)
+    if LOG_CAPTURE_UVICORN:
+        # uvicorn installs its own stderr handlers before importing the app; send them here instead
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            lg = logging.getLogger(name)
+            lg.handlers = []
+            lg.propagate = True
+
+    _LISTENER = QueueListener(_HANDLER.queue, *sinks, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(stop_logging)
+    return _HANDLER
+
+
+def stop_logging():
+    """Flush what is queued and stop the listener thread."""
+    global _LISTENER
+    if _LISTENER is not None:
+        try:
+            _LISTENER.stop()
+        except queue.Full:   # no room for the stop sentinel; the daemon thread dies with us
+            pass
+        _LISTENER = None
+
+
+def log_stats() -> Optional[dict]:
+    return _HANDLER.stats() if _HANDLER is not None else None
+
+
+class CorrelationMiddleware:
+    """Pure ASGI: bind request/session ids for the request's context and echo X-Request-ID."""
+
+    def __init__(self, app, *, cookie: str = "harci_sid"):
+        self.app = app
+        self.cookie = cookie.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rid = ""
+        sid = ""
+        for k, v in scope.get("headers") or ():
+            if k == b"x-request-id":
+                rid = v.decode("latin-1")[:64]
+            elif k == b"cookie" and self.cookie in v:
+                for part in v.decode("latin-1").split(";"):
+                    name, _, val = part.strip().partition("=")
+                    if name.encode() == self.cookie:
+                        sid = val
+        rid = rid or uuid.uuid4().hex[:16]
+        t_rid = request_id_var.set(rid)
+        t_sid = session_id_var.set(sid)
+        t_start = request_start_var.set(time.perf_counter())
+        header = (b"x-request-id", rid.encode("latin-1"))
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers") or ()) + [header]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            request_id_var.reset(t_rid)
+            session_id_var.reset(t_sid)
+            request_start_var.reset(t_start)
@@ -0,0 +1,91 @@
+# app/loop_monitor.py
+"""
+Event-loop lag: a task that asks to wake every LOOP_MONITOR_INTERVAL_MS and records how late it
+actually woke up. Lag is time every request on this worker waited behind blocking work (sync I/O,
+heavy JSON, template renders). Samples go into a fixed-size window for percentiles; totals are
+kept since start. Lag over LOOP_LAG_WARN_MS is logged (rate-limited).
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Optional
+
+log = logging.getLogger("harci.loop")
+
+LOOP_MONITOR             = os.getenv("LOOP_MONITOR", "1").lower() in ("1", "true", "yes")
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+LOOP_LAG_WARN_MS         = float(os.getenv("LOOP_LAG_WARN_MS", "250"))
+LOOP_MONITOR_WINDOW      = int(os.getenv("LOOP_MONITOR_WINDOW", "6000"))   # samples (~5 min at 50 ms)
+
+
+def _pct(xs, p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+class LoopLagMonitor:
+    def __init__(self, *, interval_ms: float = LOOP_MONITOR_INTERVAL_MS, warn_ms: float = LOOP_LAG_WARN_MS,
+                 window: int = LOOP_MONITOR_WINDOW):
+        self.interval = max(0.001, interval_ms / 1000)
+        self.warn_ms = warn_ms
+        self._window: Deque[float] = deque(maxlen=max(10, window))
+        self._task: Optional[asyncio.Task] = None
+        self._last_warn = 0.0
+        self.started_at = time.time()
+        self.counters = {"samples": 0, "lag_ms_total": 0.0, "max_lag_ms": 0.0, "over_warn": 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="harci-loop-monitor")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record(self, lag_ms: float):
+        lag_ms = max(0.0, lag_ms)
+        self._window.append(lag_ms)
+        c = self.counters
+        c["samples"] += 1
+        c["lag_ms_total"] += lag_ms
+        if lag_ms > c["max_lag_ms"]:
+            c["max_lag_ms"] = lag_ms
+        if lag_ms >= self.warn_ms:
+            c["over_warn"] += 1
+            now = time.monotonic()
+            if now - self._last_warn > 10:
+                self._last_warn = now
+                log.warning("event loop blocked for %.0f ms", lag_ms)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record((loop.time() - t0 - self.interval) * 1000)
+
+    def reset(self):
+        self._window.clear()
+        self.counters = {"samples": 0, "lag_ms_total": 0.0, "max_lag_ms": 0.0, "over_warn": 0}
+        self.started_at = time.time()
+
+    def stats(self) -> dict:
+        w = list(self._window)
+        return {
+            "interval_ms": round(self.interval * 1000, 1),
+            "window": len(w),
+            "p50_ms": round(_pct(w, 50), 2),
+            "p95_ms": round(_pct(w, 95), 2),
+            "p99_ms": round(_pct(w, 99), 2),
+            "window_max_ms": round(max(w), 2) if w else 0.0,
+            "samples": self.counters["samples"],
+            "lag_ms_total": round(self.counters["lag_ms_total"], 1),
+            "max_lag_ms": round(self.counters["max_lag_ms"], 2),
+            "over_warn": self.counters["over_warn"],
+            "since": self.started_at,
+        }
@@ -4,11 +4,15 @@ import json
 import time
 import uuid
 import random
+import math
+import re
 import logging
+import asyncio
+import hmac
 import threading
-from logging.handlers import RotatingFileHandler
+import importlib.util
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import Awaitable, Callable, Optional, Dict, List, Tuple
 from zoneinfo import ZoneInfo
 
 EVENT_TZ   = os.getenv("EVENT_TZ", "America/Chicago")
@@ -24,33 +28,91 @@ SECURE_COOKIES   = os.getenv("SECURE_COOKIES", "0").lower() in ("1", "true", "ye
 if os.name == "nt":
     os.environ.setdefault("AZURE_CLI_PATH", r"C:\Program Files\Microsoft SDKs\Azure\CLI2\wbin\az.cmd")
 
-import httpx
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, Form, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from starlette.templating import Jinja2Templates
 from dotenv import load_dotenv
 
 # ---- Prompts module (centralized) -------------------------------------------
 try:
     from .prompts import build_assist_preamble, build_welcome_prompt
+    from .agent_exec import AgentOps, async_sdk_available, run_blocking, run_status, is_run_event, shutdown_executor, AGENT_ASYNC_CLIENT, AGENT_RUN_TIMEOUT_SECS
+    from .run_waiter import get_waiter, cancel_run_quietly, cancel_run_and_settle, RunExpired, STATS as RUN_WAITER_STATS
+    from .stream_parse import PayloadStreamParser, parse_payload, split_sentences
+    from . import http_pool
+    from .token_cache import CredentialCache
+    from .speech_sched import SpeechResource, SpeechScheduler
+    from .credentials import PrefetchingCredential, AsyncPrefetchingCredential, StaticTokenCredential, AsyncStaticTokenCredential, AZURE_CREDENTIAL
+    from .loop_monitor import LoopLagMonitor, LOOP_MONITOR
+    from .warm_threads import WarmThreadPool, THREAD_POOL
+    from .answer_cache import AnswerCache, context_hash
+    from .transcripts import TranscriptWriter, turn_record, feedback_record
+    from .session_store import Session, SessionStore, build_session_store, SESSION_SWEEP_SECS
+    from .static_assets import AssetStaticFiles
+    from .page_cache import PageCache, SLOT, etag_for, etag_matches, fill_slot
+    from .metrics import REGISTRY, MetricsMiddleware, AGENT_STAGE, AGENT_REPLY_SOURCE, METRICS
+    from .log_pipeline import setup_logging, bind_session, log_stats, request_elapsed_ms, CorrelationMiddleware
+    from .turns import TurnCoordinator, TurnSuperseded
+    from .admission import AdmissionController, AdmissionRejected
+    from .knowledge import KnowledgeIndex
+    from .thread_context import (note_exchange, should_rotate, recap_message, reset_for_thread, approx_tokens,
+                                 THREAD_FIELDS, STATS as THREAD_CTX_STATS)
+    from .log_index import LogIndex, LOG_INDEX, LOG_INDEX_INTERVAL_SECS
 except Exception:
     from prompts import build_assist_preamble, build_welcome_prompt  # type: ignore
+    from agent_exec import AgentOps, async_sdk_available, run_blocking, run_status, is_run_event, shutdown_executor, AGENT_ASYNC_CLIENT, AGENT_RUN_TIMEOUT_SECS  # type: ignore
+    from run_waiter import get_waiter, cancel_run_quietly, cancel_run_and_settle, RunExpired, STATS as RUN_WAITER_STATS  # type: ignore
+    from stream_parse import PayloadStreamParser, parse_payload, split_sentences  # type: ignore
+    import http_pool  # type: ignore
+    from token_cache import CredentialCache  # type: ignore
+    from speech_sched import SpeechResource, SpeechScheduler  # type: ignore
+    from credentials import PrefetchingCredential, AsyncPrefetchingCredential, StaticTokenCredential, AsyncStaticTokenCredential, AZURE_CREDENTIAL  # type: ignore
+    from loop_monitor import LoopLagMonitor, LOOP_MONITOR  # type: ignore
+    from warm_threads import WarmThreadPool, THREAD_POOL  # type: ignore
+    from answer_cache import AnswerCache, context_hash  # type: ignore
+    from transcripts import TranscriptWriter, turn_record, feedback_record  # type: ignore
+    from session_store import Session, SessionStore, build_session_store, SESSION_SWEEP_SECS  # type: ignore
+    from static_assets import AssetStaticFiles  # type: ignore
+    from page_cache import PageCache, SLOT, etag_for, etag_matches, fill_slot  # type: ignore
+    from metrics import REGISTRY, MetricsMiddleware, AGENT_STAGE, AGENT_REPLY_SOURCE, METRICS  # type: ignore
+    from log_pipeline import setup_logging, bind_session, log_stats, request_elapsed_ms, CorrelationMiddleware  # type: ignore
+    from turns import TurnCoordinator, TurnSuperseded  # type: ignore
+    from admission import AdmissionController, AdmissionRejected  # type: ignore
+    from knowledge import KnowledgeIndex  # type: ignore
+    from thread_context import (note_exchange, should_rotate, recap_message, reset_for_thread, approx_tokens,  # type: ignore
+                                THREAD_FIELDS, STATS as THREAD_CTX_STATS)
+    from log_index import LogIndex, LOG_INDEX, LOG_INDEX_INTERVAL_SECS  # type: ignore
 
 load_dotenv(override=False)
 
-# ===== Azure Agents SDK (optional) ============================================
-try:
-    from azure.core.credentials import AccessToken, TokenCredential  # type: ignore
-    from azure.ai.projects import AIProjectClient  # type: ignore
-    from azure.ai.agents.models import ListSortOrder  # type: ignore
-except Exception:
-    AccessToken = None          # type: ignore
-    TokenCredential = None      # type: ignore
-    AIProjectClient = None      # type: ignore
-    ListSortOrder = None        # type: ignore
+# ===== Azure Agents SDK (optional, imported on first use) =====================
+# azure.ai.projects drags in azure.storage.blob & co. (~150-200 ms); startup only checks it is
+# installed and the import itself happens in the Agent worker pool (see _load_agent_sdk).
+def _has_module(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except Exception:
+        return False
+
+AGENT_SDK_AVAILABLE = _has_module("azure.ai.projects") and _has_module("azure.ai.agents")
+AIProjectClient = None      # set by _load_agent_sdk()
+ListSortOrder = None        # set by _load_agent_sdk()
+
+# ===== Local stand-in for Azure (scripts/fake_azure.py) =======================
+# One switch points the Agents project and both Speech endpoints at the fake server and uses a
+# static bearer token, overriding .env so a load test can never reach the real services.
+# Load testing only, never in a deployment.
+FAKE_AZURE_URL = os.getenv("FAKE_AZURE_URL", "").rstrip("/")
+if FAKE_AZURE_URL:
+    os.environ["PROJECT_ENDPOINT"] = f"{FAKE_AZURE_URL}/api/projects/fake"
+    os.environ["AGENT_ID"] = "asst_fake"
+    os.environ["SPEECH_REGION"] = "fake"
+    os.environ["SPEECH_KEY"] = "fake-key"
+    os.environ["SPEECH_RESOURCES"] = ""
+    os.environ["SPEECH_STS_URL"] = f"{FAKE_AZURE_URL}/speech/{{region}}/sts/v1.0/issueToken"
+    os.environ["SPEECH_RELAY_URL"] = f"{FAKE_AZURE_URL}/speech/{{region}}/avatar/relay/token/v1"
 
 # ===== Env ====================================================================
 HITACHI_RED      = os.getenv("HITACHI_RED", "#E60027")
@@ -59,6 +121,9 @@ AGENT_ID         = os.getenv("AGENT_ID")
 SPEECH_REGION    = os.getenv("SPEECH_REGION")
 SPEECH_KEY       = os.getenv("SPEECH_KEY")
 SPEECH_RESOURCES = (os.getenv("SPEECH_RESOURCES") or "").strip()  # JSON: [{"region":"eastus2","key":"..."}]
+# Speech endpoints ({region} is substituted); override only to point at a stub/proxy
+SPEECH_STS_URL   = os.getenv("SPEECH_STS_URL", "https://{region}.api.cognitive.microsoft.com/sts/v1.0/issueToken")
+SPEECH_RELAY_URL = os.getenv("SPEECH_RELAY_URL", "https://{region}.tts.speech.microsoft.com/cognitiveservices/avatar/relay/token/v1")
 
 # Optional TURN/relay override (not used server-side if you rely on service relay token)
 RELAY_URLS      = os.getenv("RELAY_URLS", "")
@@ -77,15 +142,8 @@ LOG_LEVEL        = os.getenv("LOG_LEVEL", "INFO").upper()
 LOG_FILE         = os.getenv("LOG_FILE")  # If set, logs will also be written to this file (rotating)
 
 # ===== Logging ================================================================
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL, logging.INFO),
-    format="%(asctime)s %(levelname)s %(name)s :: %(message)s"
-)
-if LOG_FILE:
-    fh = RotatingFileHandler(LOG_FILE, maxBytes=2_000_000, backupCount=3, encoding="utf-8")
-    fh.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
-    fh.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s :: %(message)s"))
-    logging.getLogger().addHandler(fh)
+# Queued: records are formatted and written by a listener thread (see log_pipeline)
+setup_logging(LOG_LEVEL, LOG_FILE)
 
 log = logging.getLogger("harci")
 
@@ -93,35 +151,109 @@ def agent_config_ok() -> bool:
     return bool(PROJECT_ENDPOINT and AGENT_ID)
 
 # ===== App / Static / Templates ==============================================
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    http_pool.start_registry()
+    _init_pool()
+    probe_task = asyncio.create_task(_speech_probe_loop(), name="harci-speech-probe")
+    sweep_task = asyncio.create_task(_session_sweeper(), name="harci-session-sweeper")
+    _TRANSCRIPTS.start()
+    if LOOP_MONITOR:
+        _LOOP.start()
+    init_tasks = [asyncio.create_task(_token_refresher(), name="harci-token-refresh")]
+    if TEMPLATE_WARMUP:
+        init_tasks.append(asyncio.create_task(asyncio.to_thread(_warm_templates), name="harci-template-warmup"))
+    if _KNOWLEDGE.path:
+        init_tasks.append(asyncio.create_task(asyncio.to_thread(_KNOWLEDGE.load), name="harci-knowledge-load"))
+    if AGENT_EAGER_INIT:
+        init_tasks.append(asyncio.create_task(_init_agent(), name="harci-agent-init"))
+    if LOG_INDEX:
+        init_tasks.append(asyncio.create_task(_log_indexer(), name="harci-log-index"))
+    pool_task = None
+    if _thread_pool_enabled():
+        pool_task = asyncio.create_task(_WARM_THREADS.run(_pool_ops), name="harci-thread-pool")
+    try:
+        yield
+    finally:
+        probe_task.cancel()
+        sweep_task.cancel()
+        for t in init_tasks:
+            t.cancel()
+        if pool_task is not None:
+            pool_task.cancel()
+            if _AGENT_OPS is not None:
+                try:
+                    await asyncio.wait_for(_WARM_THREADS.drain(_AGENT_OPS), 5)
+                except Exception:
+                    pass
+        _LOOP.stop()
+        await _TRANSCRIPTS.close()
+        _SPEECH_TOKENS.close()
+        _RELAY_TOKENS.close()
+        await http_pool.stop_registry()
+        await _SESSIONS.close()
+        if _AGENT_OPS is not None:
+            await _AGENT_OPS.close()
+        if _ASYNC_CREDENTIAL is not None:
+            try:
+                await _ASYNC_CREDENTIAL.close()
+            except Exception:
+                pass
+        shutdown_executor()
+
+app = FastAPI(lifespan=lifespan)
+_LOOP = LoopLagMonitor()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
+if METRICS:
+    app.add_middleware(MetricsMiddleware)
 
 _APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 _STATIC_DIR = os.path.join(_APP_ROOT, "static")
 _TEMPLATES_DIR = os.path.join(_APP_ROOT, "templates")
 
-app.mount("/static", StaticFiles(directory=_STATIC_DIR), name="static")
-templates = Jinja2Templates(directory=_TEMPLATES_DIR)
+# Fingerprinted + precompressed when scripts/build_static.py has run (see static_assets)
+_STATIC = AssetStaticFiles(directory=_STATIC_DIR)
+app.mount("/static", _STATIC, name="static")
+
+# Jinja is imported and the pages compiled by a lifespan background task (TEMPLATE_WARMUP), so
+# neither startup nor the first guest pays for it; _templates() builds the env if asked sooner.
+TEMPLATE_WARMUP = os.getenv("TEMPLATE_WARMUP", "1").lower() in ("1", "true", "yes")
+_TEMPLATE_PAGES = ("_base.html", "register.html", "guide.html", "ended.html", "feedback.html")
+_TEMPLATES = None
+_TEMPLATES_LOCK = threading.Lock()
+
+def _templates():
+    global _TEMPLATES
+    if _TEMPLATES is None:
+        with _TEMPLATES_LOCK:
+            if _TEMPLATES is None:
+                from starlette.templating import Jinja2Templates
+                tpl = Jinja2Templates(directory=_TEMPLATES_DIR)
+                tpl.env.globals["asset_url"] = _STATIC.asset_url_global()
+                tpl.env.globals["asset_scripts"] = _STATIC.asset_scripts_global()
+                _TEMPLATES = tpl
+    return _TEMPLATES
+
+def _warm_templates():
+    t0 = time.perf_counter()
+    env = _templates().env
+    for name in _TEMPLATE_PAGES:
+        try:
+            env.get_template(name)
+        except Exception as e:
+            log.warning("template warm-up: %s failed: %s", name, e)
+    log.info("Templates compiled in %.0f ms", (time.perf_counter() - t0) * 1000)
 
-# ===== Sessions (in-memory with TTL) =========================================
+# ===== Sessions (see session_store: memory or Redis, with TTL) ===============
 SESSION_COOKIE = "harci_sid"
+# Every log record of a request carries its X-Request-ID and this cookie (see log_pipeline)
+app.add_middleware(CorrelationMiddleware, cookie=SESSION_COOKIE)
 
-class Session(BaseModel):
-    sid: str
-    name: str
-    company: str
-    created_at: datetime
-    last_active: datetime
-    expires_at: datetime
-    active: bool = True
-    agent_thread_id: str = ""
-    agent_ctx_seeded: bool = False  # avoid re-sending system context each turn
-
-SESSIONS: Dict[str, Session] = {}
+_SESSIONS: SessionStore = build_session_store()
 
 def _now_utc() -> datetime:
     return datetime.utcnow()
@@ -129,68 +261,116 @@ def _now_utc() -> datetime:
 def new_sid() -> str:
     return uuid.uuid4().hex
 
-def _is_expired(sess: Session) -> bool:
-    return sess.expires_at <= _now_utc()
-
-def get_session(sid: Optional[str]) -> Optional[Session]:
+async def get_session(sid: Optional[str]) -> Optional[Session]:
     if not sid:
         return None
-    sess = SESSIONS.get(sid)
-    if not sess:
+    try:
+        return await _SESSIONS.get(sid)
+    except Exception:
+        log.exception("session store read failed")
         return None
-    if _is_expired(sess):
+
+async def save_session(sess: Optional[Session], *fields: str):
+    """Persist `fields` of `sess` (all of it when none are named)."""
+    if not sess:
+        return
+    try:
+        if fields:
+            await _SESSIONS.update(sess, fields)
+        else:
+            await _SESSIONS.save(sess)
+    except Exception:
+        log.exception("session store write failed")
+
+async def touch_session(sess: Optional[Session], *fields: str, slide_expiry: bool = True):
+    """Bump activity (and sliding expiry), persisting those plus any other `fields` the caller changed."""
+    if sess:
+        sess.last_active = _now_utc()
+        if slide_expiry:
+            sess.expires_at = _now_utc() + timedelta(seconds=SESSION_TTL_SECS)
+        await save_session(sess, "last_active", "expires_at", *fields)
+
+async def _session_sweeper():
+    """Periodic expiry for the memory store (abandoned kiosk sessions would otherwise pile up)."""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_SECS)
         try:
-            del SESSIONS[sid]
+            n = await _SESSIONS.sweep()
+            if n:
+                log.info("session sweeper: %d expired", n)
         except Exception:
-            pass
-        return None
-    return sess
+            log.exception("session sweeper error")
 
-def touch_sid(sid: str, slide_expiry: bool = True):
-    s = get_session(sid)
-    if s:
-        s.last_active = _now_utc()
-        if slide_expiry:
-            s.expires_at = _now_utc() + timedelta(seconds=SESSION_TTL_SECS)
+async def _log_indexer():
+    """Keep the session-log index current (LOG_INDEX=1); each pass reads only what was appended."""
+    while True:
+        await asyncio.sleep(LOG_INDEX_INTERVAL_SECS)
+        try:
+            await _TRANSCRIPTS.flush()
+            u = await asyncio.to_thread(_LOG_INDEX.update)
+            if u["turns"] or u["feedback"]:
+                log.info("log index: +%d turns, +%d feedback in %.1f ms", u["turns"], u["feedback"], u["ms"])
+        except Exception:
+            log.exception("log index update failed")
 
 # ===== Speech resource pool ===================================================
-_pool: List[Dict[str, str]] = []
-_pool_idx = 0
-_pool_lock = threading.Lock()
+_sched: Optional[SpeechScheduler] = None
+
+def _resource_id(region: str, key: str) -> str:
+    head = key[:6] if key else ""
+    return f"{region}:{head}"
 
 def _init_pool():
-    """Initialize rotating pool of speech resources (for rate balancing)."""
-    global _pool
-    _pool = []
+    """Build the Speech resource scheduler from SPEECH_RESOURCES (or the single SPEECH_REGION/KEY)."""
+    global _sched
+    pool: List[SpeechResource] = []
     if SPEECH_RESOURCES:
         try:
             arr = json.loads(SPEECH_RESOURCES)
             if isinstance(arr, list):
                 for item in arr:
                     if item.get("region") and item.get("key"):
-                        _pool.append({"region": item["region"], "key": item["key"]})
-            random.shuffle(_pool)
+                        pool.append(SpeechResource(
+                            item["region"], item["key"], _resource_id(item["region"], item["key"]),
+                            weight=float(item.get("weight", 1.0)),
+                        ))
+            random.shuffle(pool)
         except Exception as e:
             log.warning("SPEECH_RESOURCES json error: %s", e)
-    if not _pool and SPEECH_REGION and SPEECH_KEY:
-        _pool = [{"region": SPEECH_REGION, "key": SPEECH_KEY}]
-    if not _pool:
+    if not pool and SPEECH_REGION and SPEECH_KEY:
+        pool = [SpeechResource(SPEECH_REGION, SPEECH_KEY, _resource_id(SPEECH_REGION, SPEECH_KEY))]
+    if not pool:
         log.warning("No Speech resources configured")
+    _sched = SpeechScheduler(pool)
 
-def _next_speech_resource() -> Dict[str, str]:
-    global _pool_idx
-    if not _pool:
+def _next_speech_resource(sid: Optional[str] = None, exclude: Optional[SpeechResource] = None) -> SpeechResource:
+    """Least-loaded healthy resource; a guest's sid stays pinned to the same one (see speech_sched)."""
+    if not _sched:
         _init_pool()
-    if not _pool:
+    if not _sched:
         raise HTTPException(500, "Speech not configured")
-    with _pool_lock:
-        res = _pool[_pool_idx % len(_pool)]
-        _pool_idx += 1
-        return res
+    return _sched.pick(sid or None, exclude=exclude)
+
+async def _speech_upstream(res: SpeechResource, method: str, url: str, **kwargs):
+    """One call to a Speech endpoint, feeding latency/status back into the scheduler."""
+    _sched.begin(res)
+    t0 = time.perf_counter()
+    status = 0
+    try:
+        r = await http_pool.request(res.region, method, url, **kwargs)
+        status = r.status_code
+        return r
+    finally:
+        _sched.record(res, (time.perf_counter() - t0) * 1000, status)
 
 # ===== UI config ==============================================================
+_UI_CFG: Optional[dict] = None  # built once; reset by reload_config()
+
 def ui_cfg():
-    return {
+    global _UI_CFG
+    if _UI_CFG is not None:
+        return _UI_CFG
+    _UI_CFG = {
         "brandRed": HITACHI_RED,
         "avatarId": AVATAR_ID,
         "avatarStyle": AVATAR_STYLE,
@@ -205,23 +385,75 @@ def ui_cfg():
             "name": EVENT_NAME,
         },
     }
+    return _UI_CFG
+
+async def reload_config() -> List[str]:
+    """Re-read the UI/event settings from .env (its values win) and the environment.
+    Returns the ui_cfg() keys that changed; cached pages, the chip-answer context and the knowledge
+    index follow (the index is rebuilt on a worker thread, off the event loop)."""
+    global HITACHI_RED, AVATAR_ID, AVATAR_STYLE, SPEECH_LANG, SPEECH_VOICE, STT_USE_WARM_STREAM
+    global EVENT_TZ, EVENT_DATE, EVENT_CITY, EVENT_NAME, _UI_CFG, _ANSWER_CTX, _WELCOME_SKELETON
+    load_dotenv(override=True)
+    before = ui_cfg()
+    HITACHI_RED  = os.getenv("HITACHI_RED", HITACHI_RED)
+    AVATAR_ID    = os.getenv("AVATAR_ID", AVATAR_ID)
+    AVATAR_STYLE = os.getenv("AVATAR_STYLE", AVATAR_STYLE)
+    SPEECH_LANG  = os.getenv("SPEECH_LANG", SPEECH_LANG)
+    SPEECH_VOICE = os.getenv("SPEECH_VOICE", SPEECH_VOICE)
+    STT_USE_WARM_STREAM = os.getenv("STT_USE_WARM_STREAM", "1" if STT_USE_WARM_STREAM else "0").lower() in ("1", "true", "yes")
+    EVENT_TZ   = os.getenv("EVENT_TZ", EVENT_TZ)
+    EVENT_DATE = os.getenv("EVENT_DATE", EVENT_DATE)
+    EVENT_CITY = os.getenv("EVENT_CITY", EVENT_CITY)
+    EVENT_NAME = os.getenv("EVENT_NAME", EVENT_NAME)
+    _UI_CFG = None
+    after = ui_cfg()
+    changed = [k for k in after if after[k] != before.get(k)]
+    if changed:
+        _ANSWER_CTX = _answer_context()
+        _WELCOME_SKELETON = None
+    _STATIC.reload()
+    _PAGES.bump()
+    await asyncio.to_thread(_KNOWLEDGE.load, os.getenv("EVENT_CONTENT_FILE", _KNOWLEDGE.path))
+    log.info("Config reloaded; changed: %s", ", ".join(changed) or "nothing")
+    return changed
 
 @app.get("/api/config")
 async def api_config():
     return ui_cfg()
 
 # ===== Pages ==================================================================
+# Rendered once per (template, base URL, flags) and config version — see page_cache
+_PAGES = PageCache()
+
+def _page(request: Request, template: str, *, vary: tuple = (), slot: Optional[str] = None, **ctx) -> Response:
+    """Serve a config-only page from the cache, rendering on a miss. Pass the per-guest value as
+    `slot` and SLOT in its place in `ctx`. Revalidations with a matching ETag get a 304."""
+    key = (template, str(request.base_url)) + vary
+    item = _PAGES.get(key)
+    if item is None:
+        html = _templates().get_template(template).render({"request": request, "cfg": ui_cfg(), **ctx})
+        item = _PAGES.put(key, html.encode("utf-8"))
+    body, etag = item
+    if slot is not None:
+        body = fill_slot(body, slot)
+        etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        _PAGES.counters["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(body, headers=headers)
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     sid = request.cookies.get(SESSION_COOKIE)
-    sess = get_session(sid)
+    sess = await get_session(sid)
     if sess:
         return RedirectResponse("/guide")
     return RedirectResponse("/register")
 
 @app.get("/register", response_class=HTMLResponse)
 async def page_register(request: Request):
-    return templates.TemplateResponse("register.html", {"request": request, "cfg": ui_cfg()})
+    return _page(request, "register.html")
 
 # Kept for back-compat: if something tries /transition, just go to /guide.
 @app.get("/transition", response_class=HTMLResponse)
@@ -231,11 +463,12 @@ async def page_transition(_: Request):
 @app.get("/guide", response_class=HTMLResponse)
 async def page_guide(request: Request):
     sid = request.cookies.get(SESSION_COOKIE)
-    return templates.TemplateResponse("guide.html", {"request": request, "cfg": ui_cfg(), "has_sid": bool(get_session(sid))})
+    has_sid = bool(await get_session(sid))
+    return _page(request, "guide.html", vary=(has_sid,), has_sid=has_sid)
 
 @app.get("/ended", response_class=HTMLResponse)
 async def page_ended(request: Request):
-    return templates.TemplateResponse("ended.html", {"request": request, "cfg": ui_cfg()})
+    return _page(request, "ended.html")
 
 # ===== Registration + session =================================================
 @app.post("/api/register")
@@ -246,12 +479,20 @@ async def api_register(name: str = Form(...), company: str = Form(...)):
         raise HTTPException(400, "Name and Company are required")
 
     sid = new_sid()
+    bind_session(sid)
     now = _now_utc()
-    SESSIONS[sid] = Session(
+    warm_thread = None
+    if _thread_pool_enabled():
+        _WARM_THREADS.note_registration()
+        warm_thread = _WARM_THREADS.take()
+    sess = Session(
         sid=sid, name=name, company=company,
         created_at=now, last_active=now, active=True,
-        expires_at=now + timedelta(seconds=SESSION_TTL_SECS)
+        expires_at=now + timedelta(seconds=SESSION_TTL_SECS),
+        agent_thread_id=warm_thread or "",
     )
+    await save_session(sess)
+    _start_welcome(sess)  # speculative: the welcome is usually ready before /guide asks for it
 
     res = JSONResponse({"ok": True, "sid": sid, "next": "/guide"})
     # Persistent cookie (readable by JS because UI reads it; change httponly if you refactor)
@@ -273,96 +514,178 @@ class SidBody(BaseModel):
 @app.post("/api/session/start")
 async def api_session_start(body: SidBody):
     sid = body.sid or ""
-    sess = get_session(sid)
+    sess = await get_session(sid)
     if not sess:
         raise HTTPException(404, "Session not found")
     sess.active = True
-    touch_sid(sid)
+    await touch_session(sess, "active")
     return {"ok": True}
 
 @app.post("/api/session/end")
 async def api_session_end(body: SidBody):
     sid = body.sid or ""
-    sess = get_session(sid)
+    sess = await get_session(sid)
+    if _sched:
+        _sched.release(sid)
     if sess:
         sess.active = False
-        touch_sid(sid)
+        await touch_session(sess, "active")
     return {"ok": True}
 
-# ===== Tokens (Speech + Relay) ===============================================
-_SPEECH_TOKEN_CACHE_LOCK = threading.Lock()
-_SPEECH_TOKEN_CACHE: Dict[str, Dict[str, object]] = {}  # {resource_id: {"token": str, "exp": int, "region": str}}
-
-def _resource_id(region: str, key: str) -> str:
-    head = key[:6] if key else ""
-    return f"{region}:{head}"
+@app.get("/api/session/stats")
+async def api_session_stats():
+    return await _SESSIONS.stats()
 
-def _get_cached_speech_token(region: str, key: str) -> Optional[Dict[str, object]]:
-    rid = _resource_id(region, key)
-    with _SPEECH_TOKEN_CACHE_LOCK:
-        data = _SPEECH_TOKEN_CACHE.get(rid)
-        if not data:
-            return None
-        # Keep 60s safety margin
-        if int(data.get("exp", 0)) - int(time.time()) <= 60:
-            _SPEECH_TOKEN_CACHE.pop(rid, None)
-            return None
-        return data
-
-def _set_cached_speech_token(region: str, key: str, token: str, ttl_sec: int = 8 * 60):
-    rid = _resource_id(region, key)
-    with _SPEECH_TOKEN_CACHE_LOCK:
-        _SPEECH_TOKEN_CACHE[rid] = {"token": token, "exp": int(time.time()) + ttl_sec, "region": region}
+# ===== Tokens (Speech + Relay) ===============================================
+SPEECH_TOKEN_TTL_SECS = int(os.getenv("SPEECH_TOKEN_TTL_SECS", str(8 * 60)))  # STS tokens live 10 min
+RELAY_TOKEN_TTL_SECS  = int(os.getenv("RELAY_TOKEN_TTL_SECS", "300"))       # used when the response has no TTL
 
-@app.get("/speech-token")
-@app.get("/api/speech/token")  # alias
-async def speech_token():
-    res = _next_speech_resource()
-    region, key = res["region"], res["key"]
-    cached = _get_cached_speech_token(region, key)
-    if cached:
-        return {"token": cached["token"], "region": cached["region"], "expiresAt": cached["exp"]}
-
-    url = f"https://{region}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
+async def _fetch_speech_token(res: SpeechResource):
+    region, key = res.region, res.key
+    url = SPEECH_STS_URL.format(region=region)
     headers = {
         "Ocp-Apim-Subscription-Key": key,
         "Content-Length": "0",
     }
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.post(url, headers=headers)
-        if r.status_code >= 400:
-            log.error("speech-token error: %s %s", r.status_code, r.text)
-            raise HTTPException(r.status_code, "Failed to issue speech token")
-        token = r.text.strip()
-
-    _set_cached_speech_token(region, key, token, ttl_sec=8 * 60)
-    return {"token": token, "region": region, "expiresAt": int(time.time()) + 8 * 60}
+    try:
+        r = await _speech_upstream(res, "POST", url, headers=headers)
+    except Exception as e:
+        log.error("speech-token request to %s failed: %s", res.rid, e)
+        raise HTTPException(502, "Speech token request failed")
+    if r.status_code >= 400:
+        log.error("speech-token error: %s %s", r.status_code, r.text)
+        raise HTTPException(r.status_code, "Failed to issue speech token")
+    return r.text.strip(), SPEECH_TOKEN_TTL_SECS
+
+def _relay_ttl(data) -> float:
+    """Validity of a relay credential: explicit TTL/expiry fields, TURN REST 'expiry:user' usernames, else default."""
+    if not isinstance(data, dict):
+        return RELAY_TOKEN_TTL_SECS
+    fields = {str(k).lower(): v for k, v in data.items()}
+    now = time.time()
+    try:
+        for k in ("expiresin", "expires_in", "ttl"):
+            if fields.get(k) is not None:
+                return max(0.0, float(fields[k]))
+        for k in ("expireson", "expiresat", "expires_at", "expiration"):
+            v = fields.get(k)
+            if v is None:
+                continue
+            if isinstance(v, (int, float)) or str(v).isdigit():
+                return max(0.0, float(v) - now)
+            return max(0.0, datetime.fromisoformat(str(v).replace("Z", "+00:00")).timestamp() - now)
+    except Exception:
+        pass
+    head = str(fields.get("username") or "").split(":", 1)[0]
+    if head.isdigit() and int(head) > now:
+        return float(int(head) - now)
+    return RELAY_TOKEN_TTL_SECS
 
-@app.get("/relay-token")
-async def relay_token():
-    # For Microsoft Avatar WebRTC relay discovery
-    res = _next_speech_resource()
-    region, key = res["region"], res["key"]
-    url = f"https://{region}.tts.speech.microsoft.com/cognitiveservices/avatar/relay/token/v1"
+async def _fetch_relay_token(res: SpeechResource):
+    url = SPEECH_RELAY_URL.format(region=res.region)
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.get(url, headers={"Ocp-Apim-Subscription-Key": key})
-        if r.status_code == 200:
-            return r.json()
-        raise HTTPException(r.status_code, f"Relay token error {r.status_code}: {r.text[:200]}")
+        r = await _speech_upstream(res, "GET", url, headers={"Ocp-Apim-Subscription-Key": res.key})
     except Exception as e:
         raise HTTPException(502, f"Relay token request failed: {e}")
+    if r.status_code != 200:
+        raise HTTPException(r.status_code, f"Relay token error {r.status_code}: {r.text[:200]}")
+    data = r.json()
+    return data, _relay_ttl(data)
+
+_SPEECH_TOKENS = CredentialCache("speech-token", _fetch_speech_token, min_ttl_left=60, refresh_ahead=120)
+_RELAY_TOKENS  = CredentialCache("relay-token", _fetch_relay_token, min_ttl_left=30, refresh_ahead=60)
+
+async def _scheduled_token(cache: CredentialCache, sid: Optional[str]):
+    """Credential from the guest's resource; on throttling/outage (429, 5xx, or a transport error — the fetchers
+    report those as 502), re-pick once, away from the resource that failed."""
+    res = _next_speech_resource(sid)
+    try:
+        return res, await cache.get(res.rid, res)
+    except HTTPException as e:
+        if e.status_code != 429 and e.status_code < 500:
+            raise
+        if _sched:
+            _sched.release(sid)
+        retry = _next_speech_resource(sid, exclude=res)
+        if retry is res:
+            raise
+        return retry, await cache.get(retry.rid, retry)
+
+@app.get("/speech-token")
+@app.get("/api/speech/token")  # alias
+async def speech_token(request: Request):
+    res, entry = await _scheduled_token(_SPEECH_TOKENS, request.cookies.get(SESSION_COOKIE))
+    return {"token": entry.value, "region": res.region, "expiresAt": int(entry.expires_at)}
+
+@app.get("/relay-token")
+async def relay_token(request: Request):
+    # For Microsoft Avatar WebRTC relay discovery
+    _, entry = await _scheduled_token(_RELAY_TOKENS, request.cookies.get(SESSION_COOKIE))
+    return entry.value
+
+@app.get("/api/speech/stats")
+async def speech_stats():
+    if not _sched:
+        _init_pool()
+    return {
+        "scheduler": _sched.stats() if _sched else None,
+        "speech_token": _SPEECH_TOKENS.stats(),
+        "relay_token": _RELAY_TOKENS.stats(),
+    }
+
+SPEECH_PROBE_INTERVAL_SECS = float(os.getenv("SPEECH_PROBE_INTERVAL_SECS", "5"))
+
+async def _speech_probe_loop():
+    """Recovery probes for tripped resources (an STS call closes or re-opens the circuit) + idle pin reaping."""
+    while True:
+        await asyncio.sleep(SPEECH_PROBE_INTERVAL_SECS)
+        if not _sched:
+            continue
+        try:
+            _sched.reap_idle_pins()
+            for res in _sched.due_probes():
+                try:
+                    await _SPEECH_TOKENS.refresh_now(res.rid, res)
+                except Exception as e:
+                    log.info("speech probe %s failed: %s", res.rid, e)
+        except Exception:
+            log.exception("speech probe loop error")
 
 # ===== Azure Agent client/credential (cached) =================================
 _CLIENT_LOCK = threading.Lock()
 _PROJECT_CLIENT: Optional["AIProjectClient"] = None
 _AGENT_OBJ = None
 _CREDENTIAL = None  # Optional["TokenCredential"]
-
-def _build_credential():
-    from azure.identity import DefaultAzureCredential
+_SDK_LOCK = threading.Lock()
+
+def _load_agent_sdk(aio: bool = False):
+    """Import the Agents SDK (+ azure.identity) on first use and return the sync or aio
+    AIProjectClient class. Blocking; callers run it on the Agent worker pool, not the event loop."""
+    global AIProjectClient, ListSortOrder
+    with _SDK_LOCK:
+        if AIProjectClient is None:
+            t0 = time.perf_counter()
+            from azure.ai.projects import AIProjectClient as client_cls  # type: ignore
+            from azure.ai.agents.models import ListSortOrder as order  # type: ignore
+            import azure.identity  # noqa: F401  (used by _build_credential)
+            AIProjectClient, ListSortOrder = client_cls, order
+            log.info("Azure AI SDK imported in %.0f ms", (time.perf_counter() - t0) * 1000)
+    if aio:
+        from azure.ai.projects.aio import AIProjectClient as aio_cls  # type: ignore
+        import azure.identity.aio  # noqa: F401
+        return aio_cls
+    return AIProjectClient
+
+def _build_credential(aio: bool = False):
+    if FAKE_AZURE_URL or AZURE_CREDENTIAL == "static":
+        inner = AsyncStaticTokenCredential() if aio else StaticTokenCredential()
+        return AsyncPrefetchingCredential(inner) if aio else PrefetchingCredential(inner)
+    if aio:
+        from azure.identity.aio import DefaultAzureCredential
+    else:
+        from azure.identity import DefaultAzureCredential
     mi_present = bool(os.getenv("IDENTITY_ENDPOINT") or os.getenv("MSI_ENDPOINT"))
-    return DefaultAzureCredential(
+    inner = DefaultAzureCredential(
         exclude_environment_credential=False,
         exclude_managed_identity_credential=not mi_present,
         exclude_shared_token_cache_credential=True,
@@ -370,24 +693,147 @@ def _build_credential():
         exclude_powershell_credential=True,
         exclude_workload_identity_credential=True,
     )
+    # Cached + refreshed in the background (see credentials), so AAD is off the request path
+    return AsyncPrefetchingCredential(inner) if aio else PrefetchingCredential(inner)
 
 def _get_client_and_agent():
     global _PROJECT_CLIENT, _AGENT_OBJ, _CREDENTIAL
     if not agent_config_ok():
         raise HTTPException(500, "Agent not configured")
-    if AIProjectClient is None:
+    if not AGENT_SDK_AVAILABLE:
         raise HTTPException(500, "Azure AI SDK not installed")
     if _PROJECT_CLIENT and _AGENT_OBJ:
         return _PROJECT_CLIENT, _AGENT_OBJ
     with _CLIENT_LOCK:
         if _PROJECT_CLIENT and _AGENT_OBJ:
             return _PROJECT_CLIENT, _AGENT_OBJ
+        client_cls = _load_agent_sdk()
         _CREDENTIAL = _build_credential()
-        client = AIProjectClient(endpoint=PROJECT_ENDPOINT, credential=_CREDENTIAL)
+        client = client_cls(endpoint=PROJECT_ENDPOINT, credential=_CREDENTIAL)
         agent = client.agents.get_agent(AGENT_ID)
         _PROJECT_CLIENT, _AGENT_OBJ = client, agent
         return client, agent
 
+# ---- Async facade (aio client when available, thread pool otherwise) --------
+_OPS_LOCK = asyncio.Lock()
+_AGENT_OPS: Optional[AgentOps] = None
+_OPS_AGENT = None
+_ASYNC_CREDENTIAL = None
+
+async def _build_async_client_and_agent():
+    global _ASYNC_CREDENTIAL
+    AsyncAIProjectClient = await run_blocking(_load_agent_sdk, True)
+    _ASYNC_CREDENTIAL = _build_credential(aio=True)
+    client = AsyncAIProjectClient(endpoint=PROJECT_ENDPOINT, credential=_ASYNC_CREDENTIAL)
+    agent = await client.agents.get_agent(AGENT_ID)
+    return client, agent
+
+async def _get_agent_ops():
+    """Awaitable counterpart of _get_client_and_agent(); never blocks the event loop."""
+    global _AGENT_OPS, _OPS_AGENT
+    if not agent_config_ok():
+        raise HTTPException(500, "Agent not configured")
+    if not AGENT_SDK_AVAILABLE:
+        raise HTTPException(500, "Azure AI SDK not installed")
+    if _AGENT_OPS and _OPS_AGENT:
+        return _AGENT_OPS, _OPS_AGENT
+    async with _OPS_LOCK:
+        if _AGENT_OPS and _OPS_AGENT:
+            return _AGENT_OPS, _OPS_AGENT
+        if async_sdk_available():
+            try:
+                client, agent = await _build_async_client_and_agent()
+                _AGENT_OPS, _OPS_AGENT = AgentOps(client, is_async=True), agent
+                log.info("Agents: using aio client")
+                return _AGENT_OPS, _OPS_AGENT
+            except Exception:
+                if AGENT_ASYNC_CLIENT in ("1", "true", "yes"):
+                    raise
+                log.warning("Agents: aio client unavailable; falling back to thread pool", exc_info=True)
+        client, agent = await run_blocking(_get_client_and_agent)
+        _AGENT_OPS, _OPS_AGENT = AgentOps(client, is_async=False), agent
+        return _AGENT_OPS, _OPS_AGENT
+
+# ---- Startup initialisation + readiness ---------------------------------------
+AGENT_EAGER_INIT         = os.getenv("AGENT_EAGER_INIT", "1").lower() in ("1", "true", "yes")
+AGENT_INIT_TIMEOUT_SECS  = float(os.getenv("AGENT_INIT_TIMEOUT_SECS", "20"))
+AGENT_INIT_RETRY_SECS    = float(os.getenv("AGENT_INIT_RETRY_SECS", "30"))
+TOKEN_REFRESH_CHECK_SECS = float(os.getenv("TOKEN_REFRESH_CHECK_SECS", "30"))
+# 1 = report not-ready while Azure is unreachable; 0 = stay routable and serve lazily / fallbacks
+READY_REQUIRE_AGENT      = os.getenv("READY_REQUIRE_AGENT", "0").lower() in ("1", "true", "yes")
+
+_AGENT_STATE = {"state": "starting" if AGENT_EAGER_INIT else "lazy", "error": None, "since": time.time()}
+
+def _set_agent_state(state: str, error: Optional[str] = None):
+    _AGENT_STATE.update(state=state, error=error, since=time.time())
+
+def _active_credential():
+    if _AGENT_OPS is not None and _AGENT_OPS.is_async:
+        return _ASYNC_CREDENTIAL
+    return _CREDENTIAL
+
+async def _init_agent():
+    """Build the client, fetch the agent and prefetch the AAD token before traffic arrives.
+    On failure requests keep initialising lazily (as before) while this retries with backoff."""
+    if not agent_config_ok() or not AGENT_SDK_AVAILABLE:
+        _set_agent_state("disabled")
+        return
+    delay = AGENT_INIT_RETRY_SECS
+    _set_agent_state("starting")
+    while True:
+        t0 = time.perf_counter()
+        try:
+            async with asyncio.timeout(AGENT_INIT_TIMEOUT_SECS):
+                await _get_agent_ops()
+                cred = _active_credential()
+                if cred is not None:
+                    await cred.prefetch()
+            _set_agent_state("ready")
+            log.info("Agent client ready in %.0f ms", (time.perf_counter() - t0) * 1000)
+            return
+        except Exception as e:
+            _set_agent_state("degraded", f"{type(e).__name__}: {e}")
+            log.warning("Agent init failed (%s); serving lazily, retry in %.0fs", e, delay)
+        await asyncio.sleep(delay)
+        delay = min(300.0, delay * 2)
+
+async def _token_refresher():
+    while True:
+        await asyncio.sleep(TOKEN_REFRESH_CHECK_SECS)
+        cred = _active_credential()
+        if cred is None or not hasattr(cred, "refresh_due"):
+            continue
+        try:
+            await cred.refresh_due()
+        except Exception:
+            log.exception("token refresher error")
+
+@app.get("/healthz/ready")
+async def healthz_ready():
+    state = _AGENT_STATE["state"]
+    ready = state in ("ready", "disabled") or (state in ("degraded", "lazy") and not READY_REQUIRE_AGENT)
+    cred = _active_credential()
+    body = {
+        "ready": ready,
+        "agent": state,
+        "agent_error": _AGENT_STATE["error"],
+        "agent_state_age_s": round(time.time() - _AGENT_STATE["since"], 1),
+        "credential": cred.stats() if cred is not None and hasattr(cred, "stats") else None,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+# ---- Warm thread pool (see warm_threads) -------------------------------------
+_WARM_THREADS = WarmThreadPool()
+
+def _thread_pool_enabled() -> bool:
+    return THREAD_POOL and agent_config_ok() and AGENT_SDK_AVAILABLE
+
+async def _pool_ops():
+    return (await _get_agent_ops())[0]
+
+async def _new_thread_id(ops: AgentOps) -> str:
+    return _WARM_THREADS.take() or (await ops.create_thread()).id
+
 # ===== Helpers for parsing agent replies ======================================
 def _extract_text(msg):
     try:
@@ -405,16 +851,7 @@ def _extract_text(msg):
     return None
 
 def _parse_payload(s: str):
-    s2 = (s or "").strip()
-    if s2.startswith("```"):
-        fence = "```json" if s2.lower().startswith("```json") else "```"
-        s2 = s2[len(fence):].strip()
-        if s2.endswith("```"):
-            s2 = s2[:-3].strip()
-    try:
-        return json.loads(s2)
-    except Exception:
-        return {"narration": s, "briefing_md": "", "image": None}
+    return parse_payload(s)
 
 def _now_local_str() -> str:
     try:
@@ -422,307 +859,839 @@ def _now_local_str() -> str:
     except Exception:
         return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
 
+def _role_name(msg) -> str:
+    return str(getattr(getattr(msg, "role", None), "name", "")).lower()
+
+async def _prepare_agent_turn(ops: AgentOps, sess: Optional[Session], content: str):
+    """Ensure the session has a thread and post `content` to it. Returns (thread_id, preamble or None)."""
+    await _await_thread_sync(sess)
+    thread_id = getattr(sess, "agent_thread_id", "") if sess else ""
+    if not thread_id:
+        thread_id = await _new_thread_id(ops)
+        if sess:
+            sess.agent_thread_id = thread_id
+            await save_session(sess, "agent_thread_id")
+
+    should_seed = not bool(getattr(sess, "agent_ctx_seeded", False)) if sess else True
+    preamble = build_assist_preamble(
+        event_name=EVENT_NAME,
+        event_city=EVENT_CITY,
+        event_date=EVENT_DATE,
+        event_tz=EVENT_TZ,
+        now_local=_now_local_str()
+    ) if should_seed else None
+
+    await ops.create_message(thread_id, content)
+    return thread_id, preamble
+
+_RUN_WAITER = get_waiter()
+
+async def _run_agent_turn(ops: AgentOps, agent, sess: Optional[Session], content: str):
+    """Post `content`, run the Agent and wait for completion (see run_waiter). Returns (thread_id, run)."""
+    thread_id, preamble = await _prepare_agent_turn(ops, sess, content)
+    run = await _RUN_WAITER.run(ops, thread_id, agent.id, additional_instructions=preamble)
+    if preamble and sess:
+        sess.agent_ctx_seeded = True
+        sess.thread_tokens += approx_tokens(preamble)
+        await save_session(sess, "agent_ctx_seeded", "thread_tokens")
+    return thread_id, run
+
+# Reply sources that are provably this run's output; "messages_list_newest" may be an earlier answer
+_OWN_REPLY_SOURCES = ("output_messages", "messages_list")
+
+async def _fetch_reply_text(ops: AgentOps, thread_id: str, run) -> Tuple[Optional[str], str]:
+    """Agent text for `run`: output_messages first, then the newest page of the thread. Returns (text, source)."""
+    with AGENT_STAGE.time("message_fetch"):
+        txt, source = await _fetch_reply_text_inner(ops, thread_id, run)
+    AGENT_REPLY_SOURCE.inc(source)
+    return txt, source
+
+async def _fetch_reply_text_inner(ops: AgentOps, thread_id: str, run):
+    try:
+        output_ids = getattr(run, "output_messages", None) or []
+    except Exception:
+        output_ids = []
+
+    if output_ids and ops.can_get_message:
+        for mid in output_ids:
+            try:
+                m = await ops.get_message(thread_id, mid)
+            except Exception:
+                continue
+            if _role_name(m) != "agent":
+                continue
+            txt = _extract_text(m)
+            if txt:
+                return txt, "output_messages"
+
+    list_kwargs = {"thread_id": thread_id, "limit": 20}
+    if ListSortOrder is not None:
+        list_kwargs["order"] = ListSortOrder.DESCENDING
+    msgs = await ops.list_messages(**list_kwargs)
+
+    newest_agent_any = None
+    for m in msgs:
+        if _role_name(m) != "agent":
+            continue
+        if newest_agent_any is None:
+            newest_agent_any = m
+        mid_run_id = getattr(m, "run_id", None)
+        if mid_run_id and str(mid_run_id) == str(run.id):
+            txt = _extract_text(m)
+            if txt:
+                return txt, "messages_list"
+
+    if newest_agent_any is not None:
+        return _extract_text(newest_agent_any), "messages_list_newest"
+    return None, "none"
+
 # ===== Assist endpoint ========================================================
+_TRANSCRIPTS = TranscriptWriter()
+# Post-event analytics over what _TRANSCRIPTS wrote (see log_index, scripts/index_logs.py)
+_LOG_INDEX = LogIndex(_TRANSCRIPTS.directory)
+
+def _log_turn(sid: Optional[str], user_name: str, text: str, narration: str, briefing_md: str, source: str = ""):
+    # Queued; the transcript writer batches it to disk off the event loop
+    _TRANSCRIPTS.submit(turn_record(sid, user_name, text, narration, briefing_md, source, request_elapsed_ms()))
+
+def _offline_payload(text: str) -> dict:
+    """Canned answer when the Agent isn't configured (local dev / demo)."""
+    local = _KNOWLEDGE.answer(text, fallback=True)
+    if local is not None:
+        return local
+    topic = text or "Welcome"
+    return {
+        "narration": f"{topic}: Here's what you need to know for the HARC AI Launch.",
+        "briefing_md": (
+            f"### {topic}\n"
+            f"- Venue: Hall A (Ground Floor)\n"
+            f"- Time: 10:00–17:00\n"
+            f"- Tip: Use the quick chips (Agenda, Venue Map, Speakers, Help)\n"
+        ),
+        "image": {"url": "/static/assets/venue-map.png", "alt": "Venue map"},
+    }
+
+def _unavailable_payload(text: str, *, local: bool = True) -> dict:
+    """Fallback when the Agent can't answer: a close match from the event content, else a generic brief."""
+    found = _KNOWLEDGE.answer(text, fallback=True) if local else None
+    if found is not None:
+        return found
+    return {
+        "narration": "I couldn’t reach the agent service just now. Here’s a quick brief.",
+        "briefing_md": f"### {text or 'Info'}\n- The service is temporarily unavailable.\n- Please try again in a moment.",
+    }
+
+def _busy_payload(text: str, retry_after: float) -> dict:
+    """Shed by admission control: the local answer if there is one, else the generic brief plus a
+    hint for the UI to retry."""
+    found = _KNOWLEDGE.answer(text, fallback=True)
+    if found is not None:
+        return found
+    return {**_unavailable_payload(text, local=False), "busy": True, "retry_after": retry_after}
+
+def _failed_payload(run) -> dict:
+    return {"narration": "Agent run failed.", "briefing_md": f"### Error\n- {getattr(run, 'last_error', 'unknown')}"}
+
+# ---- Quick-chip answer cache (see answer_cache) -----------------------------
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+_ANSWERS = AnswerCache()
+# Everything the Agent is told about the event except the clock; a change here changes every key
+def _answer_context() -> str:
+    return context_hash(
+        AGENT_ID or "",
+        build_assist_preamble(event_name=EVENT_NAME, event_city=EVENT_CITY, event_date=EVENT_DATE,
+                              event_tz=EVENT_TZ, now_local=""),
+    )
+
+_ANSWER_CTX = _answer_context()
+# Agenda / speakers / venue / FAQ answered from EVENT_CONTENT_FILE (see knowledge); loaded at startup
+_KNOWLEDGE = KnowledgeIndex()
+# sid -> pending append of a cached exchange. Process-local, like _TURNS and _WELCOMES: with
+# SESSION_STORE=redis a guest still has to stay on one worker (sticky sessions) for turns to keep order
+_THREAD_SYNC: Dict[str, asyncio.Task] = {}
+
+def _answer_key(text: str) -> Optional[str]:
+    if not agent_config_ok() or not AGENT_SDK_AVAILABLE:
+        return None
+    return _ANSWERS.key_for(text, _ANSWER_CTX)
+
+def _shareable(sess: Optional[Session], payload: Optional[dict]) -> bool:
+    """Only cache real answers, and never one that addresses this guest by name."""
+    if not payload or not (payload.get("narration") or payload.get("briefing_md")):
+        return False
+    name = (getattr(sess, "name", "") or "").strip().lower()
+    if name and name in (str(payload.get("narration", "")) + str(payload.get("briefing_md", ""))).lower():
+        _ANSWERS.counters["skipped"] += 1
+        return False
+    return True
+
+async def _append_cached_exchange(sess: Session, text: str, payload: dict):
+    ops, _ = await _get_agent_ops()
+    if not sess.agent_thread_id:
+        sess.agent_thread_id = await _new_thread_id(ops)
+        await save_session(sess, "agent_thread_id")
+    reply = json.dumps(payload, ensure_ascii=False)
+    await ops.create_message(sess.agent_thread_id, text)
+    await ops.create_message(sess.agent_thread_id, reply, role="assistant")
+    await save_session(sess, *_note_thread_exchange(sess, text, reply, payload.get("narration", "")))
+
+def _thread_write_later(sess: Session, work: Callable[[], Awaitable]) -> asyncio.Task:
+    """Run `work` on the guest's thread after its pending writes and running turn; the next turn waits for it."""
+    sid, prev = sess.sid, _THREAD_SYNC.get(sess.sid)
+    busy = _TURNS.busy(sid)  # a run may be active on the thread right now; go after it
+
+    async def run():
+        for t in (prev, busy):
+            if t is not None:
+                await asyncio.gather(t, return_exceptions=True)
+        await work()
+
+    task = asyncio.create_task(run())
+    _THREAD_SYNC[sid] = task
+    task.add_done_callback(lambda t: _THREAD_SYNC.pop(sid, None) if _THREAD_SYNC.get(sid) is t else None)
+    return task
+
+def _sync_thread_later(sess: Optional[Session], text: str, payload: dict):
+    """Append a cache-served exchange to the guest's thread so later turns see it; in order, off the request."""
+    if not sess:
+        return
+
+    async def append():
+        try:
+            await _append_cached_exchange(sess, text, payload)
+            _ANSWERS.counters["thread_appends"] += 1
+        except Exception as e:
+            _ANSWERS.counters["thread_append_failures"] += 1
+            log.warning("cached exchange not appended to thread (sid=%s): %s", sess.sid, e)
+
+    _thread_write_later(sess, append)
+
+# ---- Thread rotation (see thread_context) -----------------------------------
+def _note_thread_exchange(sess: Optional[Session], question: Optional[str], reply: str, narration: str = "",
+                          *, recap: bool = True) -> Tuple[str, ...]:
+    """Count an exchange against the guest's thread; schedules a rotation once it is too long.
+    Returns the session fields the caller should persist."""
+    if not sess:
+        return ()
+    if note_exchange(sess, question, reply, narration, recap=recap):
+        _thread_write_later(sess, lambda: _rotate_thread(sess))
+    return ("thread_turns", "thread_tokens", "thread_recap")
+
+async def _rotate_thread(sess: Session):
+    """Move the guest to a fresh thread seeded with a recap; the old one is deleted."""
+    if not should_rotate(sess):
+        return  # already rotated by an earlier scheduled call
+    old = sess.agent_thread_id
+    try:
+        ops, _ = await _get_agent_ops()
+        new_id = await _new_thread_id(ops)
+        recap = recap_message(sess)
+        if recap:
+            await ops.create_message(new_id, recap, role="assistant")
+    except Exception as e:
+        THREAD_CTX_STATS["rotation_failures"] += 1
+        log.warning("thread rotation failed (sid=%s): %s", sess.sid, e)
+        return
+    turns, tokens = sess.thread_turns, sess.thread_tokens
+    reset_for_thread(sess, new_id, recap)
+    await save_session(sess, *THREAD_FIELDS)
+    log.info("thread rotated (sid=%s): %d turns, ~%d tokens", sess.sid, turns, tokens)
+    try:
+        await ops.delete_thread(old)
+    except Exception as e:
+        log.debug("old thread %s not deleted: %s", old, e)
+
+async def _await_thread_sync(sess: Optional[Session]):
+    task = _THREAD_SYNC.get(sess.sid) if sess else None
+    if task is None or task is asyncio.current_task():
+        return
+    await asyncio.gather(task, return_exceptions=True)
+    # The background work may have created, seeded or rotated the thread on its own copy of the session
+    fresh = await get_session(sess.sid)
+    if fresh is None or fresh is sess or not fresh.agent_thread_id:
+        return
+    if fresh.agent_thread_id != sess.agent_thread_id:
+        for f in THREAD_FIELDS:
+            setattr(sess, f, getattr(fresh, f))
+    else:
+        sess.agent_ctx_seeded = sess.agent_ctx_seeded or fresh.agent_ctx_seeded
+
+async def _knowledge_answer(sid: Optional[str], sess: Optional[Session], text: str) -> Optional[dict]:
+    """Confident match in the local event content: answered here, no Agent run."""
+    payload = _KNOWLEDGE.answer(text)
+    if payload is None:
+        return None
+    user_name = getattr(sess, "name", "Guest") if sess else "Guest"
+    _log_turn(sid, user_name, text, payload.get("narration", ""), payload.get("briefing_md", ""), "knowledge")
+    if agent_config_ok() and AGENT_SDK_AVAILABLE:
+        _sync_thread_later(sess, text, payload)
+    await touch_session(sess)
+    return payload
+
+async def _cached_answer(key: Optional[str], sid: Optional[str], sess: Optional[Session], text: str) -> Optional[dict]:
+    if not key:
+        return None
+    payload = await _ANSWERS.lookup(key)
+    if payload is None:
+        return None
+    user_name = getattr(sess, "name", "Guest") if sess else "Guest"
+    _log_turn(sid, user_name, text, payload.get("narration", ""), payload.get("briefing_md", ""), "cache")
+    _sync_thread_later(sess, text, payload)
+    await touch_session(sess)
+    return payload
+
+def _require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Not found")
+    auth = request.headers.get("authorization", "")
+    token = request.headers.get("x-admin-token") or (auth[7:] if auth.lower().startswith("bearer ") else "")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(403, "Forbidden")
+
+@app.post("/api/admin/answer-cache/invalidate")
+async def admin_answer_cache_invalidate(request: Request, body: dict = Body(default={})):
+    """Drop cached chip answers (all, or one prompt) — e.g. after the agenda changes."""
+    _require_admin(request)
+    return {"ok": True, "invalidated": _ANSWERS.invalidate(body.get("prompt") or None)}
+
+@app.post("/api/admin/config/reload")
+async def admin_config_reload(request: Request):
+    """Pick up edited UI/event settings without a restart; cached pages (and their ETags) reset."""
+    _require_admin(request)
+    changed = await reload_config()
+    return {"ok": True, "changed": changed, "pages": _PAGES.stats()}
+
+@app.post("/api/admin/loop/reset")
+async def admin_loop_reset(request: Request):
+    """Restart event-loop lag accounting (e.g. at the start of a load test)."""
+    _require_admin(request)
+    _LOOP.reset()
+    return {"ok": True}
+
+@app.get("/api/admin/log-index")
+async def admin_log_index(request: Request, top: int = 20, update: bool = True):
+    """Session-log analytics: turns by answer source, failure rate, latency, top questions, precompute candidates."""
+    _require_admin(request)
+    if update:
+        await _TRANSCRIPTS.flush()
+        await asyncio.to_thread(_LOG_INDEX.update)
+
+    def _report():
+        return {"summary": _LOG_INDEX.summary(), "top_questions": _LOG_INDEX.top_questions(top),
+                "precompute": _LOG_INDEX.precompute_candidates(), "index": _LOG_INDEX.stats()}
+    return await asyncio.to_thread(_report)
+
+@app.get("/api/loop/stats")
+async def loop_stats():
+    return _LOOP.stats()
+
+@app.get("/api/pages/stats")
+async def pages_stats():
+    return _PAGES.stats()
+
+# Serialized per session, coalesced by request_id, superseded by newer turns (see turns)
+_TURNS = TurnCoordinator()
+# Caps concurrent Agent turns; the rest queue fairly across sessions or are shed (see admission)
+_ADMISSION = AdmissionController()
+
+def _superseded_payload() -> dict:
+    return {"narration": "", "briefing_md": "", "image": None, "superseded": True}
+
 @app.post("/assist/run")
 async def assist_run(req: Request, body: dict = Body(default={})):
     text = (body.get("text") or "").strip()
     sid  = body.get("session_id") or req.cookies.get(SESSION_COOKIE)
-    # Prepare session log file path
-    session_log_dir = os.path.join(_APP_ROOT, "session_logs")
-    os.makedirs(session_log_dir, exist_ok=True)
-    log_file_path = os.path.join(session_log_dir, f"SessLog_{sid}.txt")
-    sess = get_session(sid)
+    bind_session(sid)
+    sess = await get_session(sid)
     user_name = getattr(sess, "name", "Guest") if sess else "Guest"
 
-    if not agent_config_ok() or AIProjectClient is None:
-        topic = text or "Welcome"
-        narration = f"{topic}: Here's what you need to know for the HARC AI Launch."
-        briefing_md = (
-            f"### {topic}\n"
-            f"- Venue: Hall A (Ground Floor)\n"
-            f"- Time: 10:00–17:00\n"
-            f"- Tip: Use the quick chips (Agenda, Venue Map, Speakers, Help)\n"
-        )
-        # Log interaction
-        with open(log_file_path, "a", encoding="utf-8") as f:
-            f.write(f"User: {user_name}: {text}\n")
-            f.write(f"HARCi: {narration}\n")
-            f.write(f"Briefing: {briefing_md}\n\n")
-        return JSONResponse({
-            "narration": narration,
-            "briefing_md": briefing_md,
-            "image": {"url": "/static/assets/venue-map.png", "alt": "Venue map"}
-        })
+    local = await _knowledge_answer(sid, sess, text)
+    if local is not None:
+        return JSONResponse(local, headers={"X-Answer-Source": "knowledge"})
 
-    try:
-        project, agent = _get_client_and_agent()
-        thread_id = getattr(sess, "agent_thread_id", None) or ""
-        if not thread_id:
-            thread = project.agents.threads.create()
-            thread_id = thread.id
-            if sess:
-                sess.agent_thread_id = thread_id
-
-        should_seed = not bool(getattr(sess, "agent_ctx_seeded", False)) if sess else True
-        preamble = build_assist_preamble(
-            event_name=EVENT_NAME,
-            event_city=EVENT_CITY,
-            event_date=EVENT_DATE,
-            event_tz=EVENT_TZ,
-            now_local=_now_local_str()
-        ) if should_seed else None
-
-        project.agents.messages.create(thread_id=thread_id, role="user", content=text)
-        run = project.agents.runs.create(
-            thread_id=thread_id,
-            agent_id=agent.id,
-            additional_instructions=preamble
-        )
-
-        if should_seed and sess:
-            sess.agent_ctx_seeded = True
-
-        deadline = time.time() + 30.0
-        while getattr(run, "status", None) not in ("completed", "failed") and time.time() < deadline:
-            time.sleep(0.25)
-            run = project.agents.runs.get(thread_id=thread_id, run_id=run.id)
-
-        if getattr(run, "status", None) == "failed":
-            log.error("Agent run failed: %s", getattr(run, "last_error", None))
-            narration = "Agent run failed."
-            briefing_md = f"### Error\n- {getattr(run, 'last_error', 'unknown')}"
-            with open(log_file_path, "a", encoding="utf-8") as f:
-                f.write(f"User: {user_name}: {text}\n")
-                f.write(f"HARCi: {narration}\n")
-                f.write(f"Briefing: {briefing_md}\n\n")
-            return JSONResponse(
-                {"narration": narration, "briefing_md": briefing_md},
-                status_code=500
-            )
+    if not agent_config_ok() or not AGENT_SDK_AVAILABLE:
+        payload = _offline_payload(text)
+        _log_turn(sid, user_name, text, payload["narration"], payload["briefing_md"], "offline")
+        return JSONResponse(payload)
 
-        try:
-            output_ids = getattr(run, "output_messages", None) or []
-        except Exception:
-            output_ids = []
-
-        response_logged = False
-        if output_ids:
-            get_by_id = getattr(project.agents.messages, "get", None)
-            if callable(get_by_id):
-                for mid in output_ids:
-                    try:
-                        m = project.agents.messages.get(thread_id=thread_id, message_id=mid)
-                    except Exception:
-                        continue
-                    role_name = str(getattr(getattr(m, "role", None), "name", "")).lower()
-                    if role_name != "agent":
-                        continue
-                    txt = _extract_text(m)
-                    if txt:
-                        payload = _parse_payload(txt)
-                        narration = payload.get("narration", "")
-                        briefing_md = payload.get("briefing_md", "")
-                        with open(log_file_path, "a", encoding="utf-8") as f:
-                            f.write(f"User: {user_name}: {text}\n")
-                            f.write(f"HARCi: {narration}\n")
-                            f.write(f"Briefing: {briefing_md}\n\n")
-                        response_logged = True
-                        touch_sid(sid or "")
-                        return JSONResponse(payload)
-
-        list_kwargs = {"thread_id": thread_id, "limit": 20}
-        if ListSortOrder is not None:
-            list_kwargs["order"] = ListSortOrder.DESCENDING
-        msgs = project.agents.messages.list(**list_kwargs)
-
-        chosen_payload = None
-        newest_agent_any = None
-        for m in msgs:
-            role_name = str(getattr(getattr(m, "role", None), "name", "")).lower()
-            if role_name != "agent":
-                continue
-            if newest_agent_any is None:
-                newest_agent_any = m
-            mid_run_id = getattr(m, "run_id", None)
-            if mid_run_id and str(mid_run_id) == str(run.id):
-                txt = _extract_text(m)
-                if txt:
-                    chosen_payload = _parse_payload(txt)
-                    break
+    key = _answer_key(text)
+    cached = await _cached_answer(key, sid, sess, text)
+    if cached is not None:
+        return JSONResponse(cached, headers={"X-Answer-Cache": "hit"})
 
-        if chosen_payload is None and newest_agent_any is not None:
-            txt = _extract_text(newest_agent_any)
-            if txt:
-                chosen_payload = _parse_payload(txt)
+    turn, joined = _TURNS.start(sid, body.get("request_id"), "run",
+                                lambda _turn: _agent_reply(sid, sess, user_name, text, key))
+    try:
+        payload, status = await turn.result()
+    except TurnSuperseded:
+        return JSONResponse(_superseded_payload(), status_code=409)
+    headers = {"X-Turn": "coalesced"} if joined else {}
+    if payload.get("busy"):
+        headers["Retry-After"] = str(math.ceil(payload["retry_after"]))
+    return JSONResponse(payload, status_code=status, headers=headers or None)
+
+async def _agent_reply(sid: Optional[str], sess: Optional[Session], user_name: str, text: str,
+                       key: Optional[str]) -> Tuple[dict, int]:
+    """One non-streamed Agent turn. Returns (payload, HTTP status)."""
+    leader = bool(key) and _ANSWERS.claim(key)
+    try:
+        async with _ADMISSION.slot(sid):
+            ops, agent = await _get_agent_ops()
+            thread_id, run = await _run_agent_turn(ops, agent, sess, text)
+
+            status = run_status(run)
+            if status == "failed":
+                log.error("Agent run failed: %s", getattr(run, "last_error", None))
+                payload = _failed_payload(run)
+                _log_turn(sid, user_name, text, payload["narration"], payload["briefing_md"], "failed")
+                return payload, 500
+            if status != "completed":
+                # cancelled / expired by the service: whatever is on the thread isn't this run's answer
+                log.warning("Agent run %s ended %s", getattr(run, "id", "?"), status)
+                payload = _unavailable_payload(text)
+                _log_turn(sid, user_name, text, payload["narration"], payload["briefing_md"], "unavailable")
+                return payload, 200
+
+            txt, reply_source = await _fetch_reply_text(ops, thread_id, run)
+        chosen_payload = _parse_payload(txt) if txt else None
+
+        if leader and reply_source in _OWN_REPLY_SOURCES and _shareable(sess, chosen_payload):
+            _ANSWERS.fill(key, chosen_payload)
 
         narration = chosen_payload.get("narration", "") if chosen_payload else "No agent reply found."
         briefing_md = chosen_payload.get("briefing_md", "") if chosen_payload else ""
-        with open(log_file_path, "a", encoding="utf-8") as f:
-            f.write(f"User: {user_name}: {text}\n")
-            f.write(f"HARCi: {narration}\n")
-            f.write(f"Briefing: {briefing_md}\n\n")
-        touch_sid(sid or "")
-        return JSONResponse(chosen_payload or {
+        _log_turn(sid, user_name, text, narration, briefing_md, "agent" if chosen_payload else "empty")
+        await touch_session(sess, *_note_thread_exchange(sess, text, txt or "", narration))
+        return chosen_payload or {
             "narration": narration,
             "briefing_md": briefing_md,
             "image": None
-        })
+        }, 200
+    except AdmissionRejected as e:
+        log.warning("assist_run shed (%s)", e.reason)
+        payload = _busy_payload(text, e.retry_after)
+        _log_turn(sid, user_name, text, payload["narration"], payload["briefing_md"], "busy")
+        return payload, 200
+    except RunExpired:
+        # Already logged and cancelled by the run waiter
+        payload = _unavailable_payload(text)
+        _log_turn(sid, user_name, text, payload["narration"], payload["briefing_md"], "unavailable")
+        return payload, 200
     except Exception:
         log.exception("assist_run agent SDK error")
-        narration = "I couldn’t reach the agent service just now. Here’s a quick brief."
-        briefing_md = f"### {text or 'Info'}\n- The service is temporarily unavailable.\n- Please try again in a moment."
-        with open(log_file_path, "a", encoding="utf-8") as f:
-            f.write(f"User: {user_name}: {text}\n")
-            f.write(f"HARCi: {narration}\n")
-            f.write(f"Briefing: {briefing_md}\n\n")
-        return JSONResponse({
-            "narration": narration,
-            "briefing_md": briefing_md,
-        }, status_code=200)
+        payload = _unavailable_payload(text)
+        _log_turn(sid, user_name, text, payload["narration"], payload["briefing_md"], "unavailable")
+        return payload, 200
+    finally:
+        if leader:
+            _ANSWERS.abandon(key)  # no-op once filled; otherwise lets waiters run their own turn
+
+# ---- Streaming variant (NDJSON) ---------------------------------------------
+# One JSON object per line:
+#   {"type": "queued", "position": n, "max_wait": secs}      at most once, first, when waiting for a slot
+#   {"type": "narration", "text": "<one complete sentence>"}   as soon as each sentence is complete
+#   {"type": "final", "narration": ..., "briefing_md": ..., "image": ...}   once, last
+def _ndjson(obj: dict) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+def _sentence_events(parser: PayloadStreamParser, text: str):
+    return [_ndjson({"type": "narration", "text": s}) for s in parser.feed(text)]
+
+async def _stream_agent_turn(sid: Optional[str], sess: Optional[Session], text: str, key: Optional[str] = None):
+    """Yield NDJSON lines for one streamed turn; the last line is always the final payload."""
+    leader = bool(key) and _ANSWERS.claim(key)
+    try:
+        async for line in _stream_agent_turn_inner(sid, sess, text, key if leader else None):
+            yield line
+    finally:
+        if leader:
+            _ANSWERS.abandon(key)
+
+def _cached_stream(payload: dict):
+    for s in split_sentences(payload.get("narration", "")):
+        yield _ndjson({"type": "narration", "text": s})
+    yield _ndjson({"type": "final", **payload})
+
+async def _stream_agent_turn_inner(sid: Optional[str], sess: Optional[Session], text: str, fill_key: Optional[str]):
+    user_name = getattr(sess, "name", "Guest") if sess else "Guest"
+    parser = PayloadStreamParser()
+    payload = None  # set when we answer with a canned payload instead of the streamed reply
+    source = "agent"
+    reply_source = "none"  # where the streamed text came from; only this run's own output is shared
+
+    if not agent_config_ok() or not AGENT_SDK_AVAILABLE:
+        payload, source = _offline_payload(text), "offline"
+    else:
+        ticket = None
+        try:
+            ticket = _ADMISSION.enter(sid)
+            if ticket.queued:
+                # Lets the UI say "HARCi is thinking…" and extend its timeout while we wait for a slot
+                yield _ndjson({"type": "queued", "position": ticket.position, "max_wait": _ADMISSION.max_wait})
+            await _ADMISSION.wait(ticket)
+            ops, agent = await _get_agent_ops()
+            thread_id, preamble = await _prepare_agent_turn(ops, sess, text)
+            run = None
+            try:
+                async with asyncio.timeout(AGENT_RUN_TIMEOUT_SECS):
+                    async for ev, data in ops.stream_run(thread_id, agent.id, additional_instructions=preamble):
+                        if ev == "thread.message.delta":
+                            for line in _sentence_events(parser, getattr(data, "text", "") or ""):
+                                yield line
+                        elif is_run_event(ev):
+                            run = data
+                        elif ev == "error":
+                            raise RuntimeError(f"agent stream error: {data}")
+            except TimeoutError:
+                if run is not None:
+                    asyncio.ensure_future(cancel_run_quietly(ops, thread_id, run.id))
+                raise
+            except asyncio.CancelledError:
+                # Superseded by the guest's next turn: free the run and the thread before it starts
+                if run is not None:
+                    await cancel_run_and_settle(ops, thread_id, run)
+                raise
+            if preamble and sess:
+                sess.agent_ctx_seeded = True
+                sess.thread_tokens += approx_tokens(preamble)
+                await save_session(sess, "agent_ctx_seeded", "thread_tokens")
+
+            status = run_status(run)
+            if status == "failed":
+                log.error("Agent stream run failed: %s", getattr(run, "last_error", None))
+                payload, source = _failed_payload(run), "failed"
+            elif run is not None and status != "completed":
+                log.warning("Agent stream run %s ended %s", run.id, status)
+                payload, source = _unavailable_payload(text), "unavailable"
+            elif not parser.text:
+                # No deltas seen (tool-only output, older service): read the reply from the thread
+                txt, reply_source = await _fetch_reply_text(ops, thread_id, run) if run is not None else (None, "none")
+                if txt:
+                    for line in _sentence_events(parser, txt):
+                        yield line
+                else:
+                    payload, source = {"narration": "No agent reply found.", "briefing_md": "", "image": None}, "empty"
+            else:
+                reply_source = "stream" if status == "completed" else "none"
+                AGENT_REPLY_SOURCE.inc("stream")
+        except AdmissionRejected as e:
+            log.warning("assist_stream shed (%s)", e.reason)
+            payload, source = _busy_payload(text, e.retry_after), "busy"
+        except Exception:
+            log.exception("assist_stream agent SDK error")
+            payload, source = _unavailable_payload(text), "unavailable"
+        finally:
+            if ticket is not None:
+                _ADMISSION.release(ticket)
+
+    streamed = parser.emitted_any
+    tail, parsed = parser.finish()
+    thread_fields = ()
+    if payload is None:
+        payload = parsed
+        if fill_key and reply_source in ("stream",) + _OWN_REPLY_SOURCES and _shareable(sess, payload):
+            _ANSWERS.fill(fill_key, payload)
+        thread_fields = _note_thread_exchange(sess, text, parser.text, payload.get("narration", ""))
+    else:
+        tail = [] if streamed else split_sentences(payload.get("narration", ""))
+    for s in tail:
+        yield _ndjson({"type": "narration", "text": s})
+
+    _log_turn(sid, user_name, text, payload.get("narration", ""), payload.get("briefing_md", ""), source)
+    await touch_session(sess, *thread_fields)
+    yield _ndjson({"type": "final", **payload})
+
+@app.get("/api/agent/stats")
+async def agent_stats():
+    return {
+        "run_waiter": RUN_WAITER_STATS.snapshot(),
+        "answer_cache": _ANSWERS.stats(),
+        "thread_pool": _WARM_THREADS.stats(),
+        "transcripts": _TRANSCRIPTS.stats(),
+        "turns": _TURNS.stats(),
+        "admission": _ADMISSION.stats(),
+        "knowledge": _KNOWLEDGE.stats(),
+        "thread_context": dict(THREAD_CTX_STATS),
+    }
+
+# ===== Metrics (Prometheus text, see metrics) =================================
+# Request/stage histograms are recorded inline; everything below is read at scrape time from the
+# counters the subsystems already keep.
+def _metrics_token_caches():
+    cred = _active_credential()
+    for cache, counters in (("aad", getattr(cred, "counters", None)),
+                            ("speech-token", _SPEECH_TOKENS.counters),
+                            ("relay-token", _RELAY_TOKENS.counters)):
+        for event, n in (counters or {}).items():
+            yield "", {"cache": cache, "event": event}, n
+
+def _metrics_speech_selections():
+    for r in (_sched.resources if _sched else ()):
+        yield "", {"resource": r.rid, "region": r.region}, r.selections
+
+def _metrics_speech_upstream():
+    for r in (_sched.resources if _sched else ()):
+        for event in ("requests", "errors", "throttled"):
+            yield "", {"resource": r.rid, "region": r.region, "event": event}, getattr(r, event)
+
+def _metrics_speech_inflight():
+    for r in (_sched.resources if _sched else ()):
+        yield "", {"resource": r.rid, "region": r.region, "breaker": r.state}, r.inflight
+
+async def _metrics_sessions():
+    st = await _SESSIONS.stats()
+    yield "", {"state": "live"}, st.get("live")
+    if "inactive" in st:
+        yield "", {"state": "active"}, st["live"] - st["inactive"]
+
+def _metrics_sessions_removed():
+    # Memory store only: redis expires natively and has no cap
+    for reason, n in (getattr(_SESSIONS, "counters", None) or {}).items():
+        yield "", {"reason": reason}, n
+
+def _metrics_loop():
+    st = _LOOP.stats()
+    for q, p in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+        yield "", {"quantile": q}, st[p] / 1000
+    yield "_sum", {}, st["lag_ms_total"] / 1000
+    yield "_count", {}, st["samples"]
+
+def _metrics_admission():
+    for outcome in ("admitted", "queued", "shed_full", "shed_timeout"):
+        yield "", {"outcome": outcome}, _ADMISSION.counters[outcome]
+
+def _metrics_admission_slots():
+    yield "", {"state": "inflight"}, _ADMISSION.inflight
+    yield "", {"state": "queued"}, _ADMISSION.waiting
+
+def _metrics_knowledge():
+    for outcome in ("hits", "fallback_hits", "low_confidence", "ambiguous", "no_match"):
+        yield "", {"outcome": outcome}, _KNOWLEDGE.counters[outcome]
+
+def _metrics_thread_context():
+    for event, n in THREAD_CTX_STATS.items():
+        yield "", {"event": event}, n
+
+def _metrics_turns():
+    for event, n in _TURNS.counters.items():
+        yield "", {"event": event}, n
+
+def _metrics_log():
+    st = log_stats() or {}
+    yield "", {"event": "enqueued"}, st.get("enqueued")
+    yield "", {"event": "deduped"}, st.get("deduped")
+    for level, n in (st.get("dropped") or {}).items():
+        yield "", {"event": "dropped", "level": level}, n
+
+def _metrics_log_queue():
+    st = log_stats() or {}
+    yield "", {}, st.get("queued")
+
+REGISTRY.collector("harci_token_cache_events_total", "counter",
+                   "Token cache activity (hits, misses, fetches, refreshes, ...) for the AAD and Speech caches.",
+                   _metrics_token_caches)
+REGISTRY.collector("harci_speech_selections_total", "counter", "Speech resource picks by the scheduler.",
+                   _metrics_speech_selections)
+REGISTRY.collector("harci_speech_upstream_total", "counter", "Speech token calls per resource (requests, errors, throttled).",
+                   _metrics_speech_upstream)
+REGISTRY.collector("harci_speech_inflight", "gauge", "Speech token calls in flight per resource.",
+                   _metrics_speech_inflight)
+REGISTRY.collector("harci_sessions", "gauge", "Sessions in the store (live; active = not ended, memory store only).",
+                   _metrics_sessions)
+REGISTRY.collector("harci_sessions_removed_total", "counter",
+                   "Sessions dropped by the memory store: expired, or evicted at SESSION_MAX (evicted_active = still active).",
+                   _metrics_sessions_removed)
+REGISTRY.collector("harci_event_loop_lag_seconds", "summary",
+                   "Event-loop lag (time the loop was blocked); _sum is total blocked time since reset.",
+                   _metrics_loop)
+
+REGISTRY.collector("harci_admission_total", "counter",
+                   "Agent-bound turns admitted, queued for a slot, or shed (queue full / waited too long).",
+                   _metrics_admission)
+REGISTRY.collector("harci_admission_slots", "gauge",
+                   "Agent-bound turns holding a slot (inflight) or waiting for one (queued).", _metrics_admission_slots)
+REGISTRY.collector("harci_knowledge_lookups_total", "counter",
+                   "Local knowledge index lookups: answered (hits, fallback_hits) or left to the Agent.",
+                   _metrics_knowledge)
+REGISTRY.collector("harci_thread_context_total", "counter",
+                   "Exchanges counted against guests' Agent threads, and threads rotated (or failed to) at the size limit.",
+                   _metrics_thread_context)
+REGISTRY.collector("harci_turns_total", "counter",
+                   "Assist turns started, coalesced by request_id, superseded (latest wins) or queued behind another.",
+                   _metrics_turns)
+REGISTRY.collector("harci_log_records_total", "counter",
+                   "Log records queued, tracebacks deduplicated, and records dropped on a full queue (by level).",
+                   _metrics_log)
+REGISTRY.collector("harci_log_queue_depth", "gauge", "Log records waiting for the writer thread.", _metrics_log_queue)
+
+@app.get("/metrics")
+async def metrics():
+    if not METRICS:
+        raise HTTPException(404, "Not found")
+    return Response(await REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/assist/stream")
+async def assist_stream(req: Request, body: dict = Body(default={})):
+    text = (body.get("text") or "").strip()
+    sid  = body.get("session_id") or req.cookies.get(SESSION_COOKIE)
+    bind_session(sid)
+    sess = await get_session(sid)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    local = await _knowledge_answer(sid, sess, text)
+    if local is not None:
+        return StreamingResponse(_cached_stream(local), media_type="application/x-ndjson",
+                                 headers={**headers, "X-Answer-Source": "knowledge"})
+    key = _answer_key(text)
+    cached = await _cached_answer(key, sid, sess, text)
+    if cached is not None:
+        return StreamingResponse(_cached_stream(cached), media_type="application/x-ndjson",
+                                 headers={**headers, "X-Answer-Cache": "hit"})
+    turn, joined = _TURNS.start(sid, body.get("request_id"), "stream",
+                                lambda t: _publish_stream(t, _stream_agent_turn(sid, sess, text, key)))
+    if joined:
+        headers["X-Turn"] = "coalesced"
+    return StreamingResponse(_follow_turn(turn), media_type="application/x-ndjson", headers=headers)
+
+async def _publish_stream(turn, lines):
+    async for line in lines:
+        turn.push(line)
+
+async def _follow_turn(turn):
+    async for line in turn.follow():
+        yield line
+    if turn.task.cancelled():
+        yield _ndjson({"type": "final", **_superseded_payload()})
 
 # ===== Feedback endpoints =====================================================
 @app.get("/feedback")
 async def feedback_form(request: Request):
   sid = request.cookies.get(SESSION_COOKIE, "")
-  return templates.TemplateResponse("feedback.html", {"request": request, "session_id": sid, "message": None, "cfg": ui_cfg()})
+  return _page(request, "feedback.html", slot=sid, session_id=SLOT, message=None)
 
 @app.post("/feedback")
 async def feedback_submit(request: Request, name: str = Form(""), session_id: str = Form(""), feedback: str = Form(...)):
-  feedback_dir = os.path.join(_APP_ROOT, "session_logs")
-  os.makedirs(feedback_dir, exist_ok=True)
-  fname = f"Feedback_{session_id or 'unknown'}.txt"
-  fpath = os.path.join(feedback_dir, fname)
-  now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-  with open(fpath, "a", encoding="utf-8") as f:
-      f.write(f"Time: {now}\nName: {name}\nSession: {session_id}\nFeedback: {feedback}\n\n")
+  _TRANSCRIPTS.submit(feedback_record(session_id, name, feedback))
   msg = "Thank you for your feedback!"
-  return templates.TemplateResponse("feedback.html", {"request": request, "session_id": session_id, "message": msg, "cfg": ui_cfg()})
+  return _templates().TemplateResponse("feedback.html", {"request": request, "session_id": session_id, "message": msg, "cfg": ui_cfg()})
 
-@app.post("/assist/welcome")
-async def assist_welcome(req: Request):
-    sid = req.cookies.get(SESSION_COOKIE)
-    sess = get_session(sid)
-    user_name = (getattr(sess, "name", None) or "Guest").strip()
+# ===== Welcome (pre-generated at registration) ================================
+WELCOME_PREGEN    = os.getenv("WELCOME_PREGEN", "1").lower() in ("1", "true", "yes")
+WELCOME_WAIT_SECS = float(os.getenv("WELCOME_WAIT_SECS", "6"))  # then answer from the template instead
 
-    if not agent_config_ok() or AIProjectClient is None:
-        fallback_narration = (
+_WELCOMES: Dict[str, asyncio.Task] = {}    # sid -> welcome generation in flight (this process)
+_WELCOME_SKELETON: Optional[dict] = None   # last Agent welcome, guest name replaced by _NAME_SLOT
+_NAME_SLOT = "{{guest}}"
+
+def _fallback_welcome(user_name: str) -> dict:
+    return {
+        "narration": (
             f"Hi {user_name}, welcome to the {EVENT_NAME}. I’m HARCi — "
             "ask me about the agenda, venue map, or speakers."
-        )
-        fallback_briefing = (
+        ),
+        "briefing_md": (
             f"### Welcome, {user_name}\n"
             "- Tap a quick chip: **Agenda**, **Venue Map**, **Speakers**, or **Help**.\n"
             "- Press and hold the mic to talk; release to send.\n"
             "- We only collect minimal info for this event.\n"
-        )
-        return JSONResponse({"narration": fallback_narration, "briefing_md": fallback_briefing})
+        ),
+    }
 
-    try:
-        project, agent = _get_client_and_agent()
-        thread_id = getattr(sess, "agent_thread_id", "") if sess else ""
-        if not thread_id:
-            thread = project.agents.threads.create()
-            thread_id = thread.id
-            if sess:
-                sess.agent_thread_id = thread_id
-
-        should_seed = not bool(getattr(sess, "agent_ctx_seeded", False)) if sess else True
-        preamble = build_assist_preamble(
-            event_name=EVENT_NAME,
-            event_city=EVENT_CITY,
-            event_date=EVENT_DATE,
-            event_tz=EVENT_TZ,
-            now_local=_now_local_str()
-        ) if should_seed else None
-
-        welcome_prompt = build_welcome_prompt(
-            user_name=user_name,
-            event_name=EVENT_NAME,
-            event_city=EVENT_CITY
-        )
-
-        project.agents.messages.create(thread_id=thread_id, role="user", content=welcome_prompt)
-        run = project.agents.runs.create(
-            thread_id=thread_id,
-            agent_id=agent.id,
-            additional_instructions=preamble
-        )
-
-        if should_seed and sess:
-            sess.agent_ctx_seeded = True
-
-        deadline = time.time() + 30.0
-        while getattr(run, "status", None) not in ("completed", "failed") and time.time() < deadline:
-            time.sleep(0.25)
-            run = project.agents.runs.get(thread_id=thread_id, run_id=run.id)
-
-        if getattr(run, "status", None) == "failed":
-            log.error("Agent welcome failed: %s", getattr(run, "last_error", None))
-            raise HTTPException(502, "Welcome run failed")
+def _remember_skeleton(user_name: str, payload: dict):
+    """Keep this welcome as the template, but only if the guest's full name was found and slotted out
+    and no part of it is left: a greeting by first name or nickname would otherwise reach later guests
+    with this guest's name."""
+    global _WELCOME_SKELETON
+    if not user_name:
+        return
+    pat = re.compile(rf"\b{re.escape(user_name)}\b")
+    skel = dict(payload)
+    replaced = 0
+    for k in ("narration", "briefing_md"):
+        if isinstance(skel.get(k), str):
+            skel[k], n = pat.subn(_NAME_SLOT, skel[k])
+            replaced += n
+    if not replaced:
+        return
+    texts = [skel[k] for k in ("narration", "briefing_md") if isinstance(skel.get(k), str)]
+    for token in user_name.split():
+        tok = re.compile(rf"(?<!\w){re.escape(token)}(?!\w)")
+        if any(tok.search(t) for t in texts):
+            return
+    _WELCOME_SKELETON = skel
+
+def _template_welcome(user_name: str) -> dict:
+    """Fast path when the Agent is slow: the last Agent welcome with this guest's name swapped in."""
+    if _WELCOME_SKELETON is None:
+        return _fallback_welcome(user_name)
+    return {k: v.replace(_NAME_SLOT, user_name) if isinstance(v, str) else v for k, v in _WELCOME_SKELETON.items()}
+
+async def _generate_welcome(sess: Optional[Session], user_name: str) -> dict:
+    """Run the welcome prompt (creating and seeding the guest's thread) and keep the result on the session."""
+    welcome_prompt = build_welcome_prompt(
+        user_name=user_name,
+        event_name=EVENT_NAME,
+        event_city=EVENT_CITY
+    )
+    async with _ADMISSION.slot(sess.sid if sess else None):
+        ops, agent = await _get_agent_ops()
+        thread_id, run = await _run_agent_turn(ops, agent, sess, welcome_prompt)
+        if run_status(run) != "completed":
+            raise RuntimeError(f"welcome run {run_status(run)}: {getattr(run, 'last_error', None)}")
+        txt, _ = await _fetch_reply_text(ops, thread_id, run)
+    if not txt:
+        raise RuntimeError("no welcome reply")
+    payload = _parse_payload(txt)
+    _remember_skeleton(user_name, payload)
+    if sess:
+        sess.welcome = payload
+        await save_session(sess, "welcome", *_note_thread_exchange(sess, welcome_prompt, txt, recap=False))
+    return payload
 
-        output_ids = getattr(run, "output_messages", None) or []
-        if output_ids:
-            get_by_id = getattr(project.agents.messages, "get", None)
-            if callable(get_by_id):
-                for mid in output_ids:
-                    try:
-                        m = project.agents.messages.get(thread_id=thread_id, message_id=mid)
-                    except Exception:
-                        continue
-                    role_name = str(getattr(getattr(m, "role", None), "name", "")).lower()
-                    if role_name != "agent":
-                        continue
-                    txt = _extract_text(m)
-                    if txt:
-                        touch_sid(sid or "")
-                        return JSONResponse(_parse_payload(txt))
-
-        list_kwargs = {"thread_id": thread_id, "limit": 20}
-        if ListSortOrder is not None:
-            list_kwargs["order"] = ListSortOrder.DESCENDING
-        msgs = project.agents.messages.list(**list_kwargs)
-
-        for m in msgs:
-            role_name = str(getattr(getattr(m, "role", None), "name", "")).lower()
-            if role_name != "agent":
-                continue
-            if getattr(m, "run_id", None) and str(m.run_id) == str(run.id):
-                txt = _extract_text(m)
-                if txt:
-                    touch_sid(sid or "")
-                    return JSONResponse(_parse_payload(txt))
+def _start_welcome(sess: Session, *, on_demand: bool = False) -> Optional[asyncio.Task]:
+    if not (WELCOME_PREGEN or on_demand) or not agent_config_ok() or not AGENT_SDK_AVAILABLE:
+        return None
+    sid = sess.sid
+    task = asyncio.create_task(_generate_welcome(sess, (sess.name or "Guest").strip()), name=f"harci-welcome-{sid[:8]}")
+    _WELCOMES[sid] = task
+    _THREAD_SYNC[sid] = task  # a first question waits for the welcome so the thread stays in order
+
+    def _done(t: asyncio.Task):
+        if _THREAD_SYNC.get(sid) is t:
+            _THREAD_SYNC.pop(sid, None)
+        if not t.cancelled() and t.exception() is not None:
+            log.warning("welcome pre-generation failed (sid=%s): %s", sid, t.exception())
+        # keep the result around briefly for a /assist/welcome that is already waiting or about to arrive
+        asyncio.get_running_loop().call_later(
+            60, lambda: _WELCOMES.pop(sid, None) if _WELCOMES.get(sid) is t else None)
+    task.add_done_callback(_done)
+    return task
 
-        for m in msgs:
-            role_name = str(getattr(getattr(m, "role", None), "name", "")).lower()
-            if role_name == "agent":
-                txt = _extract_text(m)
-                if txt:
-                    touch_sid(sid or "")
-                    return JSONResponse(_parse_payload(txt))
-                break
+@app.post("/assist/welcome")
+async def assist_welcome(req: Request):
+    sid = req.cookies.get(SESSION_COOKIE)
+    sess = await get_session(sid)
+    user_name = (getattr(sess, "name", None) or "Guest").strip()
 
-        fallback_narration = (
-            f"Hi {user_name}, welcome to the {EVENT_NAME}. I’m HARCi — "
-            "ask me about the agenda, venue map, or speakers."
-        )
-        fallback_briefing = (
-            f"### Welcome, {user_name}\n"
-            "- Tap a quick chip: **Agenda**, **Venue Map**, **Speakers**, or **Help**.\n"
-            "- Press and hold the mic to talk; release to send.\n"
-            "- We only collect minimal info for this event.\n"
-        )
-        touch_sid(sid or "")
-        return JSONResponse({"narration": fallback_narration, "briefing_md": fallback_briefing})
+    if not agent_config_ok() or not AGENT_SDK_AVAILABLE:
+        return JSONResponse(_fallback_welcome(user_name))
+
+    task = _WELCOMES.get(sid) if sid else None
+    if task is None and sess and sess.welcome:
+        await touch_session(sess)
+        return JSONResponse(sess.welcome, headers={"X-Welcome": "ready"})
+    if task is None:
+        # Not pre-generated here (other worker, restart, or no session): start it now
+        task = _start_welcome(sess, on_demand=True) if sess else asyncio.ensure_future(_generate_welcome(None, user_name))
+
+    try:
+        payload = await asyncio.wait_for(asyncio.shield(task), WELCOME_WAIT_SECS)
+        source = "agent"
+    except TimeoutError:
+        # Still running: answer from the template now; the Agent's welcome lands in the thread later
+        payload, source = _template_welcome(user_name), "template"
     except Exception:
         log.exception("assist_welcome error")
-        fallback_narration = (
-            f"Hi {user_name}, welcome to the {EVENT_NAME}. I’m HARCi — "
-            "ask me about the agenda, venue map, or speakers."
-        )
-        fallback_briefing = (
-            f"### Welcome, {user_name}\n"
-            "- Tap a quick chip: **Agenda**, **Venue Map**, **Speakers**, or **Help**.\n"
-            "- Press and hold the mic to talk; release to send.\n"
-            "- We only collect minimal info for this event.\n"
-        )
-        return JSONResponse({"narration": fallback_narration, "briefing_md": fallback_briefing})
+        return JSONResponse(_fallback_welcome(user_name))
+    await touch_session(sess)
+    return JSONResponse(payload, headers={"X-Welcome": source})
@@ -0,0 +1,203 @@
+# app/metrics.py
+"""
+Prometheus text exposition for GET /metrics, without a client library.
+
+Two kinds of series:
+  - instruments updated on the hot path: `Counter` and `Histogram`. Each label set gets its own
+    preallocated slot list on first use, so an observation is a dict lookup, a bisect and two
+    in-place adds. They are only touched from the event loop thread, which is what makes them
+    safe without locks (code running on the agent thread pool must not update them);
+  - collectors: callables (sync or async) run at scrape time that turn the counters the rest of
+    the app already keeps (token caches, Speech scheduler, session store, loop monitor) into
+    samples, so those paths pay nothing extra per request.
+
+`MetricsMiddleware` times every HTTP request and labels it with the route template (bounded
+cardinality: /static/* collapses to its mount, unknown paths to "unmatched").
+"""
+import os
+import time
+import inspect
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+log = logging.getLogger("harci.metrics")
+
+METRICS = os.getenv("METRICS", "1").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_BUCKETS   = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+Sample = Tuple[str, Dict[str, str], float]   # (name suffix, labels, value)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}   # labels -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, value: float, *labels):
+        s = self._series.get(labels)
+        if s is None:
+            s = self._series[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        s[bisect_left(self.bounds, value)] += 1
+        s[-1] += value
+
+    def time(self, *labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        out = []
+        les = ['le="%s"' % _num(b) for b in self.bounds] + ['le="+Inf"']
+        for k, s in self._series.items():
+            acc = 0
+            for le, n in zip(les, s[:-1]):
+                acc += n
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(s[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {acc}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: tuple):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._instruments: List = []
+        self._collectors: List[Tuple[str, str, str, Callable]] = []
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        c = Counter(name, doc, labelnames)
+        self._instruments.append(c)
+        return c
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        h = Histogram(name, doc, labelnames, buckets)
+        self._instruments.append(h)
+        return h
+
+    def collector(self, name: str, kind: str, doc: str, fn: Callable[[], Iterable[Sample]]):
+        """`fn` (a plain or async function/generator) gives (suffix, labels, value) samples for
+        family `name` at scrape time."""
+        self._collectors.append((name, kind, doc, fn))
+
+    async def render(self) -> str:
+        lines: List[str] = []
+        for m in self._instruments:
+            lines.append(f"# HELP {m.name} {m.doc}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        for name, kind, doc, fn in self._collectors:
+            try:
+                samples = fn()
+                if inspect.isasyncgen(samples):
+                    samples = [x async for x in samples]
+                elif inspect.isawaitable(samples):
+                    samples = await samples
+                samples = list(samples or ())
+            except Exception:
+                log.exception("metrics collector %s failed", name)
+                continue
+            lines.append(f"# HELP {name} {doc}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{suffix}{_labels(tuple(labels), tuple(labels.values()))} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.histogram(
+    "harci_http_request_duration_seconds", "HTTP request latency by route template (streams: until the last byte).",
+    ("method", "route", "status"))
+AGENT_STAGE = REGISTRY.histogram(
+    "harci_agent_stage_seconds", "Azure AI Agents call latency by stage.", ("stage",), STAGE_BUCKETS)
+AGENT_STAGE_ERRORS = REGISTRY.counter(
+    "harci_agent_stage_errors_total", "Azure AI Agents calls that raised, by stage.", ("stage",))
+ADMISSION_WAIT = REGISTRY.histogram(
+    "harci_admission_wait_seconds", "Time an Agent-bound turn waited for a slot, by outcome (admitted, shed).",
+    ("outcome",), STAGE_BUCKETS)
+AGENT_REPLY_SOURCE = REGISTRY.counter(
+    "harci_agent_reply_source_total",
+    "Where the reply text came from: stream deltas, run.output_messages or the messages.list fallback.", ("source",))
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    if scope.get("endpoint") is not None:   # a Mount (e.g. /static): label with the mount prefix
+        return scope.get("root_path") or "mount"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI (no BaseHTTPMiddleware), so streaming responses pass through untouched."""
+
+    def __init__(self, app, *, skip: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip = frozenset(skip)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip:
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_REQUESTS.observe(time.perf_counter() - t0, scope["method"], _route_label(scope), status[0])
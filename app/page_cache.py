@@ -0,0 +1,77 @@
+# app/page_cache.py
+"""
+Rendered HTML for the pages whose output depends only on config: register, guide, ended and
+the empty feedback form.
+
+Entries are keyed by template + the few inputs that vary (base URL, because url_for() renders
+absolute links, and per-page flags) and stamped with a config version; `bump()` (config reload,
+static manifest reload) drops them all. Each entry carries a strong ETag so a revalidating
+browser gets a 304 without the body. Per-guest values are rendered as a slot marker and filled in
+per request (`fill_slot`), so one entry serves every guest.
+"""
+import os
+import hashlib
+from collections import OrderedDict
+from html import escape
+from typing import Optional, Tuple
+
+PAGE_CACHE     = os.getenv("PAGE_CACHE", "1").lower() in ("1", "true", "yes")
+PAGE_CACHE_MAX = int(os.getenv("PAGE_CACHE_MAX", "64"))
+
+SLOT = "__HARCI_SLOT__"
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def fill_slot(body: bytes, value: str) -> bytes:
+    return body.replace(SLOT.encode(), escape(value, quote=True).encode("utf-8"))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+
+
+class PageCache:
+    def __init__(self, *, enabled: bool = PAGE_CACHE, max_entries: int = PAGE_CACHE_MAX):
+        self.enabled = enabled
+        self.max_entries = max(1, max_entries)
+        self.version = 1
+        self._entries: "OrderedDict[tuple, Tuple[bytes, str]]" = OrderedDict()  # key -> (body, etag)
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: tuple) -> Optional[Tuple[bytes, str]]:
+        if not self.enabled:
+            return None
+        item = self._entries.get((self.version,) + key)
+        if item is None:
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end((self.version,) + key)
+        self.counters["hits"] += 1
+        return item
+
+    def put(self, key: tuple, body: bytes) -> Tuple[bytes, str]:
+        item = (body, etag_for(body))
+        if not self.enabled:
+            return item
+        self._entries[(self.version,) + key] = item
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+        return item
+
+    def bump(self) -> int:
+        """New config: every cached page (and every ETag handed out) is stale."""
+        self.version += 1
+        self._entries.clear()
+        self.counters["invalidations"] += 1
+        return self.version
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "version": self.version, "entries": len(self._entries), **self.counters}
@@ -0,0 +1,384 @@
+# app/run_waiter.py
+"""
+Run-completion strategies for Agent runs (replaces the fixed 250 ms runs.get loop).
+
+  stream  – create the run through the streaming API; completion is the thread.run.<status> event, no polling
+  backoff – per-run polling of runs.get with exponential backoff + jitter
+  shared  – one poller task for all in-flight runs; due status checks are issued together each tick
+  auto    – stream first, falling back to the shared poller when streaming isn't usable (default)
+
+Every strategy enforces a per-run deadline: when the budget expires the run is cancelled (runs.cancel),
+so an abandoned run stops consuming Agent capacity, and the caller gets RunExpired, never the
+unfinished run. Poll counts and completion-detection lag are
+collected in STATS.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+try:
+    from .agent_exec import AgentOps, run_status, is_run_event, TERMINAL_RUN_STATES, AGENT_RUN_TIMEOUT_SECS
+    from .metrics import AGENT_STAGE
+except Exception:
+    from agent_exec import AgentOps, run_status, is_run_event, TERMINAL_RUN_STATES, AGENT_RUN_TIMEOUT_SECS  # type: ignore
+    from metrics import AGENT_STAGE  # type: ignore
+
+log = logging.getLogger("harci.agent")
+
+RUN_WAITER           = os.getenv("RUN_WAITER", "auto").lower()
+RUN_POLL_MIN_SECS    = float(os.getenv("RUN_POLL_MIN_SECS", "0.15"))
+RUN_POLL_MAX_SECS    = float(os.getenv("RUN_POLL_MAX_SECS", "2.0"))
+RUN_POLL_FACTOR      = float(os.getenv("RUN_POLL_FACTOR", "1.6"))
+RUN_POLL_CONCURRENCY = int(os.getenv("RUN_POLL_CONCURRENCY", "16"))
+RUN_CANCEL_SETTLE_SECS = float(os.getenv("RUN_CANCEL_SETTLE_SECS", "5"))
+RUN_STREAM_MAX_FAILURES = int(os.getenv("RUN_STREAM_MAX_FAILURES", "3"))    # in a row, before auto pauses streaming
+RUN_STREAM_RETRY_SECS   = float(os.getenv("RUN_STREAM_RETRY_SECS", "60"))   # ... for this long
+
+
+class RunExpired(TimeoutError):
+    """The run did not finish within its budget (it has been cancelled). `run` is its last known state."""
+
+    def __init__(self, run):
+        super().__init__(f"Agent run {getattr(run, 'id', '?')} exceeded its budget (status={run_status(run)})")
+        self.run = run
+
+
+def _is_terminal(run) -> bool:
+    return run_status(run) in TERMINAL_RUN_STATES
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with equal jitter: uniform in [d/2, d]."""
+    d = min(RUN_POLL_MAX_SECS, RUN_POLL_MIN_SECS * (RUN_POLL_FACTOR ** attempt))
+    return random.uniform(d / 2, d)
+
+
+def _completion_lag(run) -> Optional[float]:
+    """Seconds between the service finishing the run and us noticing, when the run carries a timestamp."""
+    ts = getattr(run, "completed_at", None) or getattr(run, "failed_at", None)
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        ts = ts.timestamp()
+    if not isinstance(ts, (int, float)) or ts <= 0:
+        return None
+    return max(0.0, time.time() - float(ts))
+
+
+class WaiterStats:
+    def __init__(self):
+        self.runs: Dict[str, int] = {}
+        self.polls = 0
+        self.max_polls = 0
+        self.timeouts = 0
+        self.cancels = 0
+        self.lag_sum = 0.0
+        self.lag_n = 0
+        self.lag_max = 0.0
+
+    def record(self, mode: str, polls: int, run):
+        self.runs[mode] = self.runs.get(mode, 0) + 1
+        self.polls += polls
+        self.max_polls = max(self.max_polls, polls)
+        lag = 0.0 if mode == "stream" else _completion_lag(run)
+        if lag is not None:
+            self.lag_sum += lag
+            self.lag_n += 1
+            self.lag_max = max(self.lag_max, lag)
+
+    def snapshot(self) -> dict:
+        total = sum(self.runs.values())
+        return {
+            "mode": RUN_WAITER,
+            "runs": dict(self.runs),
+            "polls": self.polls,
+            "polls_per_run": round(self.polls / total, 2) if total else 0.0,
+            "max_polls_per_run": self.max_polls,
+            "timeouts": self.timeouts,
+            "cancels": self.cancels,
+            "detect_lag_avg_ms": round(1000 * self.lag_sum / self.lag_n, 1) if self.lag_n else None,
+            "detect_lag_max_ms": round(1000 * self.lag_max, 1) if self.lag_n else None,
+        }
+
+
+STATS = WaiterStats()
+
+
+async def cancel_run_quietly(ops: AgentOps, thread_id: str, run_id: str):
+    try:
+        await ops.cancel_run(thread_id, run_id)
+        STATS.cancels += 1
+    except Exception as e:
+        log.warning("runs.cancel failed for %s: %s", run_id, e)
+
+
+ACTIVE_RUN_STATES = ("queued", "in_progress", "requires_action")
+
+
+async def find_active_run(ops: AgentOps, thread_id: str):
+    """The thread's unfinished run, if any: a stream can create the run and fail before its first event."""
+    try:
+        runs = await ops.list_runs(thread_id)
+    except Exception as e:
+        log.warning("runs.list failed for %s: %s", thread_id, e)
+        return None
+    return next((r for r in runs if run_status(r) in ACTIVE_RUN_STATES), None)
+
+
+async def cancel_run_and_settle(ops: AgentOps, thread_id: str, run, timeout: float = RUN_CANCEL_SETTLE_SECS):
+    """Cancel a run nobody wants any more (superseded turn) and wait, bounded, until it is terminal:
+    the thread rejects new messages while a run is still active or cancelling."""
+    await cancel_run_quietly(ops, thread_id, run.id)
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while time.monotonic() < deadline:
+        try:
+            run = await ops.get_run(thread_id, run.id)
+        except Exception:
+            return
+        if _is_terminal(run):
+            return
+        await asyncio.sleep(min(_backoff(attempt), max(0.0, deadline - time.monotonic())))
+        attempt += 1
+
+
+class RunWaiter:
+    """Base strategy: create the run, then wait() for it."""
+    mode = "base"
+
+    async def run(self, ops: AgentOps, thread_id: str, agent_id: str,
+                  additional_instructions: Optional[str] = None, timeout: float = AGENT_RUN_TIMEOUT_SECS):
+        run = await ops.create_run(thread_id, agent_id, additional_instructions=additional_instructions)
+        try:
+            with AGENT_STAGE.time("run_complete"):
+                return await self.wait(ops, thread_id, run, timeout)
+        except asyncio.CancelledError:
+            await cancel_run_and_settle(ops, thread_id, run)
+            raise
+
+    async def wait(self, ops: AgentOps, thread_id: str, run, timeout: float = AGENT_RUN_TIMEOUT_SECS):
+        raise NotImplementedError
+
+    def _expire(self, ops: AgentOps, thread_id: str, run) -> RunExpired:
+        """Cancel an over-budget run; returns the RunExpired to raise to the caller."""
+        STATS.timeouts += 1
+        log.warning("Agent run %s exceeded its budget (status=%s); cancelling", getattr(run, "id", "?"), run_status(run))
+        asyncio.ensure_future(cancel_run_quietly(ops, thread_id, run.id))
+        return RunExpired(run)
+
+
+class BackoffWaiter(RunWaiter):
+    mode = "backoff"
+
+    async def wait(self, ops, thread_id, run, timeout=AGENT_RUN_TIMEOUT_SECS):
+        deadline = time.monotonic() + timeout
+        polls = 0
+        while not _is_terminal(run):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._expire(ops, thread_id, run)
+            await asyncio.sleep(min(_backoff(polls), remaining))
+            run = await ops.get_run(thread_id, run.id)
+            polls += 1
+        STATS.record(self.mode, polls, run)
+        return run
+
+
+class _Pending:
+    __slots__ = ("ops", "thread_id", "run", "fut", "deadline", "next_at", "polls", "errors", "busy")
+
+    def __init__(self, ops, thread_id, run, fut, deadline):
+        self.ops, self.thread_id, self.run, self.fut = ops, thread_id, run, fut
+        self.deadline = deadline
+        self.next_at = time.monotonic() + _backoff(0)
+        self.polls = self.errors = 0
+        self.busy = False
+
+
+class SharedPoller(RunWaiter):
+    """Single poller task: each tick issues every due status check at once (bounded concurrency)."""
+    mode = "shared"
+
+    def __init__(self):
+        self._pending: Dict[str, _Pending] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._polls_running: set = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def wait(self, ops, thread_id, run, timeout=AGENT_RUN_TIMEOUT_SECS):
+        if _is_terminal(run):
+            STATS.record(self.mode, 0, run)
+            return run
+        if self._task is None or self._task.done():
+            self._wake, self._sem = asyncio.Event(), asyncio.Semaphore(RUN_POLL_CONCURRENCY)
+            self._task = asyncio.create_task(self._loop(), name="harci-run-poller")
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[run.id] = _Pending(ops, thread_id, run, fut, time.monotonic() + timeout)
+        self._wake.set()
+        try:
+            return await fut
+        finally:
+            self._pending.pop(run.id, None)
+
+    async def _loop(self):
+        while True:
+            self._wake.clear()
+            now = time.monotonic()
+            for p in list(self._pending.values()):
+                if p.busy or p.fut.done():
+                    continue
+                if now >= p.deadline:
+                    p.fut.set_exception(self._expire(p.ops, p.thread_id, p.run))
+                elif now >= p.next_at:
+                    p.busy = True
+                    t = asyncio.create_task(self._poll(p))
+                    self._polls_running.add(t)
+                    t.add_done_callback(self._polls_running.discard)
+            waiting = [min(p.next_at, p.deadline) for p in self._pending.values() if not p.busy and not p.fut.done()]
+            timeout = max(0.0, min(waiting) - time.monotonic()) if waiting else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, p: _Pending):
+        try:
+            async with self._sem:
+                p.run = await p.ops.get_run(p.thread_id, p.run.id)
+            p.polls += 1
+            if _is_terminal(p.run):
+                STATS.record(self.mode, p.polls, p.run)
+                if not p.fut.done():
+                    p.fut.set_result(p.run)
+                return
+            p.next_at = time.monotonic() + _backoff(p.polls)
+        except Exception as e:
+            p.errors += 1
+            if p.errors >= 3 and not p.fut.done():
+                p.fut.set_exception(e)
+                return
+            p.next_at = time.monotonic() + _backoff(p.polls + p.errors)
+        finally:
+            p.busy = False
+            self._wake.set()
+
+
+class StreamWaiter(RunWaiter):
+    """Completion from the run's own event stream; text deltas are ignored here."""
+    mode = "stream"
+
+    async def run(self, ops, thread_id, agent_id, additional_instructions=None, timeout=AGENT_RUN_TIMEOUT_SECS):
+        run = None
+        try:
+            async with asyncio.timeout(timeout):
+                async for ev, data in ops.stream_run(thread_id, agent_id, additional_instructions=additional_instructions):
+                    if is_run_event(ev):
+                        run = data
+                    elif ev == "error":
+                        raise RuntimeError(f"agent stream error: {data}")
+        except asyncio.CancelledError:
+            if run is not None:
+                await cancel_run_and_settle(ops, thread_id, run)
+            raise
+        except TimeoutError:
+            if run is None:
+                raise
+            raise self._expire(ops, thread_id, run)
+        except Exception as e:
+            try:
+                e.run = run  # let AutoWaiter resume polling on a run that was already created
+            except Exception:
+                pass
+            raise
+        if run is None:
+            raise RuntimeError("agent stream ended without a run event")
+        STATS.record(self.mode, 0, run)
+        return run
+
+    async def wait(self, ops, thread_id, run, timeout=AGENT_RUN_TIMEOUT_SECS):
+        return await SHARED_POLLER.wait(ops, thread_id, run, timeout)
+
+
+class AutoWaiter(RunWaiter):
+    """Stream when possible; otherwise (or when the stream breaks) fall back to the shared poller.
+
+    Only an SDK without runs.stream turns streaming off. Other failures before the run exists may be
+    ours or transient, so after RUN_STREAM_MAX_FAILURES in a row streaming pauses for
+    RUN_STREAM_RETRY_SECS and is then tried again."""
+    mode = "auto"
+
+    def __init__(self):
+        self._stream_failures = 0
+        self._stream_paused_until = 0.0
+        self._warned_no_stream = False
+
+    def _use_stream(self, ops: AgentOps) -> bool:
+        if not ops.can_stream:
+            if not self._warned_no_stream:
+                log.warning("Agent SDK has no streaming runs API; using shared poller")
+                self._warned_no_stream = True
+            return False
+        return time.monotonic() >= self._stream_paused_until
+
+    def _stream_failed(self, e: Exception):
+        self._stream_failures += 1
+        if self._stream_failures >= RUN_STREAM_MAX_FAILURES:
+            self._stream_paused_until = time.monotonic() + RUN_STREAM_RETRY_SECS
+            self._stream_failures = 0
+            log.warning("Agent stream failed %d times in a row (last: %r); polling for %.0fs",
+                        RUN_STREAM_MAX_FAILURES, e, RUN_STREAM_RETRY_SECS, exc_info=e)
+        else:
+            log.warning("Agent stream failed before the run started (%r); polling this run", e)
+
+    async def run(self, ops, thread_id, agent_id, additional_instructions=None, timeout=AGENT_RUN_TIMEOUT_SECS):
+        if self._use_stream(ops):
+            started = time.monotonic()
+            try:
+                run = await STREAM_WAITER.run(ops, thread_id, agent_id, additional_instructions, timeout)
+                self._stream_failures = 0
+                return run
+            except TimeoutError:
+                raise
+            except Exception as e:
+                run = getattr(e, "run", None)
+                if run is None:
+                    self._stream_failed(e)
+                    # The service may have created the run before the stream broke: poll it, don't add a second
+                    run = await find_active_run(ops, thread_id)
+                else:
+                    log.warning("Agent stream broke (%s); falling back to polling", e)
+                if run is not None:
+                    remaining = max(0.0, timeout - (time.monotonic() - started))
+                    return await SHARED_POLLER.wait(ops, thread_id, run, remaining)
+        return await SHARED_POLLER.run(ops, thread_id, agent_id, additional_instructions, timeout)
+
+    async def wait(self, ops, thread_id, run, timeout=AGENT_RUN_TIMEOUT_SECS):
+        return await SHARED_POLLER.wait(ops, thread_id, run, timeout)
+
+
+SHARED_POLLER = SharedPoller()
+STREAM_WAITER = StreamWaiter()
+
+_WAITERS = {
+    "stream": lambda: STREAM_WAITER,
+    "backoff": BackoffWaiter,
+    "shared": lambda: SHARED_POLLER,
+    "auto": AutoWaiter,
+}
+
+
+def get_waiter(mode: str = RUN_WAITER) -> RunWaiter:
+    factory = _WAITERS.get(mode)
+    if factory is None:
+        log.warning("Unknown RUN_WAITER=%r; using auto", mode)
+        factory = AutoWaiter
+    return factory()
@@ -0,0 +1,347 @@
+# app/session_store.py
+"""
+Guest session storage behind one async interface, so more than one worker/replica can serve a guest.
+
+  - `memory` (default): process-local, single uvicorn worker only. Expiry is indexed in a min-heap
+    on `expires_at` and drained by a periodic sweeper; `SESSION_MAX` caps the table, evicting the
+    least recently used inactive session first (then the least recently used overall);
+  - `redis`: any Redis-protocol server via `redis.asyncio`. Each session is one JSON value with a
+    native TTL (`SET ... EX`), plus a sorted-set index scored by expiry for cheap counting.
+    Writes and multi-key reads are pipelined, so a save is one round-trip. Only the records are
+    shared: main.py's turn coordinator, pending thread appends and in-flight welcomes are per
+    process, so a guest's requests must keep reaching the same worker (sticky sessions).
+
+Handlers load a `Session`, mutate it, and write back only the fields they changed with `update()`
+(`save()` writes the whole record, at registration). Field-level writes keep a request holding an
+older copy — or a background task — from clobbering what another one stored in the meantime.
+"""
+import os
+import math
+import time
+import heapq
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger("harci.sessions")
+
+SESSION_STORE        = os.getenv("SESSION_STORE", "memory").lower()   # memory | redis
+SESSION_REDIS_URL    = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_REDIS_PREFIX = os.getenv("SESSION_REDIS_PREFIX", "harci:sess:")
+SESSION_MAX          = int(os.getenv("SESSION_MAX", "20000"))            # memory store cap; 0 = unbounded
+SESSION_SWEEP_SECS   = float(os.getenv("SESSION_SWEEP_SECS", "30"))
+
+_DATETIME_FIELDS = ("created_at", "last_active", "expires_at")
+
+
+@dataclass(slots=True)
+class Session:
+    sid: str
+    name: str
+    company: str
+    created_at: datetime
+    last_active: datetime
+    expires_at: datetime
+    active: bool = True
+    agent_thread_id: str = ""
+    agent_ctx_seeded: bool = False  # avoid re-sending system context each turn
+    welcome: Optional[dict] = None  # pre-generated welcome payload (see main._start_welcome)
+    # Size of the current Agent thread and a recap carried over when it is rotated (see thread_context)
+    thread_turns: int = 0
+    thread_tokens: int = 0
+    thread_rotations: int = 0
+    thread_recap: List[List[str]] = field(default_factory=list)   # [[question, narration], ...], newest last
+
+    def to_json(self) -> str:
+        d = asdict(self)
+        for k in _DATETIME_FIELDS:
+            d[k] = d[k].isoformat()
+        return json.dumps(d, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "Session":
+        d = json.loads(raw)
+        for k in _DATETIME_FIELDS:
+            d[k] = datetime.fromisoformat(d[k])
+        return cls(**d)
+
+
+def _ttl_left(sess: Session) -> float:
+    return (sess.expires_at - datetime.utcnow()).total_seconds()
+
+
+class SessionStore:
+    """Interface; all methods are coroutines so network-backed stores never block the loop."""
+
+    async def get(self, sid: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    async def get_many(self, sids: Iterable[str]) -> Dict[str, Session]:
+        out = {}
+        for sid in sids:
+            sess = await self.get(sid)
+            if sess:
+                out[sid] = sess
+        return out
+
+    async def save(self, sess: Session):
+        """Write the whole session; its TTL is taken from `sess.expires_at`."""
+        raise NotImplementedError
+
+    async def update(self, sess: Session, fields: Iterable[str]):
+        """Write only `fields` of `sess` onto the stored record (no-op if it has expired)."""
+        await self.save(sess)
+
+    async def delete(self, sid: str):
+        raise NotImplementedError
+
+    async def count(self) -> int:
+        raise NotImplementedError
+
+    async def sweep(self) -> int:
+        """Drop expired sessions; returns how many. Stores with native TTL have nothing to do."""
+        return 0
+
+    async def stats(self) -> dict:
+        return {"backend": type(self).__name__, "live": await self.count()}
+
+    async def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """
+    `_sessions` is kept in LRU order (oldest first) and `_inactive` mirrors it for sessions with
+    `active=False`, so eviction is O(1). The expiry heap holds (expires_at, sid) and is lazily
+    invalidated: `_due` remembers the newest entry per sid, and the sweeper skips older ones.
+    Sessions are shared objects here, so a slid `expires_at` may not have been pushed yet — the
+    sweeper re-queues those instead of dropping them.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._inactive: "OrderedDict[str, None]" = OrderedDict()
+        self._heap: List[Tuple[datetime, str]] = []
+        self._due: Dict[str, datetime] = {}
+        self.counters = {"expired": 0, "evicted": 0, "evicted_active": 0}
+
+    def _drop(self, sid: str):
+        self._sessions.pop(sid, None)
+        self._inactive.pop(sid, None)
+        self._due.pop(sid, None)
+
+    def _schedule(self, sid: str, expires_at: datetime):
+        if self._due.get(sid) != expires_at:
+            self._due[sid] = expires_at
+            heapq.heappush(self._heap, (expires_at, sid))
+
+    async def get(self, sid: str) -> Optional[Session]:
+        sess = self._sessions.get(sid)
+        if sess is None:
+            return None
+        if _ttl_left(sess) <= 0:
+            self._drop(sid)
+            self.counters["expired"] += 1
+            return None
+        self._sessions.move_to_end(sid)
+        return sess
+
+    async def save(self, sess: Session):
+        sid = sess.sid
+        if sid not in self._sessions:
+            self._evict_for_new()
+        self._sessions[sid] = sess
+        self._schedule(sid, sess.expires_at)
+        self._sessions.move_to_end(sid)
+        if sess.active:
+            self._inactive.pop(sid, None)
+        else:
+            self._inactive[sid] = None
+            self._inactive.move_to_end(sid)
+        if len(self._heap) > 2 * len(self._sessions) + 64:
+            self._rebuild_heap()
+
+    async def update(self, sess: Session, fields: Iterable[str]):
+        stored = self._sessions.get(sess.sid)
+        if stored is None:
+            return
+        if stored is not sess:
+            for f in fields:
+                setattr(stored, f, getattr(sess, f))
+        await self.save(stored)
+
+    def _evict_for_new(self):
+        if not self.max_sessions:
+            return
+        while len(self._sessions) >= self.max_sessions:
+            if self._inactive:
+                sid, _ = self._inactive.popitem(last=False)
+            else:
+                sid = next(iter(self._sessions))
+                self.counters["evicted_active"] += 1
+            self._drop(sid)
+            self.counters["evicted"] += 1
+
+    def _rebuild_heap(self):
+        self._due = {sid: s.expires_at for sid, s in self._sessions.items()}
+        self._heap = [(due, sid) for sid, due in self._due.items()]
+        heapq.heapify(self._heap)
+
+    async def delete(self, sid: str):
+        self._drop(sid)
+
+    async def sweep(self) -> int:
+        now = datetime.utcnow()
+        n = 0
+        while self._heap and self._heap[0][0] <= now:
+            due, sid = heapq.heappop(self._heap)
+            sess = self._sessions.get(sid)
+            if sess is None or self._due.get(sid) != due:
+                continue  # superseded entry
+            if sess.expires_at <= now:
+                self._drop(sid)
+                n += 1
+            else:
+                self._due.pop(sid, None)
+                self._schedule(sid, sess.expires_at)
+        self.counters["expired"] += n
+        return n
+
+    async def count(self) -> int:
+        return len(self._sessions)
+
+    async def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "live": len(self._sessions),
+            "inactive": len(self._inactive),
+            "max": self.max_sessions,
+            "heap": len(self._heap),
+            **self.counters,
+        }
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Pass `client` to inject an existing `redis.asyncio.Redis`-compatible client
+    (e.g. `fakeredis.aioredis.FakeRedis()` in a local check); otherwise one is built from `url`.
+    """
+
+    def __init__(self, url: str = SESSION_REDIS_URL, *, client=None, prefix: str = SESSION_REDIS_PREFIX):
+        # redis is imported here, not at module load: the default memory store never needs it
+        try:
+            from redis.exceptions import WatchError  # type: ignore
+            self._watch_errors: tuple = (WatchError,)
+        except Exception:
+            self._watch_errors = ()
+        if client is None:
+            try:
+                import redis.asyncio as aioredis  # type: ignore
+            except Exception:
+                raise RuntimeError("SESSION_STORE=redis requires the 'redis' package")
+            client = aioredis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.index_key = prefix + "index"
+
+    def _key(self, sid: str) -> str:
+        return self.prefix + sid
+
+    @staticmethod
+    def _decode(raw) -> Optional[Session]:
+        if raw is None:
+            return None
+        try:
+            return Session.from_json(raw)
+        except Exception as e:
+            log.warning("dropping unreadable session record: %s", e)
+            return None
+
+    async def get(self, sid: str) -> Optional[Session]:
+        return self._decode(await self.client.get(self._key(sid)))
+
+    async def get_many(self, sids: Iterable[str]) -> Dict[str, Session]:
+        sids = [s for s in sids if s]
+        if not sids:
+            return {}
+        raws = await self.client.mget([self._key(s) for s in sids])
+        out = {}
+        for sid, raw in zip(sids, raws):
+            sess = self._decode(raw)
+            if sess:
+                out[sid] = sess
+        return out
+
+    async def save(self, sess: Session):
+        left = _ttl_left(sess)
+        ttl = math.ceil(left)
+        async with self.client.pipeline(transaction=True) as pipe:
+            if ttl <= 0:
+                pipe.delete(self._key(sess.sid))
+                pipe.zrem(self.index_key, sess.sid)
+            else:
+                pipe.set(self._key(sess.sid), sess.to_json(), ex=ttl)
+                pipe.zadd(self.index_key, {sess.sid: time.time() + left})
+            await pipe.execute()
+
+    async def update(self, sess: Session, fields: Iterable[str]):
+        # Optimistic read-modify-write: WATCH the key, merge the fields, MULTI/EXEC; retry on conflict
+        fields = tuple(fields)
+        key = self._key(sess.sid)
+        for _ in range(5):
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(key)
+                    stored = self._decode(await pipe.get(key))
+                    if stored is None:
+                        return
+                    for f in fields:
+                        setattr(stored, f, getattr(sess, f))
+                    left = _ttl_left(stored)
+                    pipe.multi()
+                    pipe.set(key, stored.to_json(), ex=max(1, math.ceil(left)))
+                    pipe.zadd(self.index_key, {stored.sid: time.time() + left})
+                    await pipe.execute()
+                    return
+                except self._watch_errors:
+                    continue
+        log.warning("session %s: update of %s lost after repeated conflicts", sess.sid, fields)
+
+    async def delete(self, sid: str):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(sid))
+            pipe.zrem(self.index_key, sid)
+            await pipe.execute()
+
+    async def count(self) -> int:
+        # Index entries are trimmed by score; the session keys themselves expire natively.
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.index_key, "-inf", time.time())
+            pipe.zcard(self.index_key)
+            _, n = await pipe.execute()
+        return int(n)
+
+    async def close(self):
+        try:
+            await self.client.aclose()
+        except AttributeError:
+            await self.client.close()
+        except Exception:
+            pass
+
+    async def stats(self) -> dict:
+        return {"backend": "redis", "prefix": self.prefix, "live": await self.count()}
+
+
+def build_session_store(kind: str = SESSION_STORE, **kwargs) -> SessionStore:
+    if kind == "redis":
+        store = RedisSessionStore(**kwargs)
+        log.info("Session store: redis (%s)", store.prefix)
+        return store
+    if kind != "memory":
+        log.warning("Unknown SESSION_STORE=%r; using memory", kind)
+    return MemorySessionStore()
@@ -0,0 +1,215 @@
+# app/speech_sched.py
+"""
+Health-aware scheduler for the Speech resource pool (replaces plain round-robin).
+
+Per resource it tracks a latency EWMA, recent error / 429 rates, in-flight upstream calls and
+live avatar sessions. A guest is pinned to one resource for the life of their avatar session
+(speech token, relay token and STT all come from the same region), and new guests go to the
+resource with the lowest load score:
+
+    score = (sessions + inflight + 1) * latency_ewma * (1 + 4*error_rate + 8*throttle_rate) / weight
+
+`least` mode always takes the minimum; `p2c` (power of two choices) compares two random healthy
+resources, which spreads a burst of simultaneous arrivals better.
+
+Circuit breaker: a resource that keeps failing, or returns 429, is opened for a cooldown (doubling
+on repeat, capped). After the cooldown it is half-open: main.py's probe loop sends one real request
+and the result closes or re-opens the circuit.
+"""
+import os
+import time
+import random
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger("harci.speech")
+
+SPEECH_SCHED            = os.getenv("SPEECH_SCHED", "p2c").lower()       # p2c | least
+SPEECH_EWMA_ALPHA       = float(os.getenv("SPEECH_EWMA_ALPHA", "0.2"))
+SPEECH_BREAKER_FAILS    = int(os.getenv("SPEECH_BREAKER_FAILS", "3"))    # consecutive failures to open
+SPEECH_BREAKER_COOLDOWN = float(os.getenv("SPEECH_BREAKER_COOLDOWN_SECS", "15"))
+SPEECH_BREAKER_MAX      = float(os.getenv("SPEECH_BREAKER_MAX_SECS", "300"))
+SPEECH_SESSION_HOLD     = float(os.getenv("SPEECH_SESSION_HOLD_SECS", "1800"))  # idle pin is released after this
+SPEECH_HEALTH_WINDOW    = float(os.getenv("SPEECH_HEALTH_WINDOW_SECS", "120"))
+
+_DEFAULT_LATENCY_MS = 150.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class SpeechResource:
+    def __init__(self, region: str, key: str, rid: str, weight: float = 1.0):
+        self.region, self.key, self.rid = region, key, rid
+        self.weight = max(0.01, weight)
+        self.latency_ewma: Optional[float] = None
+        self.inflight = 0
+        self.sessions = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.selections = 0
+        self.window: Deque[Tuple[float, bool, bool]] = deque()  # (ts, ok, throttled)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = SPEECH_BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.probing = False
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"region": self.region, "key": self.key, "rid": self.rid}
+
+    def _trim(self, now: float):
+        while self.window and now - self.window[0][0] > SPEECH_HEALTH_WINDOW:
+            self.window.popleft()
+
+    def rates(self, now: float) -> Tuple[float, float]:
+        self._trim(now)
+        n = len(self.window)
+        if not n:
+            return 0.0, 0.0
+        return (sum(1 for _, ok, _ in self.window if not ok) / n,
+                sum(1 for _, _, thr in self.window if thr) / n)
+
+    def score(self, now: float) -> float:
+        err, thr = self.rates(now)
+        lat = self.latency_ewma or _DEFAULT_LATENCY_MS
+        return (self.sessions + self.inflight + 1) * lat * (1 + 4 * err + 8 * thr) / self.weight
+
+
+class SpeechScheduler:
+    def __init__(self, resources: List[SpeechResource], mode: str = SPEECH_SCHED):
+        self.resources = resources
+        self.mode = mode
+        self._by_rid = {r.rid: r for r in resources}
+        self._pins: Dict[str, Tuple[str, float]] = {}  # sid -> (rid, last_seen)
+
+    def __len__(self):
+        return len(self.resources)
+
+    # -- selection -------------------------------------------------------------
+    def _available(self, now: float) -> List[SpeechResource]:
+        out = []
+        for r in self.resources:
+            if r.state == OPEN and now >= r.open_until:
+                r.state = HALF_OPEN
+            if r.state == CLOSED:
+                out.append(r)
+        return out
+
+    def pick(self, sid: Optional[str] = None, exclude: Optional[SpeechResource] = None) -> SpeechResource:
+        """`exclude`: a resource that just failed this caller; avoided while anything else is healthy."""
+        now = time.time()
+        if sid:
+            pin = self._pins.get(sid)
+            if pin:
+                res = self._by_rid.get(pin[0])
+                if res and res.state == CLOSED and res is not exclude:
+                    self._pins[sid] = (res.rid, now)
+                    return res
+                self._unpin(sid)
+        cands = self._available(now)
+        if exclude is not None and len(cands) > 1:
+            cands = [r for r in cands if r is not exclude] or cands
+        if not cands:
+            # Everything is tripped: least-bad fallback rather than refusing the guest outright
+            cands = sorted(self.resources, key=lambda r: r.open_until)[:1]
+        if self.mode == "least" or len(cands) <= 2:
+            res = min(cands, key=lambda r: r.score(now))
+        else:
+            a, b = random.sample(cands, 2)
+            res = a if a.score(now) <= b.score(now) else b
+        res.selections += 1
+        if sid:
+            res.sessions += 1
+            self._pins[sid] = (res.rid, now)
+        return res
+
+    # -- sessions --------------------------------------------------------------
+    def _unpin(self, sid: str):
+        pin = self._pins.pop(sid, None)
+        if pin:
+            res = self._by_rid.get(pin[0])
+            if res and res.sessions > 0:
+                res.sessions -= 1
+
+    def release(self, sid: Optional[str]):
+        if sid:
+            self._unpin(sid)
+
+    def reap_idle_pins(self) -> int:
+        cutoff = time.time() - SPEECH_SESSION_HOLD
+        stale = [sid for sid, (_, seen) in self._pins.items() if seen < cutoff]
+        for sid in stale:
+            self._unpin(sid)
+        return len(stale)
+
+    # -- outcomes --------------------------------------------------------------
+    def begin(self, res: SpeechResource):
+        res.inflight += 1
+
+    def record(self, res: SpeechResource, latency_ms: float, status: int):
+        """Outcome of one upstream call (status 0 = transport error)."""
+        now = time.time()
+        res.inflight = max(0, res.inflight - 1)
+        res.requests += 1
+        ok = 0 < status < 400
+        throttled = status == 429
+        res.window.append((now, ok, throttled))
+        res._trim(now)
+        if ok:
+            res.latency_ewma = latency_ms if res.latency_ewma is None else (
+                SPEECH_EWMA_ALPHA * latency_ms + (1 - SPEECH_EWMA_ALPHA) * res.latency_ewma)
+            res.consecutive_failures = 0
+            if res.state != CLOSED:
+                log.info("speech resource %s recovered", res.rid)
+            res.state, res.cooldown, res.probing = CLOSED, SPEECH_BREAKER_COOLDOWN, False
+            return
+        res.errors += 1
+        res.throttled += int(throttled)
+        if status and 400 <= status < 500 and not throttled:
+            if res.state == HALF_OPEN:
+                self._trip(res, now)  # the probe didn't prove recovery; re-open so a later probe runs
+            return  # caller-side error (bad key?) — not a health signal for routing
+        res.consecutive_failures += 1
+        if throttled or res.state == HALF_OPEN or res.consecutive_failures >= SPEECH_BREAKER_FAILS:
+            self._trip(res, now)
+
+    def _trip(self, res: SpeechResource, now: float):
+        if res.state == HALF_OPEN:
+            res.cooldown = min(SPEECH_BREAKER_MAX, res.cooldown * 2)
+        res.state, res.open_until, res.probing = OPEN, now + res.cooldown, False
+        log.warning("speech resource %s circuit open for %.0fs", res.rid, res.cooldown)
+
+    def due_probes(self) -> List[SpeechResource]:
+        """Half-open resources that need a recovery probe; marks them as being probed."""
+        now = time.time()
+        self._available(now)
+        out = [r for r in self.resources if r.state == HALF_OPEN and not r.probing]
+        for r in out:
+            r.probing = True
+        return out
+
+    # -- introspection ---------------------------------------------------------
+    def stats(self) -> dict:
+        now = time.time()
+        rows = []
+        for r in self.resources:
+            err, thr = r.rates(now)
+            rows.append({
+                "rid": r.rid,
+                "region": r.region,
+                "state": r.state,
+                "open_for_s": round(max(0.0, r.open_until - now), 1) if r.state == OPEN else 0,
+                "latency_ewma_ms": round(r.latency_ewma, 1) if r.latency_ewma is not None else None,
+                "error_rate": round(err, 3),
+                "throttle_rate": round(thr, 3),
+                "inflight": r.inflight,
+                "sessions": r.sessions,
+                "selections": r.selections,
+                "requests": r.requests,
+                "errors": r.errors,
+                "throttled": r.throttled,
+                "score": round(r.score(now), 1),
+            })
+        return {"mode": self.mode, "pinned_sessions": len(self._pins), "resources": rows}
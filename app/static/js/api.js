@@ -38,6 +38,19 @@
     };
   }
 
+  // Idempotency key for a turn: the same prompt asked again within TURN_DEDUP_MS (double tap,
+  // chip + mic) reuses the id, so the server joins the in-flight turn instead of running another.
+  const TURN_DEDUP_MS = 2000;
+  let lastTurn = { text: '', id: '', at: 0 };
+  function turnId(text) {
+    const now = Date.now();
+    if (text === lastTurn.text && now - lastTurn.at < TURN_DEDUP_MS) return lastTurn.id;
+    const id = (window.crypto && crypto.randomUUID) ? crypto.randomUUID()
+      : `${now.toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+    lastTurn = { text, id, at: now };
+    return id;
+  }
+
   // Optional tiny retry for transient fetch/server blips
   async function withRetry(fn, attempts = 2) {
     let lastErr;
@@ -53,7 +66,10 @@
 
   // --- public API ------------------------------------------------------------
   const API = {
-    async config() { return withRetry(() => j('/api/config')); },
+    async config() {
+      if (window.HARCI_CFG) return window.HARCI_CFG; // inlined by _base.html
+      return withRetry(() => j('/api/config'));
+    },
     async register(fd) { return j('/api/register', { method: 'POST', body: fd }); },
     async sessionStart(sid = getSid()) {
       return j('/api/session/start', {
@@ -81,14 +97,53 @@
       // Shape varies by backend; pass through and let avatar_rtc.js handle it.
       return withRetry(() => j('/relay-token'));
     },
-    // Core turns
-    async assistRun(text, session_id = getSid(), { signal } = {}) {
+    // Core turns (request_id: see turnId)
+    turnId,
+    async assistRun(text, session_id = getSid(), { signal, requestId = turnId(text) } = {}) {
       return j('/assist/run', {
         method: 'POST',
         headers: { 'content-type': 'application/json' },
-        body: JSON.stringify({ text, session_id }),
+        body: JSON.stringify({ text, session_id, request_id: requestId }),
+        signal
+      });
+    },
+    // Streaming turn: NDJSON lines, {type:'narration', text} per finished sentence, then
+    // {type:'final', narration, briefing_md, image}. Resolves with the final payload.
+    // A {type:'queued'} line first means the server is waiting for a free Agent slot.
+    async assistStream(text, session_id = getSid(), { signal, onNarration, onQueued, requestId = turnId(text) } = {}) {
+      const r = await fetch('/assist/stream', {
+        method: 'POST',
+        headers: { 'content-type': 'application/json' },
+        body: JSON.stringify({ text, session_id, request_id: requestId }),
         signal
       });
+      if (!r.ok || !r.body) {
+        const e = new Error(`/assist/stream ${r.status}`);
+        e.status = r.status;
+        throw e;
+      }
+      const reader = r.body.getReader();
+      const dec = new TextDecoder();
+      let buf = '', final = null;
+      const handle = (line) => {
+        if (!line.trim()) return;
+        let ev; try { ev = JSON.parse(line); } catch { return; }
+        if (ev.type === 'narration') { try { onNarration?.(ev.text); } catch {} }
+        else if (ev.type === 'queued') { try { onQueued?.(ev); } catch {} }
+        else if (ev.type === 'final') final = ev;
+      };
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += dec.decode(value, { stream: true });
+        let nl;
+        while ((nl = buf.indexOf('\n')) >= 0) {
+          handle(buf.slice(0, nl));
+          buf = buf.slice(nl + 1);
+        }
+      }
+      handle(buf);
+      return final;
     },
     // Welcome turn (server builds the personalized prompt)
     async assistWelcome(session_id = getSid(), { signal } = {}) {
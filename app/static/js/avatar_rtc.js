@@ -39,7 +39,7 @@
 
   async function fetchCfgAndTokens() {
     var results = await Promise.all([
-      fetchJson('/api/config'),
+      window.HARCI_CFG ? Promise.resolve(window.HARCI_CFG) : fetchJson('/api/config'),
       fetchJson('/speech-token'),
       fetchJson('/relay-token').catch(function () { return {}; })
     ]);
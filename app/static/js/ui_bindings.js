@@ -414,24 +414,66 @@ setTimeout(() => {
 
       const ac = new AbortController(); inflight = ac;
       const TIMEOUT_MS = 25_000;
-      const timeoutId = setTimeout(() => { try { ac.abort(); } catch {} }, TIMEOUT_MS);
+      const BUSY_RETRIES = 1;
+      let timeoutId = setTimeout(() => { try { ac.abort(); } catch {} }, TIMEOUT_MS);
+
+      // Server is queueing us behind other guests: say so, and allow for its queue wait
+      const onQueued = (ev) => {
+        if (myTurn !== turnSeq) return;
+        UI.setStatus('HARCi is thinking…');
+        clearTimeout(timeoutId);
+        timeoutId = setTimeout(() => { try { ac.abort(); } catch {} }, TIMEOUT_MS + (ev?.max_wait || 0) * 1000);
+      };
+
+      // Streamed sentences are spoken in order as they arrive; `spoken` chains them.
+      let spoken = null;
+      const speakSentence = (s) => {
+        if (myTurn !== turnSeq || !s) return;
+        spoken = (spoken || Promise.resolve())
+          .then(() => (myTurn === turnSeq ? speakNow(s, { turn: myTurn }) : null))
+          .catch(() => {});
+      };
 
       let res = null;
+      const baseId = window.API.turnId ? window.API.turnId(p) : undefined;
+      const ask = async (requestId) => {
+        if (window.API.assistStream) {
+          try {
+            return await window.API.assistStream(p, undefined, { signal: ac.signal, onNarration: speakSentence, onQueued, requestId });
+          } catch (e) {
+            if (e.name === 'AbortError' || spoken || !e.status || e.status === 409) throw e;
+            return await window.API.assistRun(p, undefined, { signal: ac.signal, requestId }); // older server
+          }
+        }
+        return await window.API.assistRun(p, undefined, { signal: ac.signal, requestId });
+      };
       try {
-        res = await window.API.assistRun(p, undefined, { signal: ac.signal });
+        for (let attempt = 0; ; attempt++) {
+          res = await ask(baseId && attempt ? `${baseId}-r${attempt}` : baseId);
+          // Shed by the server (too many guests at once): keep "thinking" and try again once
+          if (!res?.busy || spoken || attempt >= BUSY_RETRIES || myTurn !== turnSeq) break;
+          UI.setStatus('HARCi is thinking…');
+          await new Promise(r => setTimeout(r, Math.max(1, res.retry_after || 3) * 1000));
+          if (myTurn !== turnSeq || ac.signal.aborted) break;
+        }
       } catch (e) {
-        if (e.name !== 'AbortError') UI.setStatus('Error');
-        setAllEnabled(true);
-        setVisualState('ready');
-        const nudge = document.getElementById('audioNudge');
-        nudge?.classList.add('hidden');
-        return;
+        // 409 from /assist/run: a newer turn of this guest replaced this one; drop it like a streamed superseded
+        if (e.status === 409 && /"superseded"\s*:\s*true/.test(e.body || '')) {
+          res = { superseded: true };
+        } else {
+          if (e.name !== 'AbortError') UI.setStatus('Error');
+          setAllEnabled(true);
+          setVisualState('ready');
+          const nudge = document.getElementById('audioNudge');
+          nudge?.classList.add('hidden');
+          return;
+        }
       } finally {
         clearTimeout(timeoutId);
         inflight = null;
       }
 
-      if (myTurn !== turnSeq || !res) {
+      if (myTurn !== turnSeq || !res || res.superseded) {
         setAllEnabled(true);
         setVisualState('ready');
         return;
@@ -443,7 +485,8 @@ setTimeout(() => {
       setVisualState('ready');
 
       try {
-        await speakNow(res.narration || 'Here is the information.', { turn: myTurn });
+        if (spoken) await spoken;
+        else await speakNow(res.narration || 'Here is the information.', { turn: myTurn });
       } finally {
         if (myTurn === turnSeq) UI.setStatus('Ready');
       }
@@ -0,0 +1,189 @@
+# app/static_assets.py
+"""
+The /static mount, serving the fingerprinted + precompressed assets from scripts/build_static.py.
+
+  - `asset_url('js/api.js')` (Jinja global) resolves a logical path to its content-hashed copy
+    (e.g. /static/dist/js/api.1a2b3c4d5e.js) via dist/manifest.json; without a build it falls back
+    to the plain path, so a dev checkout works unchanged;
+  - hashed paths are sent with `Cache-Control: public, max-age=STATIC_MAX_AGE_SECS, immutable`;
+    anything else with `no-cache` (the browser revalidates and usually gets a 304);
+  - the best precompressed variant the client accepts (br, then gzip, honouring q-values) is sent
+    with `Content-Encoding` and `Vary: Accept-Encoding`, also for the plain path of a built asset;
+  - built assets carry a strong content ETag (hash + encoding), identical on every replica;
+  - `asset_scripts('site')` emits the page's scripts: one tag for the minified bundle when
+    ASSET_BUNDLE is on and the bundle was built, otherwise one tag per file, in BUNDLES order.
+"""
+import os
+import json
+import logging
+import mimetypes
+from typing import Dict, Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+log = logging.getLogger("harci.static")
+
+STATIC_MANIFEST     = os.getenv("STATIC_MANIFEST", "")   # default: <static dir>/dist/manifest.json
+STATIC_MAX_AGE_SECS = int(os.getenv("STATIC_MAX_AGE_SECS", str(365 * 24 * 3600)))
+ASSET_BUNDLE        = os.getenv("ASSET_BUNDLE", "1").lower() in ("1", "true", "yes")
+
+# Script bundles in load order; scripts/build_static.py writes each as bundles/<name>.js.
+# Every page runs the full client today (ui_bindings also drives the register form and the
+# guide-only modules no-op without their elements), so _base.html uses "site"; a page needing a
+# different set adds an entry here and overrides the `scripts` block of _base.html.
+BUNDLES = {
+    "site": (
+        "js/logger.js",
+        "js/api.js",
+        "js/idle.js",
+        "js/harci_lifecycle_patch.js",
+        "js/avatar_rtc.js",
+        "js/stt.js",
+        "js/earcon.js",
+        "js/speak_safe.js",
+        "js/ui_bindings.js",
+        "js/touch_guard.js",
+        "js/event_name.js",
+    ),
+}
+
+
+def bundle_path(name: str) -> str:
+    return f"bundles/{name}.js"
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+_SUFFIX = {"br": ".br", "gzip": ".gz"}
+_PREFERENCE = ("br", "gzip")
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding -> {coding: q}."""
+    out = {}
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        out[name] = q
+    return out
+
+
+def negotiate(header: str, available) -> Optional[str]:
+    """Best of `available` ("br" / "gzip") acceptable to the client, or None for identity."""
+    acc = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for enc in _PREFERENCE:
+        if enc not in available:
+            continue
+        q = acc.get(enc, acc.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class AssetStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, manifest: Optional[str] = None, max_age: int = STATIC_MAX_AGE_SECS,
+                 bundle: bool = ASSET_BUNDLE, **kw):
+        super().__init__(directory=directory, **kw)
+        self.bundle = bundle
+        self.manifest_path = manifest or STATIC_MANIFEST or os.path.join(directory, "dist", "manifest.json")
+        self.immutable_cache = f"public, max-age={max_age}, immutable"
+        self._logical: Dict[str, dict] = {}   # "js/api.js" -> manifest entry
+        self._hashed: Dict[str, dict] = {}    # "dist/js/api.<hash>.js" -> manifest entry
+        self.reload()
+
+    def reload(self) -> int:
+        """(Re)read the manifest; returns the number of built assets (0 = serving plain files)."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                files = json.load(f).get("files", {})
+        except FileNotFoundError:
+            files = {}
+        except Exception as e:
+            log.warning("static manifest %s unreadable (%s); serving plain files", self.manifest_path, e)
+            files = {}
+        missing = [rel for rel, e in files.items() if not os.path.isfile(os.path.join(self.directory, e["path"]))]
+        if missing:
+            log.warning("static manifest lists %d missing files (e.g. %s); rebuild with scripts/build_static.py",
+                        len(missing), missing[0])
+            files = {rel: e for rel, e in files.items() if rel not in missing}
+        self._logical = dict(files)
+        self._hashed = {e["path"]: e for e in files.values()}
+        if files:
+            log.info("Static assets: %d fingerprinted (%s)", len(files), self.manifest_path)
+        return len(files)
+
+    def resolve(self, path: str) -> str:
+        entry = self._logical.get(path.lstrip("/"))
+        return entry["path"] if entry else path
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        key = path.replace(os.sep, "/")
+        entry = self._hashed.get(key)
+        immutable = entry is not None
+        if entry is None:
+            entry = self._logical.get(key)
+        if entry is None or scope["method"] not in ("GET", "HEAD"):
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("cache-control", "no-cache")
+            return response
+        return self._built_response(entry, immutable, scope)
+
+    def _built_response(self, entry: dict, immutable: bool, scope: Scope) -> Response:
+        request_headers = Headers(scope=scope)
+        enc = negotiate(request_headers.get("accept-encoding", ""), entry["encodings"])
+        full_path = os.path.join(self.directory, entry["path"] + (_SUFFIX[enc] if enc else ""))
+        headers = {
+            "cache-control": self.immutable_cache if immutable else "no-cache",
+            "etag": f'"{entry["hash"][:32]}-{enc or "identity"}"',
+        }
+        if entry["encodings"]:
+            headers["vary"] = "Accept-Encoding"
+        if enc:
+            headers["content-encoding"] = enc
+        media_type = mimetypes.guess_type(entry["path"])[0] or "application/octet-stream"
+        response = FileResponse(full_path, headers=headers, media_type=media_type)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def asset_url_global(self, mount_name: str = "static"):
+        """The `asset_url(path)` Jinja global (needs `request` in the template context)."""
+        import jinja2
+
+        @jinja2.pass_context
+        def asset_url(context, path: str) -> str:
+            return str(context["request"].url_for(mount_name, path=self.resolve(path)))
+
+        return asset_url
+
+    def asset_scripts_global(self, mount_name: str = "static"):
+        """The `asset_scripts(bundle)` Jinja global: deferred <script> tags for one BUNDLES entry."""
+        import jinja2
+        from markupsafe import Markup, escape
+
+        @jinja2.pass_context
+        def asset_scripts(context, name: str = "site") -> Markup:
+            request = context["request"]
+            if self.bundle and bundle_path(name) in self._logical:
+                paths = [bundle_path(name)]
+            else:
+                paths = list(BUNDLES[name])
+            tags = [f'<script src="{escape(str(request.url_for(mount_name, path=self.resolve(p))))}" defer></script>'
+                    for p in paths]
+            return Markup("\n  ".join(tags))
+
+        return asset_scripts
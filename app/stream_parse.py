@@ -0,0 +1,156 @@
+# app/stream_parse.py
+"""
+Parsing of Agent replies, whole or streamed.
+
+The Agent is asked for a JSON object {narration, briefing_md, image?}, but in practice it sometimes
+wraps it in ``` fences, adds prose around it, or answers in plain text. `parse_payload` handles
+all of those for a complete reply. `PayloadStreamParser` consumes the reply as deltas arrive and
+yields narration sentences as soon as each one is complete, so the avatar can start speaking
+long before the run finishes.
+"""
+import re
+import json
+from typing import List, Optional
+
+# Leading ``` / ```json fence (possibly still incomplete) and trailing fence
+_LEAD_RE     = re.compile(r"\s*(```[A-Za-z]*)?\s*")
+_TRAIL_RE    = re.compile(r"\s*```\s*$")
+_NARR_KEY_RE = re.compile(r'"narration"\s*:\s*"')
+# Sentence boundary: terminal punctuation (plus closing quotes/brackets) followed by whitespace
+_SENTENCE_RE = re.compile(r"[.!?…]+[\"”’)\]]*\s+")
+
+MIN_SENTENCE_CHARS = 12
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _fallback(s: str) -> dict:
+    return {"narration": s, "briefing_md": "", "image": None}
+
+
+def parse_payload(s: str) -> dict:
+    """Complete reply -> payload dict. Non-JSON replies become plain narration."""
+    s2 = (s or "").strip()
+    m = _LEAD_RE.match(s2)
+    if m and m.group(1):
+        s2 = _TRAIL_RE.sub("", s2[m.end():]).strip()
+    try:
+        obj = json.loads(s2)
+    except Exception:
+        # JSON embedded in prose: take the outermost braces
+        i, j = s2.find("{"), s2.rfind("}")
+        try:
+            obj = json.loads(s2[i:j + 1]) if 0 <= i < j else None
+        except Exception:
+            obj = None
+    return obj if isinstance(obj, dict) else _fallback(s)
+
+
+def split_sentences(text: str) -> List[str]:
+    """Whole narration -> sentences, using the same boundaries as the stream parser."""
+    p = PayloadStreamParser()
+    p._mode, p._narr, p._narr_done = "text", text or "", True
+    return p._take_sentences(final=True)
+
+
+class PayloadStreamParser:
+    """Incremental parser: feed() text deltas, get back completed narration sentences."""
+
+    def __init__(self):
+        self._buf = ""
+        self._mode: Optional[str] = None   # "json" | "text"
+        self._body_start = 0               # offset past any leading fence
+        self._str_pos = -1                 # json mode: raw offset of the next undecoded narration char
+        self._narr_done = False
+        self._narr = ""                    # narration decoded so far
+        self._emitted = 0                  # chars of _narr already handed out as sentences
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    @property
+    def emitted_any(self) -> bool:
+        return self._emitted > 0
+
+    def feed(self, delta: str) -> List[str]:
+        if not delta:
+            return []
+        self._buf += delta
+        if self._mode is None and not self._detect_mode():
+            return []
+        if self._mode == "text":
+            self._narr = self._buf[self._body_start:]
+        elif not self._narr_done:
+            self._decode_narration()
+        return self._take_sentences(final=self._narr_done)
+
+    def finish(self):
+        """End of stream -> (remaining sentences, final payload)."""
+        payload = parse_payload(self._buf)
+        narration = str(payload.get("narration") or "")
+        said = self._narr[:self._emitted]
+        rest = narration[len(said):] if narration.startswith(said) else ""
+        tail = [rest.strip()] if rest.strip() else []
+        self._emitted = len(self._narr)
+        return tail, payload
+
+    # -- internals -------------------------------------------------------------
+    def _detect_mode(self) -> bool:
+        m = _LEAD_RE.match(self._buf)
+        if m.end() >= len(self._buf):
+            return False  # only whitespace / a partial fence so far
+        self._body_start = m.end()
+        self._mode = "json" if self._buf[m.end()] == "{" else "text"
+        return True
+
+    def _decode_narration(self):
+        if self._str_pos < 0:
+            m = _NARR_KEY_RE.search(self._buf, self._body_start)
+            if not m:
+                return
+            self._str_pos = m.end()
+        buf, i, out = self._buf, self._str_pos, []
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self._narr_done = True
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break  # escape split across deltas
+            e = buf[i + 1]
+            if e == "u":
+                if i + 6 > len(buf):
+                    break
+                try:
+                    out.append(chr(int(buf[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+            else:
+                out.append(_ESCAPES.get(e, e))
+                i += 2
+        self._str_pos = i
+        self._narr += "".join(out)
+
+    def _take_sentences(self, final: bool) -> List[str]:
+        out: List[str] = []
+        start = self._emitted
+        for m in _SENTENCE_RE.finditer(self._narr, start):
+            if m.end() - start < MIN_SENTENCE_CHARS:
+                continue
+            s = self._narr[start:m.end()].strip()
+            if s:
+                out.append(s)
+            start = m.end()
+        if final and start < len(self._narr):
+            s = self._narr[start:].strip()
+            if s:
+                out.append(s)
+            start = len(self._narr)
+        self._emitted = start
+        return out
@@ -0,0 +1,88 @@
+# app/thread_context.py
+"""
+Bounded Agent context for long sessions.
+
+A guest keeps one thread for the whole session (up to SESSION_TTL_SECS), and every run re-reads
+all of it, so run latency and token cost would grow with every question. The session therefore
+tracks the size of its current thread — turns, plus approximate tokens (chars / 4) of what was
+posted: questions, replies, cached exchanges and the preamble — and a short recap of the latest
+exchanges. Past THREAD_MAX_TURNS or THREAD_MAX_TOKENS the thread is rotated *after* the turn
+that crossed the line, in the background:
+
+  - a fresh thread (from the warm pool when it has one) gets one assistant message with the
+    recap: the last THREAD_CARRY_TURNS questions with their answers, and earlier topics by name;
+  - `agent_ctx_seeded` is cleared, so the next run carries `build_assist_preamble` again;
+  - the old thread is deleted.
+
+The next turn waits for the rotation like for any pending thread write (main._await_thread_sync),
+so it lands on the new thread; no turn pays for the rotation on its own request path.
+"""
+import os
+from typing import List, Optional
+
+THREAD_ROTATION      = os.getenv("THREAD_ROTATION", "1").lower() in ("1", "true", "yes")
+THREAD_MAX_TURNS     = int(os.getenv("THREAD_MAX_TURNS", "12"))
+THREAD_MAX_TOKENS    = int(os.getenv("THREAD_MAX_TOKENS", "6000"))
+THREAD_CARRY_TURNS   = int(os.getenv("THREAD_CARRY_TURNS", "3"))
+THREAD_RECAP_MAX     = 8      # exchanges remembered on the session (older topics are named only)
+_RECAP_ANSWER_CHARS  = 240
+_RECAP_TOPIC_CHARS   = 80
+
+STATS = {"exchanges": 0, "rotations": 0, "rotation_failures": 0}
+
+
+def approx_tokens(text: Optional[str]) -> int:
+    """Rough token count (English averages ~4 characters per token) plus per-message overhead."""
+    return len(text or "") // 4 + 4
+
+
+def _clip(text: str, n: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= n else text[:n - 1].rstrip() + "…"
+
+
+def note_exchange(sess, question: Optional[str], reply: str, narration: str = "", *, recap: bool = True) -> bool:
+    """Account for one question/reply pair posted to the session's thread (`recap=False` for prompts
+    the guest didn't ask, e.g. the welcome). Returns True once the thread should be rotated."""
+    STATS["exchanges"] += 1
+    sess.thread_turns += 1
+    sess.thread_tokens += approx_tokens(question) + approx_tokens(reply)
+    if question and recap:
+        sess.thread_recap = (sess.thread_recap + [[_clip(question, _RECAP_TOPIC_CHARS),
+                                                   _clip(narration, _RECAP_ANSWER_CHARS)]])[-THREAD_RECAP_MAX:]
+    return should_rotate(sess)
+
+
+def should_rotate(sess) -> bool:
+    if not THREAD_ROTATION or not getattr(sess, "agent_thread_id", ""):
+        return False
+    return sess.thread_turns >= THREAD_MAX_TURNS or sess.thread_tokens >= THREAD_MAX_TOKENS
+
+
+def recap_message(sess) -> Optional[str]:
+    """The carry-over posted as the first message of the new thread, or None if there is nothing to carry."""
+    recap: List[List[str]] = sess.thread_recap or []
+    if not recap:
+        return None
+    carry = max(0, THREAD_CARRY_TURNS)
+    older, recent = (recap[:-carry], recap[-carry:]) if carry else (recap, [])
+    lines = [f"Summary of my conversation so far with {sess.name or 'the guest'} (for context):"]
+    if older:
+        lines.append("- Earlier topics: " + "; ".join(q for q, _ in older))
+    for q, a in recent:
+        lines.append(f"- They asked: {q}" + (f" — I answered: {a}" if a else ""))
+    return "\n".join(lines)
+
+
+def reset_for_thread(sess, thread_id: str, recap: Optional[str]):
+    """Point the session at its new thread; the preamble goes out again on the next run."""
+    sess.agent_thread_id = thread_id
+    sess.agent_ctx_seeded = False
+    sess.thread_turns = 0
+    sess.thread_tokens = approx_tokens(recap) if recap else 0
+    sess.thread_rotations += 1
+    STATS["rotations"] += 1
+
+
+THREAD_FIELDS = ("agent_thread_id", "agent_ctx_seeded", "thread_turns", "thread_tokens", "thread_rotations",
+                 "thread_recap")
@@ -0,0 +1,174 @@
+# app/token_cache.py
+"""
+Short-lived credential cache for the Speech STS token and the Avatar relay token.
+
+  - single-flight: concurrent misses for one key share a single upstream call (per-key asyncio future);
+  - refresh-ahead: a timer renews each entry before it expires, as long as the key is still being used,
+    so guests don't pay for the refresh;
+  - last-known-good: if a refresh fails while the old credential is still valid, keep serving it.
+
+A QR-scan surge therefore costs O(resources) upstream calls, not O(guests).
+"""
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger("harci.tokens")
+
+# fetch(ctx) -> (value, ttl_seconds); ctx is whatever the caller passed to get() (e.g. the Speech resource)
+Fetcher = Callable[[object], Awaitable[Tuple[object, float]]]
+
+# Margins are capped by the TTL actually issued: short-lived credentials would otherwise refresh every
+# second (refresh_ahead >= TTL) or never be served from cache at all (min_ttl_left >= TTL).
+_MIN_LEFT_MAX_FRACTION = 0.25
+_REFRESH_AHEAD_MAX_FRACTION = 0.5
+
+
+class CachedCredential:
+    __slots__ = ("value", "ttl", "fetched_at", "expires_at", "last_used")
+
+    def __init__(self, value, ttl: float):
+        now = time.time()
+        self.value = value
+        self.ttl = ttl
+        self.fetched_at = now
+        self.expires_at = now + ttl
+        self.last_used = now
+
+
+class CredentialCache:
+    """
+    `min_ttl_left` — an entry with less validity than this is not handed to new clients;
+    `refresh_ahead` — how long before expiry the background renewal fires;
+    `idle_secs`     — stop renewing keys nobody has asked for in this long.
+    The first two are capped at a fraction of each credential's TTL (logged once per cache).
+    """
+
+    def __init__(self, name: str, fetch: Fetcher, *, min_ttl_left: float = 60.0,
+                 refresh_ahead: float = 120.0, idle_secs: float = 900.0):
+        self.name = name
+        self._fetch = fetch
+        self.min_ttl_left = min_ttl_left
+        self.refresh_ahead = refresh_ahead
+        self.idle_secs = idle_secs
+        self._entries: Dict[str, CachedCredential] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._ctx: Dict[str, object] = {}
+        self._capped_logged = False
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "fetches": 0,
+                         "refreshes": 0, "failures": 0, "stale_served": 0}
+
+    async def get(self, key: str, ctx: object = None) -> CachedCredential:
+        self._ctx[key] = ctx
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry and entry.expires_at - now > self._margins(entry)[0]:
+            entry.last_used = now
+            self.counters["hits"] += 1
+            return entry
+        self.counters["misses"] += 1
+        try:
+            return await self._load(key)
+        except Exception:
+            # Upstream blip: the previous credential may still be usable for a little while
+            if entry and entry.expires_at > time.time():
+                self.counters["stale_served"] += 1
+                entry.last_used = time.time()
+                log.warning("%s: refresh failed for %s; serving last-known-good", self.name, key)
+                return entry
+            raise
+
+    def _load(self, key: str) -> Awaitable[CachedCredential]:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.counters["coalesced"] += 1
+        else:
+            fut = asyncio.ensure_future(self._do_fetch(key))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _f, k=key: self._inflight.pop(k, None))
+        # shield: a caller that disconnects must not cancel the shared fetch
+        return asyncio.shield(fut)
+
+    async def _do_fetch(self, key: str) -> CachedCredential:
+        self.counters["fetches"] += 1
+        try:
+            value, ttl = await self._fetch(self._ctx.get(key))
+        except Exception:
+            self.counters["failures"] += 1
+            raise
+        prev = self._entries.get(key)
+        entry = CachedCredential(value, ttl)
+        if prev:
+            entry.last_used = prev.last_used
+        self._entries[key] = entry
+        self._schedule_refresh(key, entry)
+        return entry
+
+    def _margins(self, entry: CachedCredential) -> Tuple[float, float]:
+        """(min_ttl_left, refresh_ahead) for this entry, capped by its TTL."""
+        min_left = min(self.min_ttl_left, entry.ttl * _MIN_LEFT_MAX_FRACTION)
+        ahead = min(self.refresh_ahead, entry.ttl * _REFRESH_AHEAD_MAX_FRACTION)
+        if (min_left, ahead) != (self.min_ttl_left, self.refresh_ahead) and not self._capped_logged:
+            self._capped_logged = True
+            log.warning("%s: credential TTL %.0fs is short for min_ttl_left=%.0fs / refresh_ahead=%.0fs; "
+                        "using %.0fs / %.0fs", self.name, entry.ttl, self.min_ttl_left, self.refresh_ahead,
+                        min_left, ahead)
+        return min_left, ahead
+
+    def _schedule_refresh(self, key: str, entry: CachedCredential):
+        old = self._timers.pop(key, None)
+        if old:
+            old.cancel()
+        delay = max(1.0, entry.expires_at - time.time() - self._margins(entry)[1])
+        self._timers[key] = asyncio.get_running_loop().call_later(delay, self._refresh, key)
+
+    def _refresh(self, key: str):
+        self._timers.pop(key, None)
+        entry = self._entries.get(key)
+        if not entry or time.time() - entry.last_used > self.idle_secs:
+            return  # nobody is using this key; let it lapse
+        if key in self._inflight:
+            return
+        self.counters["refreshes"] += 1
+        fut = self._load(key)
+
+        def _done(f):
+            if f.cancelled() or f.exception() is None:
+                return
+            log.warning("%s: background refresh for %s failed: %s", self.name, key, f.exception())
+            # retry shortly while the current credential is still valid
+            cur = self._entries.get(key)
+            if cur and cur.expires_at - time.time() > 5:
+                self._timers[key] = asyncio.get_running_loop().call_later(
+                    min(15.0, (cur.expires_at - time.time()) / 2), self._refresh, key)
+        fut.add_done_callback(_done)
+
+    async def refresh_now(self, key: str, ctx: object = None) -> CachedCredential:
+        """Force an upstream fetch (shares any fetch already in flight)."""
+        self._ctx[key] = ctx
+        return await self._load(key)
+
+    def invalidate(self, key: Optional[str] = None):
+        keys = [key] if key else list(self._entries)
+        for k in keys:
+            self._entries.pop(k, None)
+            self._ctx.pop(k, None)
+            t = self._timers.pop(k, None)
+            if t:
+                t.cancel()
+
+    def close(self):
+        for t in self._timers.values():
+            t.cancel()
+        self._timers.clear()
+        for f in self._inflight.values():
+            f.cancel()
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            **self.counters,
+            "entries": {k: round(e.expires_at - now) for k, e in self._entries.items()},
+        }
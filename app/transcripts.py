@@ -0,0 +1,216 @@
+# app/transcripts.py
+"""
+Session transcripts and feedback, written off the request path.
+
+Handlers `submit()` a structured record and return immediately; one background task drains the
+queue in batches and hands each batch to a worker thread, which opens every target file once per
+batch (not once per turn). Output, per TRANSCRIPT_OUTPUT:
+  - text:     SessLog_{sid}.txt / Feedback_{sid}.txt, same layout as before;
+  - jsonl:    SessLog_{sid}.jsonl / Feedback_{sid}.jsonl, one record per line;
+  - segments: all records into rolling transcript-<start>-<pid>-<n>.jsonl files of TRANSCRIPT_SEGMENT_BYTES.
+Durability is TRANSCRIPT_FSYNC: never (OS page cache), interval (at most every TRANSCRIPT_FSYNC_SECS),
+or batch (fsync each file after every batch). A full queue drops the record (counted), it never blocks.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+log = logging.getLogger("harci.transcripts")
+
+_APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+TRANSCRIPT_DIR           = os.getenv("TRANSCRIPT_DIR") or os.path.join(_APP_ROOT, "session_logs")
+TRANSCRIPT_OUTPUT        = os.getenv("TRANSCRIPT_OUTPUT", "text").lower()     # text | jsonl | segments
+TRANSCRIPT_QUEUE_MAX     = int(os.getenv("TRANSCRIPT_QUEUE_MAX", "10000"))
+TRANSCRIPT_BATCH_MAX     = int(os.getenv("TRANSCRIPT_BATCH_MAX", "500"))
+TRANSCRIPT_FLUSH_SECS    = float(os.getenv("TRANSCRIPT_FLUSH_SECS", "0.25"))  # linger to grow a batch
+TRANSCRIPT_FSYNC         = os.getenv("TRANSCRIPT_FSYNC", "interval").lower()  # never | interval | batch
+TRANSCRIPT_FSYNC_SECS    = float(os.getenv("TRANSCRIPT_FSYNC_SECS", "5"))
+TRANSCRIPT_SEGMENT_BYTES = int(os.getenv("TRANSCRIPT_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+
+
+def turn_record(sid: Optional[str], user_name: str, text: str, narration: str, briefing_md: str,
+                source: str = "", ms: Optional[float] = None) -> dict:
+    """`source` says where the answer came from (agent, cache, knowledge, ... see log_index); `ms` is the
+    time since the request arrived. Both go to the JSON outputs only; the text layout is unchanged."""
+    rec = {"kind": "turn", "ts": time.time(), "sid": sid, "user": user_name,
+           "text": text, "narration": narration, "briefing_md": briefing_md}
+    if source:
+        rec["source"] = source
+    if ms is not None:
+        rec["ms"] = round(ms, 1)
+    return rec
+
+
+def feedback_record(session_id: str, name: str, feedback: str) -> dict:
+    return {"kind": "feedback", "ts": time.time(), "sid": session_id, "name": name, "feedback": feedback}
+
+
+def _render_text(rec: dict) -> str:
+    if rec["kind"] == "feedback":
+        when = datetime.utcfromtimestamp(rec["ts"]).strftime("%Y-%m-%d %H:%M:%S UTC")
+        return f"Time: {when}\nName: {rec['name']}\nSession: {rec['sid']}\nFeedback: {rec['feedback']}\n\n"
+    return (f"User: {rec['user']}: {rec['text']}\n"
+            f"HARCi: {rec['narration']}\n"
+            f"Briefing: {rec['briefing_md']}\n\n")
+
+
+def _render_json(rec: dict) -> str:
+    return json.dumps(rec, ensure_ascii=False) + "\n"
+
+
+class TranscriptWriter:
+    def __init__(self, directory: str = TRANSCRIPT_DIR, *, output: str = TRANSCRIPT_OUTPUT,
+                 queue_max: int = TRANSCRIPT_QUEUE_MAX, batch_max: int = TRANSCRIPT_BATCH_MAX,
+                 linger: float = TRANSCRIPT_FLUSH_SECS, fsync: str = TRANSCRIPT_FSYNC,
+                 fsync_secs: float = TRANSCRIPT_FSYNC_SECS, segment_bytes: int = TRANSCRIPT_SEGMENT_BYTES):
+        self.directory = directory
+        self.output = output if output in ("text", "jsonl", "segments") else "text"
+        self.queue_max = queue_max
+        self.batch_max = max(1, batch_max)
+        self.linger = linger
+        self.fsync = fsync
+        self.fsync_secs = fsync_secs
+        self.segment_bytes = segment_bytes
+        self._q: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_fsync = time.monotonic()
+        self._dirty: set = set()           # paths written since the last fsync (interval policy)
+        self._dirty_lock = threading.Lock()  # batch writes and flush() fsync from different worker threads
+        self._seg_started = time.strftime("%Y%m%d-%H%M%S")
+        self._seg_index = 0
+        self._seg_size = 0
+        self.counters = {"submitted": 0, "written": 0, "dropped": 0, "batches": 0,
+                         "bytes": 0, "fsyncs": 0, "errors": 0}
+
+    # -- producer side (event loop) --------------------------------------------
+    def start(self):
+        if self._task is None or self._task.done():
+            if self._q is None or self._q.empty():
+                self._q = asyncio.Queue(maxsize=self.queue_max)
+            self._task = asyncio.create_task(self._run(), name="harci-transcripts")
+
+    def submit(self, rec: dict) -> bool:
+        """Queue one record; never blocks. Returns False when the record had to be dropped."""
+        self.start()
+        try:
+            self._q.put_nowait(rec)
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+            if self.counters["dropped"] % 1000 == 1:
+                log.warning("transcript queue full; %d records dropped so far", self.counters["dropped"])
+            return False
+        self.counters["submitted"] += 1
+        return True
+
+    async def flush(self):
+        """Wait until everything submitted so far is on disk (and fsynced, unless policy is never)."""
+        if self._q is not None and self._task is not None and not self._task.done():
+            await self._q.join()
+        if self.fsync != "never" and self._dirty:
+            await asyncio.to_thread(self._fsync_dirty)
+
+    async def close(self):
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"output": self.output, "fsync": self.fsync,
+                "queued": self._q.qsize() if self._q is not None else 0, **self.counters}
+
+    # -- consumer side ---------------------------------------------------------
+    async def _run(self):
+        q = self._q
+        while True:
+            batch = [await q.get()]
+            if self.linger > 0 and q.qsize() < self.batch_max:
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.batch_max and not q.empty():
+                batch.append(q.get_nowait())
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception:
+                self.counters["errors"] += 1
+                log.exception("transcript batch write failed (%d records)", len(batch))
+            finally:
+                for _ in batch:
+                    q.task_done()
+
+    def _target(self, rec: dict) -> str:
+        if self.output == "segments":
+            return self._segment_path()
+        prefix = "Feedback" if rec["kind"] == "feedback" else "SessLog"
+        sid = rec.get("sid") or ("unknown" if rec["kind"] == "feedback" else None)
+        ext = "jsonl" if self.output == "jsonl" else "txt"
+        return os.path.join(self.directory, f"{prefix}_{sid}.{ext}")
+
+    def _segment_path(self) -> str:
+        name = f"transcript-{self._seg_started}-{os.getpid()}-{self._seg_index:04d}.jsonl"
+        return os.path.join(self.directory, name)
+
+    def _write_batch(self, batch: List[dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        render = _render_text if self.output == "text" else _render_json
+        if self.output == "segments":
+            self._write_segments([render(r) for r in batch])
+        else:
+            grouped: Dict[str, List[str]] = {}
+            for rec in batch:
+                grouped.setdefault(self._target(rec), []).append(render(rec))
+            for path, chunks in grouped.items():
+                self._append(path, "".join(chunks))
+        self.counters["batches"] += 1
+        self.counters["written"] += len(batch)
+        if self.fsync == "interval" and time.monotonic() - self._last_fsync >= self.fsync_secs:
+            self._fsync_dirty()
+
+    def _write_segments(self, lines: List[str]):
+        buf: List[str] = []
+        size = 0
+        for line in lines:
+            n = len(line.encode("utf-8"))
+            if self._seg_size + size + n > self.segment_bytes and (self._seg_size or buf):
+                if buf:
+                    self._append(self._segment_path(), "".join(buf))
+                buf, size = [], 0
+                self._seg_index += 1
+                self._seg_size = 0
+            buf.append(line)
+            size += n
+        if buf:
+            self._seg_size += size
+            self._append(self._segment_path(), "".join(buf))
+
+    def _append(self, path: str, data: str):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(data)
+            if self.fsync == "batch":
+                f.flush()
+                os.fsync(f.fileno())
+                self.counters["fsyncs"] += 1
+        self.counters["bytes"] += len(data)
+        if self.fsync == "interval":
+            with self._dirty_lock:
+                self._dirty.add(path)
+
+    def _fsync_dirty(self):
+        with self._dirty_lock:
+            paths, self._dirty = self._dirty, set()
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                self.counters["fsyncs"] += 1
+            except OSError as e:
+                log.warning("fsync %s failed: %s", path, e)
+        self._last_fsync = time.monotonic()
@@ -0,0 +1,161 @@
+# app/turns.py
+"""
+Per-session turn coordination for /assist/run and /assist/stream.
+
+A guest's turns share one Agent thread, and Azure rejects a new message while a run is active, so
+two requests for the same sid (chip tap + mic release, a double tap) must not overlap:
+
+  - serialize: each turn runs as its own task under the session's lock, in arrival order;
+  - coalesce: a request carrying the `request_id` of a turn that is in flight (or finished less
+    than TURN_IDEMPOTENCY_TTL_SECS ago) follows that turn instead of starting a new Agent run;
+  - latest wins (TURN_MODE=latest): a new turn cancels the session's previous one. The cancelled
+    turn cancels its Azure run and waits for it to settle before releasing the lock, so the next
+    message lands on an idle thread. The UI has already dropped the superseded reply.
+
+Streamed turns publish their NDJSON lines on the Turn; every follower replays them from the start.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("harci.turns")
+
+TURN_MODE                 = os.getenv("TURN_MODE", "latest").lower()      # latest | queue
+TURN_IDEMPOTENCY_TTL_SECS = float(os.getenv("TURN_IDEMPOTENCY_TTL_SECS", "30"))
+
+
+class TurnSuperseded(Exception):
+    """The turn was cancelled because the same session started a newer one."""
+
+
+class Turn:
+    __slots__ = ("sid", "request_id", "kind", "task", "lines", "superseded", "done_at", "_changed")
+
+    def __init__(self, sid: str, request_id: str, kind: str):
+        self.sid, self.request_id, self.kind = sid, request_id, kind
+        self.task: Optional[asyncio.Task] = None
+        self.lines: List[bytes] = []
+        self.superseded = False
+        self.done_at = 0.0
+        self._changed = asyncio.Event()
+
+    def push(self, line: bytes):
+        self.lines.append(line)
+        self._changed.set()
+
+    async def result(self):
+        """The turn's return value; TurnSuperseded if a newer turn cancelled it."""
+        try:
+            return await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            me = asyncio.current_task()
+            if self.superseded and self.task.cancelled() and not (me and me.cancelling()):
+                raise TurnSuperseded() from None
+            raise
+
+    async def follow(self):
+        """Yield every line pushed so far, then new ones as they arrive, until the turn ends."""
+        i = 0
+        while True:
+            while i < len(self.lines):
+                yield self.lines[i]
+                i += 1
+            if self.task.done():
+                if i == len(self.lines):
+                    return
+                continue
+            self._changed.clear()
+            waiter = asyncio.ensure_future(self._changed.wait())
+            try:
+                await asyncio.wait((waiter, self.task), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+
+
+class _SessionState:
+    __slots__ = ("lock", "current", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.current: Optional[Turn] = None
+        self.pending = 0
+
+
+class TurnCoordinator:
+    def __init__(self, *, mode: str = TURN_MODE, ttl: float = TURN_IDEMPOTENCY_TTL_SECS):
+        self.mode = mode if mode in ("latest", "queue") else "latest"
+        self.ttl = ttl
+        self._sessions: Dict[str, _SessionState] = {}
+        self._by_request: Dict[Tuple[str, str, str], Turn] = {}
+        self._last_prune = 0.0
+        self.counters = {"turns": 0, "coalesced": 0, "superseded": 0, "queued": 0}
+
+    def start(self, sid: Optional[str], request_id: Optional[str], kind: str,
+              work: Callable[[Turn], Awaitable]) -> Tuple[Turn, bool]:
+        """Start (or join) a turn. Returns (turn, joined): joined is True for a coalesced duplicate."""
+        sid = sid or ""
+        request_id = (request_id or "")[:64]
+        self._prune()
+        key = (sid, kind, request_id)
+        if request_id:
+            existing = self._by_request.get(key)
+            if existing is not None and not existing.task.cancelled():
+                self.counters["coalesced"] += 1
+                return existing, True
+
+        turn = Turn(sid, request_id, kind)
+        self.counters["turns"] += 1
+        if not sid:
+            turn.task = asyncio.create_task(work(turn))
+            return turn, False
+
+        st = self._sessions.get(sid)
+        if st is None:
+            st = self._sessions[sid] = _SessionState()
+        prev = st.current
+        if prev is not None and not prev.task.done():
+            if self.mode == "latest":
+                prev.superseded = True
+                prev.task.cancel()
+                self.counters["superseded"] += 1
+            else:
+                self.counters["queued"] += 1
+        st.current = turn
+        st.pending += 1
+        turn.task = asyncio.create_task(self._run(st, turn, work), name=f"harci-turn-{sid[:8]}")
+        if request_id:
+            self._by_request[key] = turn
+        return turn, False
+
+    async def _run(self, st: _SessionState, turn: Turn, work: Callable[[Turn], Awaitable]):
+        try:
+            async with st.lock:
+                return await work(turn)
+        finally:
+            turn.done_at = time.monotonic()
+            turn._changed.set()
+            st.pending -= 1
+            if st.pending == 0 and self._sessions.get(turn.sid) is st:
+                del self._sessions[turn.sid]
+
+    def busy(self, sid: Optional[str]) -> Optional[asyncio.Task]:
+        """The session's running turn, if any (for background thread writes that must wait for it)."""
+        st = self._sessions.get(sid or "")
+        if st is None or st.current is None or st.current.task.done():
+            return None
+        return st.current.task
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < 5:
+            return
+        self._last_prune = now
+        stale = [k for k, t in self._by_request.items() if t.done_at and now - t.done_at > self.ttl]
+        for k in stale:
+            del self._by_request[k]
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "sessions": len(self._sessions), "request_ids": len(self._by_request),
+                **self.counters}
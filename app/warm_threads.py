@@ -0,0 +1,142 @@
+# app/warm_threads.py
+"""
+Pool of pre-created Agent threads, so a new guest's first turn skips `threads.create()`.
+
+A background loop keeps between THREAD_POOL_LOW and THREAD_POOL_HIGH empty threads ready,
+aiming for enough to cover THREAD_POOL_LEAD_SECS of registrations at the recent rate
+(measured over THREAD_POOL_RATE_WINDOW_SECS). Threads nobody claimed within
+THREAD_POOL_MAX_AGE_SECS are deleted and replaced, so the pool never hands out stale ones.
+
+Seeding is not done here: the preamble is `additional_instructions` on a run and carries the
+current local time, so it stays on the guest's first run (where it costs nothing extra).
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple
+
+log = logging.getLogger("harci.threads")
+
+THREAD_POOL              = os.getenv("THREAD_POOL", "1").lower() in ("1", "true", "yes")
+THREAD_POOL_LOW          = int(os.getenv("THREAD_POOL_LOW", "2"))
+THREAD_POOL_HIGH         = int(os.getenv("THREAD_POOL_HIGH", "25"))
+THREAD_POOL_LEAD_SECS    = float(os.getenv("THREAD_POOL_LEAD_SECS", "60"))
+THREAD_POOL_RATE_WINDOW  = float(os.getenv("THREAD_POOL_RATE_WINDOW_SECS", "300"))
+THREAD_POOL_MAX_AGE_SECS = float(os.getenv("THREAD_POOL_MAX_AGE_SECS", "3600"))
+THREAD_POOL_INTERVAL     = float(os.getenv("THREAD_POOL_INTERVAL_SECS", "5"))
+THREAD_POOL_CONCURRENCY  = int(os.getenv("THREAD_POOL_CONCURRENCY", "4"))
+
+
+class WarmThreadPool:
+    def __init__(self, *, low: int = THREAD_POOL_LOW, high: int = THREAD_POOL_HIGH,
+                 lead: float = THREAD_POOL_LEAD_SECS, window: float = THREAD_POOL_RATE_WINDOW,
+                 max_age: float = THREAD_POOL_MAX_AGE_SECS):
+        self.low, self.high = max(0, low), max(low, high)
+        self.lead, self.window, self.max_age = lead, window, max_age
+        self._ready: Deque[Tuple[str, float]] = deque()   # (thread_id, created_at), oldest first
+        self._arrivals: Deque[float] = deque()
+        self._wake = asyncio.Event()
+        self.counters = {"created": 0, "claimed": 0, "empty": 0, "recycled": 0, "create_failures": 0}
+
+    # -- demand ----------------------------------------------------------------
+    def note_registration(self):
+        self._arrivals.append(time.time())
+
+    def rate(self) -> float:
+        """Registrations per second over the window."""
+        cutoff = time.time() - self.window
+        while self._arrivals and self._arrivals[0] < cutoff:
+            self._arrivals.popleft()
+        return len(self._arrivals) / self.window if self.window > 0 else 0.0
+
+    def target(self) -> int:
+        return int(min(self.high, max(self.low, round(self.rate() * self.lead))))
+
+    # -- claim -----------------------------------------------------------------
+    def take(self) -> Optional[str]:
+        """A ready thread id (oldest fresh one), or None when the pool is empty."""
+        cutoff = time.time() - self.max_age
+        while self._ready:
+            thread_id, created = self._ready.popleft()
+            if created >= cutoff:
+                self.counters["claimed"] += 1
+                if len(self._ready) < self.low:
+                    self._wake.set()
+                return thread_id
+            self._ready.appendleft((thread_id, created))  # leave aged ones for the recycler
+            break
+        self.counters["empty"] += 1
+        self._wake.set()
+        return None
+
+    # -- maintenance -----------------------------------------------------------
+    async def run(self, get_ops: Callable[[], Awaitable[object]]):
+        """Background loop: recycle aged threads, then top up to target()."""
+        backoff = THREAD_POOL_INTERVAL
+        while True:
+            try:
+                ops = await get_ops()
+                await self._recycle(ops)
+                await self._fill(ops)
+                backoff = THREAD_POOL_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                backoff = min(60.0, backoff * 2)
+                log.warning("thread pool maintenance failed (retry in %.0fs): %s", backoff, e)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _recycle(self, ops):
+        cutoff = time.time() - self.max_age
+        aged = []
+        while self._ready and self._ready[0][1] < cutoff:
+            aged.append(self._ready.popleft()[0])
+        for thread_id in aged:
+            try:
+                await ops.delete_thread(thread_id)
+            except Exception as e:
+                log.info("could not delete aged thread %s: %s", thread_id, e)
+        self.counters["recycled"] += len(aged)
+
+    async def _fill(self, ops):
+        missing = self.target() - len(self._ready)
+        if missing <= 0:
+            return
+        sem = asyncio.Semaphore(max(1, THREAD_POOL_CONCURRENCY))
+
+        async def one():
+            async with sem:
+                try:
+                    thread = await ops.create_thread()
+                except Exception:
+                    self.counters["create_failures"] += 1
+                    raise
+                self._ready.append((thread.id, time.time()))
+                self.counters["created"] += 1
+
+        results = await asyncio.gather(*(one() for _ in range(missing)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors and len(errors) == len(results):
+            raise errors[0]
+
+    async def drain(self, ops):
+        """Delete unclaimed threads (shutdown)."""
+        ids = [t for t, _ in self._ready]
+        self._ready.clear()
+        await asyncio.gather(*(ops.delete_thread(t) for t in ids), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "ready": len(self._ready),
+            "target": self.target(),
+            "low": self.low,
+            "high": self.high,
+            "registrations_per_min": round(self.rate() * 60, 2),
+            **self.counters,
+        }
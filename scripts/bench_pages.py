@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# scripts/bench_pages.py
+"""
+Page throughput at QR-scan peak: /register and /guide rendered per request (before) vs served
+from the rendered-page cache (after), plus browsers revalidating with If-None-Match (304s).
+
+Drives the app in-process over ASGI (no sockets, so the numbers are the app's own cost), or a
+running server with --url. Each of --concurrency workers loops over the pages until --requests
+have been sent; reports requests/sec and p50/p95/p99 latency per mode and path.
+
+    python scripts/bench_pages.py --requests 5000 --concurrency 200
+    python scripts/bench_pages.py --url http://127.0.0.1:8000 --modes after,revalidate
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("AGENT_EAGER_INIT", "0")
+
+import httpx  # noqa: E402
+
+PATHS = ("/register", "/guide")
+
+
+def _pct(xs, p):
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+async def _drive(client: httpx.AsyncClient, args, revalidate: bool):
+    lat = {p: [] for p in PATHS}
+    etags = {}
+    if revalidate:
+        for p in PATHS:
+            etags[p] = (await client.get(p)).headers.get("etag", "")
+    sent = 0
+    statuses = {}
+
+    async def worker(i: int):
+        nonlocal sent
+        while sent < args.requests:
+            sent += 1
+            path = PATHS[sent % len(PATHS)]
+            headers = {"if-none-match": etags[path]} if revalidate and etags.get(path) else {}
+            t0 = time.perf_counter()
+            r = await client.get(path, headers=headers)
+            lat[path].append((time.perf_counter() - t0) * 1000)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    return time.perf_counter() - t0, lat, statuses
+
+
+def _report(mode: str, elapsed: float, lat: dict, statuses: dict):
+    total = sum(len(v) for v in lat.values())
+    print(f"{mode:10s} {total / elapsed:9.0f} req/s  ({total} in {elapsed:.2f}s, status {statuses})")
+    for path, xs in lat.items():
+        print(f"           {path:10s} p50 {statistics.median(xs):7.2f} ms  p95 {_pct(xs, 0.95):7.2f} ms"
+              f"  p99 {_pct(xs, 0.99):7.2f} ms")
+
+
+async def _in_process(args, modes):
+    import app.main as m
+
+    async with m.lifespan(m.app):
+        transport = httpx.ASGITransport(app=m.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://kiosk.local") as client:
+            await client.get("/register")  # template compile / warm-up outside the timing
+            for mode in modes:
+                m._PAGES.enabled = mode != "before"
+                m._PAGES.bump()
+                _report(mode, *await _drive(client, args, revalidate=mode == "revalidate"))
+        print("page cache:", m._PAGES.stats())
+
+
+async def _remote(args, modes):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        for mode in modes:
+            _report(mode, *await _drive(client, args, revalidate=mode == "revalidate"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=4000)
+    ap.add_argument("--concurrency", type=int, default=200, help="simultaneous guests (peak QR-scan wave)")
+    ap.add_argument("--modes", default="before,after,revalidate",
+                    help="before = render every request, after = page cache, revalidate = If-None-Match")
+    ap.add_argument("--url", default=None, help="benchmark a running server instead (before is skipped)")
+    args = ap.parse_args()
+    modes = [x.strip() for x in args.modes.split(",") if x.strip()]
+    if args.url:
+        asyncio.run(_remote(args, [x for x in modes if x != "before"]))
+    else:
+        asyncio.run(_in_process(args, modes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# scripts/bench_relay_token.py
+"""
+/relay-token latency: one-shot httpx client per request (before) vs pooled clients (after).
+
+Runs a local HTTPS stub of the Avatar relay endpoint and drives the app in-process.
+Each new TLS connection to the stub pays --connect-ms of simulated network setup, which is
+what the per-request client pays on every call against the real service.
+
+    python scripts/bench_relay_token.py --requests 400 --concurrency 20 --connect-ms 40
+"""
+import os
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import datetime
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _self_signed(tmpdir: str):
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = os.path.join(tmpdir, "stub.crt"), os.path.join(tmpdir, "stub.key")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+class _RelayStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = json.dumps({"Urls": ["turn:relay.example:3478"], "Username": "u", "Password": "p"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _TLSStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, ctx: ssl.SSLContext, connect_delay: float):
+        super().__init__(addr, _RelayStub)
+        self.ctx, self.connect_delay = ctx, connect_delay
+        self.connections = 0
+
+    def finish_request(self, request, client_address):
+        # Runs on the per-connection thread: simulate RTTs of TCP+TLS setup, then handshake
+        self.connections += 1
+        time.sleep(self.connect_delay)
+        request = self.ctx.wrap_socket(request, server_side=True)
+        super().finish_request(request, client_address)
+
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+async def _drive(app, n: int, concurrency: int):
+    import httpx
+    lat, sem = [], asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as c:
+        async def one():
+            async with sem:
+                t0 = time.perf_counter()
+                r = await c.get("/relay-token")
+                lat.append((time.perf_counter() - t0) * 1000)
+                r.raise_for_status()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(n)))
+        wall = time.perf_counter() - t0
+    return lat, wall
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--connect-ms", type=float, default=40.0, help="simulated per-connection setup cost")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="harci-bench-")
+    cert, key = _self_signed(tmp)
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+    srv = _TLSStubServer(("127.0.0.1", 0), ctx, args.connect_ms / 1000)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        "SSL_CERT_FILE": cert,
+        "SPEECH_REGION": "bench", "SPEECH_KEY": "bench-key", "SPEECH_RESOURCES": "",
+        "SPEECH_RELAY_URL": f"https://127.0.0.1:{srv.server_address[1]}/relay?region={{region}}",
+        "LOG_LEVEL": "WARNING",
+    })
+    from app import main as harci, http_pool
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, connect cost {args.connect_ms:.0f} ms")
+    print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'conns':>8}")
+    for label, pooled in (("before", False), ("after", True)):
+        http_pool.SPEECH_HTTP_POOL = pooled
+        srv.connections = 0
+        lat, wall = asyncio.run(_run(harci.app, args, http_pool))
+        print(f"{label:<10}{_pct(lat, 50):>10.1f}{_pct(lat, 99):>10.1f}{len(lat) / wall:>10.0f}{srv.connections:>8}")
+    srv.shutdown()
+
+
+async def _run(app, args, http_pool):
+    try:
+        return await _drive(app, args.requests, args.concurrency)
+    finally:
+        await http_pool.stop_registry()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# scripts/bench_transcripts.py
+"""
+Transcript logging throughput: per-turn open/append on the event loop (before) vs the batched
+background writer in app/transcripts.py (after).
+
+Simulates --sessions guests each doing --turns turns concurrently; every turn does a little async
+work and then logs one exchange. Reports turns/sec, the worst event-loop stall seen by a 1 ms
+ticker, and (for "after") how long the final drain to disk took.
+
+    python scripts/bench_transcripts.py --sessions 200 --turns 50
+    python scripts/bench_transcripts.py --fsync batch --output jsonl
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.transcripts import TranscriptWriter, turn_record  # noqa: E402
+
+NARRATION = "The keynote starts at 10:00 in Hall A; the demo zone opens right after. " * 2
+BRIEFING = "### Agenda\n- 10:00 Keynote (Hall A)\n- 11:30 Demos (Expo)\n- 13:00 Lunch\n"
+
+
+def _legacy_log_turn(directory, sid, user_name, text, narration, briefing_md):
+    # The pre-writer implementation, verbatim apart from the directory
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"SessLog_{sid}.txt"), "a", encoding="utf-8") as f:
+        f.write(f"User: {user_name}: {text}\n")
+        f.write(f"HARCi: {narration}\n")
+        f.write(f"Briefing: {briefing_md}\n\n")
+
+
+async def _ticker(stop: asyncio.Event, worst: list):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        worst[0] = max(worst[0], now - last - 0.001)
+        last = now
+
+
+async def _run(mode: str, args, directory: str):
+    writer = TranscriptWriter(directory, output=args.output, fsync=args.fsync) if mode == "after" else None
+    stop, worst = asyncio.Event(), [0.0]
+    tick = asyncio.create_task(_ticker(stop, worst))
+
+    async def guest(i: int):
+        sid = f"bench{i:05d}"
+        for t in range(args.turns):
+            await asyncio.sleep(0)  # stand-in for the awaited Agent call
+            if writer is None:
+                _legacy_log_turn(directory, sid, "Guest", f"question {t}", NARRATION, BRIEFING)
+            else:
+                writer.submit(turn_record(sid, "Guest", f"question {t}", NARRATION, BRIEFING))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(guest(i) for i in range(args.sessions)))
+    handled = time.perf_counter() - t0
+    drain = 0.0
+    if writer is not None:
+        t1 = time.perf_counter()
+        await writer.close()
+        drain = time.perf_counter() - t1
+    stop.set()
+    await tick
+    stats = writer.stats() if writer is not None else {}
+    return handled, drain, worst[0], stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--turns", type=int, default=50)
+    ap.add_argument("--output", default="text", choices=("text", "jsonl", "segments"))
+    ap.add_argument("--fsync", default="interval", choices=("never", "interval", "batch"))
+    args = ap.parse_args()
+
+    n = args.sessions * args.turns
+    print(f"{n} turns over {args.sessions} sessions; writer output={args.output} fsync={args.fsync}")
+    print(f"{'mode':<8}{'turns/s':>12}{'drain s':>10}{'max stall ms':>14}{'batches':>10}")
+    for mode in ("before", "after"):
+        directory = tempfile.mkdtemp(prefix="harci-transcripts-")
+        try:
+            handled, drain, stall, stats = asyncio.run(_run(mode, args, directory))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(f"{mode:<8}{n / handled:>12.0f}{drain:>10.2f}{stall * 1000:>14.1f}{stats.get('batches', '-'):>10}")
+
+
+if __name__ == "__main__":
+    main()
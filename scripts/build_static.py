@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# scripts/build_static.py
+"""
+Static asset build: content-hashed copies of app/static plus precompressed variants and a manifest,
+served by app/static_assets.AssetStaticFiles (immutable caching, Accept-Encoding negotiation).
+
+For every file under --src (except --out itself) it writes
+    <out>/<dir>/<stem>.<hash>.<ext>        the fingerprinted copy
+    <out>/<dir>/<stem>.<hash>.<ext>.gz     gzip -9, for text assets that shrink by >= 5%
+    <out>/<dir>/<stem>.<hash>.<ext>.br     brotli q11, same rule (needs the `brotli` package)
+plus one minified bundle per app.static_assets.BUNDLES entry (logical path bundles/<name>.js,
+hashed and compressed the same way; rjsmin when installed, else a conservative line-level pass),
+and <out>/manifest.json:
+    {"version": 1, "files": {"js/api.js": {"path": "dist/js/api.1a2b3c4d5e.js",
+                                           "hash": "1a2b...", "size": 4892, "encodings": {"br": 1510, "gzip": 1702}}}}
+Output is reproducible (gzip mtime 0, sorted manifest), so the same sources give the same URLs on
+every replica. --out is rebuilt from scratch each run.
+
+    python scripts/build_static.py
+    python scripts/build_static.py --src app/static --out app/static/dist --no-brotli
+"""
+import os
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+
+try:
+    import brotli  # type: ignore
+except Exception:
+    brotli = None
+
+try:
+    import rjsmin  # type: ignore
+except Exception:
+    rjsmin = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.static_assets import BUNDLES, bundle_path  # noqa: E402
+
+COMPRESSIBLE = {".js", ".css", ".json", ".webmanifest", ".map", ".svg", ".txt", ".html", ".xml", ".ico"}
+MIN_SAVING = 0.05
+
+
+def _hashed_name(rel: str, digest: str) -> str:
+    d, name = os.path.split(rel)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(d, f"{stem}.{digest}{ext}")
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _variants(data: bytes, use_brotli: bool, min_size: int) -> dict:
+    out = {}
+    if len(data) < min_size:
+        return out
+    if use_brotli:
+        out["br"] = brotli.compress(data, quality=11)
+    out["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+    return {enc: blob for enc, blob in out.items() if len(blob) <= len(data) * (1 - MIN_SAVING)}
+
+
+def minify_js(source: str) -> str:
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    # No multi-line string literals in app/static/js, so per-line trimming is safe; newlines are
+    # kept so automatic semicolon insertion behaves exactly as in the source.
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def _bundle(src: str, files) -> bytes:
+    parts = []
+    for rel in files:
+        with open(os.path.join(src, rel), "r", encoding="utf-8") as f:
+            parts.append(f"/* {rel} */\n{minify_js(f.read())}\n;")
+    return ("\n".join(parts) + "\n").encode("utf-8")
+
+
+def build(src: str, out: str, *, hash_len: int = 10, use_brotli: bool = True, min_size: int = 256) -> dict:
+    src, out = os.path.abspath(src), os.path.abspath(out)
+    prefix = os.path.relpath(out, src).replace(os.sep, "/")
+    if prefix.startswith(".."):
+        raise SystemExit("--out must be inside --src (it is served from the same mount)")
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    files = {}
+
+    def emit(rel: str, data: bytes):
+        digest = hashlib.sha256(data).hexdigest()
+        hashed = _hashed_name(rel, digest[:hash_len])
+        _write(os.path.join(out, hashed), data)
+        encodings = {}
+        if os.path.splitext(rel)[1].lower() in COMPRESSIBLE:
+            suffix = {"br": ".br", "gzip": ".gz"}
+            for enc, blob in _variants(data, use_brotli, min_size).items():
+                _write(os.path.join(out, hashed + suffix[enc]), blob)
+                encodings[enc] = len(blob)
+        files[rel.replace(os.sep, "/")] = {
+            "path": f"{prefix}/{hashed.replace(os.sep, '/')}",
+            "hash": digest,
+            "size": len(data),
+            "encodings": encodings,
+        }
+
+    for dirpath, dirnames, filenames in os.walk(src):
+        dirnames[:] = sorted(d for d in dirnames
+                             if not d.startswith(".") and os.path.join(dirpath, d) != out)
+        for name in sorted(filenames):
+            if name.startswith("."):
+                continue
+            full = os.path.join(dirpath, name)
+            rel = os.path.relpath(full, src)
+            with open(full, "rb") as f:
+                emit(rel, f.read())
+    for name, members in BUNDLES.items():
+        emit(bundle_path(name), _bundle(src, members))
+    manifest = {"version": 1, "files": dict(sorted(files.items())),
+                "bundles": {name: list(members) for name, members in BUNDLES.items()}}
+    _write(os.path.join(out, "manifest.json"), json.dumps(manifest, indent=1).encode("utf-8"))
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--src", default=os.path.join(ROOT, "app", "static"))
+    ap.add_argument("--out", default=None, help="default: <src>/dist")
+    ap.add_argument("--hash-len", type=int, default=10)
+    ap.add_argument("--min-size", type=int, default=256, help="don't compress files smaller than this")
+    ap.add_argument("--no-brotli", action="store_true")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args()
+
+    use_brotli = not args.no_brotli and brotli is not None
+    if not args.no_brotli and brotli is None:
+        print("brotli not installed; writing gzip variants only", file=sys.stderr)
+    out = args.out or os.path.join(args.src, "dist")
+    manifest = build(args.src, out, hash_len=args.hash_len, use_brotli=use_brotli, min_size=args.min_size)
+
+    files = manifest["files"]
+    raw = sum(e["size"] for e in files.values())
+    gz = sum(e["encodings"].get("gzip", e["size"]) for e in files.values())
+    br = sum(e["encodings"].get("br", e["encodings"].get("gzip", e["size"])) for e in files.values())
+    if not args.quiet:
+        for rel, e in files.items():
+            enc = ", ".join(f"{k} {v}" for k, v in e["encodings"].items()) or "-"
+            print(f"{rel:40s} {e['size']:8d}  {enc:24s} -> {e['path']}")
+    print(f"{len(files)} assets: {raw} bytes raw, {gz} gzip, {br} best ({out})")
+
+
+if __name__ == "__main__":
+    main()
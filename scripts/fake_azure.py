@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# scripts/fake_azure.py
+"""
+Local HTTPS stand-in for the Azure AI Agents project endpoint and the Speech STS / Avatar relay
+endpoints, close enough to the REST API that the real SDK (sync or aio) talks to it unchanged.
+
+Point the app at it with FAKE_AZURE_URL=https://127.0.0.1:<port> (sets PROJECT_ENDPOINT,
+AGENT_ID, the Speech URLs and AZURE_CREDENTIAL=static) and trust the printed certificate with
+SSL_CERT_FILE + REQUESTS_CA_BUNDLE. scripts/loadgen.py does all of that for you.
+
+Latency / failure model (all per request, independent):
+  - every call takes --api-ms (lognormal around it) before answering;
+  - a run takes --run-ms (lognormal, --run-sigma) from creation to completion, plus --per-message-ms
+    for every message already on the thread (the model re-reads it all); streamed runs send the
+    first delta after --first-token-frac of it and spread the rest over --chunks deltas;
+  - --rate-429 of calls get 429 + Retry-After (the SDK's retry policy backs off and retries);
+  - --error-rate of calls get a 500; --fail-rate of runs end as status "failed";
+  - Speech token calls take --speech-ms.
+
+    python scripts/fake_azure.py --port 8443 --run-ms 2500 --rate-429 0.02
+"""
+import os
+import sys
+import json
+import time
+import math
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_relay_token import _self_signed  # noqa: E402
+
+REPLIES = {
+    "agenda": ("Here is today's agenda. The keynote starts at ten in Hall A, demos open at eleven thirty, "
+               "and lunch is served at one.", "### Agenda\n- 10:00 Keynote (Hall A)\n- 11:30 Demos\n- 13:00 Lunch"),
+    "venue": ("The venue map is on screen. Hall A is straight ahead, the demo zone is to your left.",
+              "### Venue\n- Hall A: main stage\n- Expo: demo zone\n- Level 2: meeting rooms"),
+    "speakers": ("Today's speakers include our CTO and two customer panels. Details are in the briefing.",
+                 "### Speakers\n- Keynote: CTO\n- Panel: Energy\n- Panel: Mobility"),
+    "help": ("Hold the mic button and ask me anything about the event. You can also tap the chips below.",
+             "### Help\n- Hold & Speak to talk\n- Tap a chip for quick answers"),
+}
+GENERIC = ("Good question. The team at the demo zone can show you more, and I can guide you there. "
+           "Is there anything else you would like to know?", "### Next steps\n- Visit the demo zone\n- Ask another question")
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _lognormal(median_ms: float, sigma: float) -> float:
+    if median_ms <= 0:
+        return 0.0
+    return median_ms * math.exp(random.gauss(0, sigma)) / 1000
+
+
+def _reply_for(prompt: str) -> str:
+    p = prompt.lower()
+    narration, briefing = next((v for k, v in REPLIES.items() if k in p), GENERIC)
+    if "welcome" in p:
+        narration, briefing = "Welcome to the event! I'm HARCi, your concierge. Ask me about the agenda, " \
+                              "the venue or the speakers.", "### Welcome\n- Agenda\n- Venue Map\n- Speakers"
+    return json.dumps({"narration": narration, "briefing_md": briefing, "image": None})
+
+
+def _message(thread_id: str, role: str, text: str, run_id: Optional[str] = None, agent_id: Optional[str] = None) -> dict:
+    now = _now()
+    return {
+        "id": _id("msg"), "object": "thread.message", "created_at": now, "thread_id": thread_id,
+        "status": "completed", "incomplete_details": None, "completed_at": now, "incomplete_at": None,
+        "role": role, "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "assistant_id": agent_id, "run_id": run_id, "attachments": [], "metadata": {},
+    }
+
+
+class FakeAzure:
+    def __init__(self, args):
+        self.args = args
+        self.threads: Dict[str, List[dict]] = {}
+        self.runs: Dict[str, dict] = {}
+        self.active: Dict[str, str] = {}    # thread id -> id of its queued/in_progress run
+        self.counters: Dict[str, int] = {"requests": 0, "throttled": 0, "errors": 0, "runs": 0,
+                                         "runs_failed": 0, "runs_cancelled": 0, "streams": 0, "threads": 0,
+                                         "conflicts": 0, "speech_tokens": 0, "relay_tokens": 0}
+
+    # -- model ------------------------------------------------------------------
+    async def _latency(self, ms: Optional[float] = None):
+        await asyncio.sleep(_lognormal(self.args.api_ms if ms is None else ms, 0.3))
+
+    def _injected_failure(self) -> Optional[Response]:
+        r = random.random()
+        if r < self.args.rate_429:
+            self.counters["throttled"] += 1
+            return JSONResponse({"error": {"code": "too_many_requests", "message": "Rate limit is exceeded."}},
+                                status_code=429, headers={"Retry-After": str(self.args.retry_after)})
+        if r < self.args.rate_429 + self.args.error_rate:
+            self.counters["errors"] += 1
+            return JSONResponse({"error": {"code": "server_error", "message": "Injected failure."}}, status_code=500)
+        return None
+
+    # -- Agents ---------------------------------------------------------------
+    def _run_json(self, run: dict) -> dict:
+        now = time.time()
+        status = run["status"]
+        if status in ("queued", "in_progress") and now >= run["done_at"] and not run["_stream"]:
+            self._finish(run)
+        elif status == "queued" and now >= run["created_at"] + 0.1:
+            run["status"] = "in_progress"
+        return {k: v for k, v in run.items() if not k.startswith("_") and k not in ("done_at", "prompt")}
+
+    @staticmethod
+    def _step_json(run: dict, step_id: str, status: str) -> dict:
+        # Streams interleave these with the run's own events; a step id is not a run id
+        return {"id": step_id, "object": "thread.run.step", "created_at": _now(), "run_id": run["id"],
+                "assistant_id": run["assistant_id"], "thread_id": run["thread_id"], "type": "message_creation",
+                "status": status, "step_details": {"type": "message_creation", "message_creation": {"message_id": ""}}}
+
+    def _active_run(self, thread_id: str) -> Optional[dict]:
+        run = self.runs.get(self.active.get(thread_id, ""))
+        if run is None:
+            return None
+        self._run_json(run)
+        return run if run["status"] in ("queued", "in_progress") else None
+
+    def _finish(self, run: dict, failed: Optional[bool] = None):
+        if self.active.get(run["thread_id"]) == run["id"]:
+            del self.active[run["thread_id"]]
+        if failed is None:
+            failed = random.random() < self.args.fail_rate
+        if failed:
+            run.update(status="failed", failed_at=_now(),
+                       last_error={"code": "server_error", "message": "Injected run failure."})
+            self.counters["runs_failed"] += 1
+            return
+        msg = _message(run["thread_id"], "assistant", _reply_for(run["prompt"]), run["id"], run["assistant_id"])
+        self.threads.setdefault(run["thread_id"], []).append(msg)
+        run.update(status="completed", completed_at=_now())
+        run["_message"] = msg
+
+    def _new_run(self, thread_id: str, body: dict) -> dict:
+        msgs = self.threads.get(thread_id, [])
+        prompt = next((m["content"][0]["text"]["value"] for m in reversed(msgs) if m["role"] == "user"), "")
+        now = time.time()
+        run = {
+            "id": _id("run"), "object": "thread.run", "thread_id": thread_id,
+            "assistant_id": body.get("assistant_id") or body.get("agent_id") or "asst_fake",
+            "status": "queued", "required_action": None, "last_error": None, "model": "gpt-4o",
+            "instructions": body.get("additional_instructions") or "", "tools": [],
+            "created_at": int(now), "started_at": int(now), "completed_at": None, "failed_at": None,
+            "cancelled_at": None, "expires_at": None, "incomplete_details": None, "usage": None,
+            "temperature": 1.0, "top_p": 1.0, "tool_choice": "auto", "response_format": "auto",
+            "metadata": {}, "parallel_tool_calls": True,
+            "done_at": now + _lognormal(self.args.run_ms, self.args.run_sigma) + self.args.per_message_ms * len(msgs) / 1000,
+            "prompt": prompt,
+            "_stream": bool(body.get("stream")),
+        }
+        self.runs[run["id"]] = run
+        self.active[thread_id] = run["id"]
+        self.counters["runs"] += 1
+        return run
+
+    async def get_agent(self, request: Request):
+        aid = request.path_params["agent_id"]
+        return JSONResponse({"id": aid, "object": "assistant", "created_at": _now(), "name": "HARCi (fake)",
+                             "description": None, "model": "gpt-4o", "instructions": "", "tools": [],
+                             "tool_resources": {}, "temperature": 1.0, "top_p": 1.0,
+                             "response_format": "auto", "metadata": {}})
+
+    async def create_thread(self, request: Request):
+        tid = _id("thread")
+        self.threads[tid] = []
+        self.counters["threads"] += 1
+        return JSONResponse({"id": tid, "object": "thread", "created_at": _now(), "tool_resources": {}, "metadata": {}})
+
+    async def delete_thread(self, request: Request):
+        tid = request.path_params["thread_id"]
+        self.threads.pop(tid, None)
+        return JSONResponse({"id": tid, "object": "thread.deleted", "deleted": True})
+
+    async def create_message(self, request: Request):
+        tid = request.path_params["thread_id"]
+        body = await request.json()
+        content = body.get("content")
+        if isinstance(content, list):
+            content = " ".join(str(c.get("text", "")) for c in content if isinstance(c, dict))
+        active = self._active_run(tid)
+        if active is not None:   # as the service does: one run at a time per thread
+            self.counters["conflicts"] += 1
+            return JSONResponse({"error": {"code": "invalid_request_error", "message":
+                                 f"Can't add messages to {tid} while a run {active['id']} is active."}},
+                                status_code=400)
+        msg = _message(tid, body.get("role") or "user", str(content or ""))
+        self.threads.setdefault(tid, []).append(msg)
+        return JSONResponse(msg)
+
+    async def list_messages(self, request: Request):
+        msgs = list(self.threads.get(request.path_params["thread_id"], []))
+        if request.query_params.get("order", "desc") == "desc":
+            msgs.reverse()
+        after = request.query_params.get("after")
+        if after:  # the SDK pages with after=<last_id> until a page comes back empty
+            ids = [m["id"] for m in msgs]
+            msgs = msgs[ids.index(after) + 1:] if after in ids else []
+        limit = int(request.query_params.get("limit", "20"))
+        page = msgs[:limit]
+        return JSONResponse({"object": "list", "data": page, "first_id": page[0]["id"] if page else None,
+                             "last_id": page[-1]["id"] if page else None, "has_more": len(msgs) > limit})
+
+    async def get_message(self, request: Request):
+        mid = request.path_params["message_id"]
+        for m in self.threads.get(request.path_params["thread_id"], []):
+            if m["id"] == mid:
+                return JSONResponse(m)
+        return JSONResponse({"error": {"code": "not_found", "message": "No message"}}, status_code=404)
+
+    async def create_run(self, request: Request):
+        tid = request.path_params["thread_id"]
+        body = await request.json()
+        if self._active_run(tid) is not None:
+            self.counters["conflicts"] += 1
+            return JSONResponse({"error": {"code": "invalid_request_error",
+                                           "message": f"Thread {tid} already has an active run."}}, status_code=400)
+        run = self._new_run(tid, body)
+        if body.get("stream"):
+            self.counters["streams"] += 1
+            return StreamingResponse(self._stream(run), media_type="text/event-stream")
+        return JSONResponse(self._run_json(run))
+
+    async def list_runs(self, request: Request):
+        tid = request.path_params["thread_id"]
+        runs = sorted((r for r in self.runs.values() if r["thread_id"] == tid), key=lambda r: r["created_at"],
+                      reverse=request.query_params.get("order", "desc") == "desc")
+        limit = int(request.query_params.get("limit", "20"))
+        page = [self._run_json(r) for r in runs[:limit]]
+        return JSONResponse({"object": "list", "data": page, "first_id": page[0]["id"] if page else None,
+                             "last_id": page[-1]["id"] if page else None, "has_more": len(runs) > limit})
+
+    async def get_run(self, request: Request):
+        run = self.runs.get(request.path_params["run_id"])
+        if run is None:
+            return JSONResponse({"error": {"code": "not_found", "message": "No run"}}, status_code=404)
+        return JSONResponse(self._run_json(run))
+
+    async def cancel_run(self, request: Request):
+        run = self.runs.get(request.path_params["run_id"])
+        if run is None:
+            return JSONResponse({"error": {"code": "not_found", "message": "No run"}}, status_code=404)
+        if run["status"] in ("queued", "in_progress"):
+            run.update(status="cancelled", cancelled_at=_now())
+            self.active.pop(run["thread_id"], None)
+            self.counters["runs_cancelled"] += 1
+        return JSONResponse(self._run_json(run))
+
+    async def _stream(self, run: dict):
+        def sse(event: str, data) -> bytes:
+            return f"event: {event}\ndata: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode()
+
+        try:
+            async for chunk in self._stream_events(run, sse):
+                yield chunk
+        finally:
+            run["_stream"] = False   # client went away: the run carries on and completes on its own
+
+    async def _stream_events(self, run: dict, sse):
+        yield sse("thread.run.created", self._run_json(run))
+        run["status"] = "in_progress"
+        yield sse("thread.run.in_progress", self._run_json(run))
+        run_step = self._step_json(run, _id("step"), "in_progress")
+        yield sse("thread.run.step.created", run_step)
+        yield sse("thread.run.step.in_progress", run_step)
+        total = max(0.0, run["done_at"] - time.time())
+        await asyncio.sleep(total * self.args.first_token_frac)
+        failed = random.random() < self.args.fail_rate
+        if failed:
+            self._finish(run, failed=True)
+            yield sse("thread.run.step.failed", {**run_step, "status": "failed"})
+            yield sse("thread.run.failed", self._run_json(run))
+            yield sse("done", "[DONE]")
+            return
+        text = _reply_for(run["prompt"])
+        msg_id = _id("msg")
+        yield sse("thread.message.created", {**_message(run["thread_id"], "assistant", "", run["id"], run["assistant_id"]),
+                                             "id": msg_id, "status": "in_progress", "content": []})
+        n = max(1, self.args.chunks)
+        step = math.ceil(len(text) / n)
+        gap = total * (1 - self.args.first_token_frac) / n
+        for i in range(0, len(text), step):
+            yield sse("thread.message.delta", {"id": msg_id, "object": "thread.message.delta", "delta": {
+                "role": "assistant",
+                "content": [{"index": 0, "type": "text", "text": {"value": text[i:i + step], "annotations": []}}]}})
+            await asyncio.sleep(gap)
+        run["done_at"] = 0
+        self._finish(run, failed=False)
+        msg = run.pop("_message")
+        msg["id"] = msg_id
+        yield sse("thread.message.completed", msg)
+        yield sse("thread.run.step.completed", {**run_step, "status": "completed", "completed_at": _now(),
+                                                    "step_details": {"type": "message_creation",
+                                                                     "message_creation": {"message_id": msg_id}}})
+        yield sse("thread.run.completed", self._run_json(run))
+        yield sse("done", "[DONE]")
+
+    # -- Speech ---------------------------------------------------------------
+    async def speech_token(self, request: Request):
+        await self._latency(self.args.speech_ms)
+        self.counters["speech_tokens"] += 1
+        return PlainTextResponse("fake-sts." + uuid.uuid4().hex)
+
+    async def relay_token(self, request: Request):
+        await self._latency(self.args.speech_ms)
+        self.counters["relay_tokens"] += 1
+        return JSONResponse({"Urls": ["turn:relay.fake.local:3478"], "Username": f"{int(time.time()) + 86400}:fake",
+                             "Password": uuid.uuid4().hex})
+
+    async def stats(self, request: Request):
+        return JSONResponse({**self.counters, "live_threads": len(self.threads), "live_runs": len(self.runs)})
+
+    # -- app --------------------------------------------------------------------
+    def app(self) -> Starlette:
+        p = "/api/projects/{project}"
+        routes = [
+            Route(p + "/assistants/{agent_id}", self.get_agent, methods=["GET"]),
+            Route(p + "/threads", self.create_thread, methods=["POST"]),
+            Route(p + "/threads/{thread_id}", self.delete_thread, methods=["DELETE"]),
+            Route(p + "/threads/{thread_id}/messages", self.create_message, methods=["POST"]),
+            Route(p + "/threads/{thread_id}/messages", self.list_messages, methods=["GET"]),
+            Route(p + "/threads/{thread_id}/messages/{message_id}", self.get_message, methods=["GET"]),
+            Route(p + "/threads/{thread_id}/runs", self.create_run, methods=["POST"]),
+            Route(p + "/threads/{thread_id}/runs", self.list_runs, methods=["GET"]),
+            Route(p + "/threads/{thread_id}/runs/{run_id}", self.get_run, methods=["GET"]),
+            Route(p + "/threads/{thread_id}/runs/{run_id}/cancel", self.cancel_run, methods=["POST"]),
+            Route("/speech/{region}/sts/v1.0/issueToken", self.speech_token, methods=["POST"]),
+            Route("/speech/{region}/avatar/relay/token/v1", self.relay_token, methods=["GET"]),
+            Route("/_fake/stats", self.stats, methods=["GET"]),
+        ]
+        app = Starlette(routes=routes)
+        fake = self
+
+        @app.middleware("http")
+        async def model(request: Request, call_next):
+            fake.counters["requests"] += 1
+            if request.url.path.startswith("/_fake/"):
+                return await call_next(request)
+            if not request.url.path.startswith("/speech/"):
+                await fake._latency()
+            return fake._injected_failure() or await call_next(request)
+
+        return app
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8443)
+    ap.add_argument("--cert-dir", default=None, help="where to write the self-signed cert (default: a temp dir)")
+    ap.add_argument("--api-ms", type=float, default=25.0, help="median latency of every Agents call")
+    ap.add_argument("--run-ms", type=float, default=2500.0, help="median run duration")
+    ap.add_argument("--run-sigma", type=float, default=0.4, help="lognormal spread of run duration")
+    ap.add_argument("--per-message-ms", type=float, default=0.0, help="extra run time per message on the thread")
+    ap.add_argument("--first-token-frac", type=float, default=0.4, help="share of a streamed run before the first delta")
+    ap.add_argument("--chunks", type=int, default=12, help="deltas per streamed reply")
+    ap.add_argument("--speech-ms", type=float, default=60.0, help="median latency of Speech token calls")
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=None)
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    import uvicorn
+
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    cert_dir = args.cert_dir or tempfile.mkdtemp(prefix="harci-fake-azure-")
+    os.makedirs(cert_dir, exist_ok=True)
+    cert, key = _self_signed(cert_dir)
+    print(json.dumps({"url": f"https://{args.host}:{args.port}", "cert": cert}), flush=True)
+    uvicorn.run(FakeAzure(args).app(), host=args.host, port=args.port, ssl_certfile=cert, ssl_keyfile=key,
+                log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# scripts/index_logs.py
+"""
+Post-event analysis over the session logs, via the incremental index in app/log_index.py.
+
+Every command first indexes what was appended since the last run (--no-update to skip), so
+running it again during or after the event costs only the new bytes.
+
+    python scripts/index_logs.py update
+    python scripts/index_logs.py stats                 # turns, sources, failure rate, latency
+    python scripts/index_logs.py top -n 30             # most asked questions
+    python scripts/index_logs.py suggest               # what to add to ANSWER_CACHE_PROMPTS / the content file
+    python scripts/index_logs.py session <sid>
+    python scripts/index_logs.py feedback --json
+"""
+import os
+import sys
+import json
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.log_index import LOG_INDEX_DIR, LogIndex  # noqa: E402
+from app.transcripts import TRANSCRIPT_DIR  # noqa: E402
+
+
+def _print_stats(s: dict):
+    print(f"{s['turns']} turns, {s['sessions']} sessions, {s['questions']} distinct questions, "
+          f"{s['feedback']} feedback; failure rate {s['failure_rate'] * 100:.1f}%")
+    print(f"{'source':<14}{'turns':>8}{'n ms':>8}{'p50':>9}{'p90':>9}{'p99':>9}")
+    for src, n in sorted(s["sources"].items(), key=lambda kv: -kv[1]):
+        lat = s["latency_ms"].get(src, {})
+        cells = [f"{lat[k]:>9.1f}" if lat.get(k) is not None else f"{'-':>9}" for k in ("p50", "p90", "p99")]
+        print(f"{src:<14}{n:>8}{lat.get('n', 0):>8}" + "".join(cells))
+
+
+def _print_questions(rows: list, extra: str = ""):
+    print(f"{'count':>6}{'sess':>6}{'fail':>6}  question  [sources]")
+    for r in rows:
+        srcs = ", ".join(f"{k} {v}" for k, v in r["sources"].items())
+        print(f"{r['count']:>6}{r['sessions']:>6}{r['failures']:>6}  {r['question'] or '(empty)'}  [{srcs}]")
+    if extra:
+        print(extra)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=("update", "stats", "top", "suggest", "session", "feedback"))
+    ap.add_argument("sid", nargs="?", help="session id (session command)")
+    ap.add_argument("--dir", default=TRANSCRIPT_DIR, help="transcript directory (default: TRANSCRIPT_DIR)")
+    ap.add_argument("--index", default=None, help="index directory (default: LOG_INDEX_DIR, or <dir>/_index)")
+    ap.add_argument("-n", type=int, default=20, help="rows for top / suggest")
+    ap.add_argument("--no-update", action="store_true", help="query the index as it is")
+    ap.add_argument("--json", action="store_true", help="print JSON")
+    args = ap.parse_args()
+
+    index_dir = args.index or (LOG_INDEX_DIR if args.dir == TRANSCRIPT_DIR else os.path.join(args.dir, "_index"))
+    idx = LogIndex(args.dir, index_dir)
+    if not args.no_update or args.command == "update":
+        u = idx.update()
+        if not args.json or args.command == "update":
+            print(f"indexed {u['turns']} turns, {u['feedback']} feedback from {u['files_changed']}/{u['files_scanned']} "
+                  f"files ({u['bytes']} bytes) in {u['ms']} ms", file=sys.stderr if args.command != "update" else sys.stdout)
+
+    if args.command == "update":
+        return
+    if args.command == "stats":
+        out = idx.summary()
+        return print(json.dumps(out, indent=2)) if args.json else _print_stats(out)
+    if args.command == "top":
+        out = idx.top_questions(args.n)
+        return print(json.dumps(out, indent=2, ensure_ascii=False)) if args.json else _print_questions(out)
+    if args.command == "suggest":
+        out = idx.precompute_candidates(args.n)
+        if args.json:
+            return print(json.dumps(out, indent=2, ensure_ascii=False))
+        return _print_questions(out, "ANSWER_CACHE_PROMPTS candidates: " + ",".join(r["question"] for r in out))
+    if args.command == "session":
+        if not args.sid:
+            ap.error("session needs a SID")
+        out = idx.session(args.sid)
+        if args.json:
+            return print(json.dumps(out, indent=2, ensure_ascii=False))
+        for t in out["turns"]:
+            print(f"{t['source']:<12}{t['ms'] if t['ms'] is not None else '-':>9}  {t['question']}")
+        for f in out["feedback"]:
+            print(f"feedback ({f['name']}): {f['feedback']}")
+        return
+    out = idx.feedback_by_session()
+    if args.json:
+        return print(json.dumps(out, indent=2, ensure_ascii=False))
+    for sid, items in out.items():
+        for f in items:
+            print(f"{sid}  {f['name']}: {f['feedback']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# scripts/loadgen.py
+"""
+Guest-journey load generator: many kiosk guests walking through the app at once, against the
+local Azure stand-in (scripts/fake_azure.py) so the numbers are the app's own capacity.
+
+Each guest (own cookie jar) does what the browser does:
+    GET /register -> POST /api/register -> GET /guide -> /speech-token + /relay-token
+    -> POST /assist/welcome -> --chips quick chips and --questions free questions
+       (/assist/stream, or /assist/run with --no-stream), with --think-ms between turns
+    -> POST /api/session/end
+Guests arrive at --arrival-rate per second (0 = all at once) until --guests have started.
+
+By default the fake server and one app worker (uvicorn) are started as subprocesses on free ports,
+wired with FAKE_AZURE_URL; pass --base-url to drive an app that is already running (start it with
+FAKE_AZURE_URL yourself). Reports throughput, p50/p95/p99 and status counts per endpoint, time to
+first narration for streamed turns, and event-loop lag from /api/loop/stats (needs ADMIN_TOKEN to
+reset it at the start; otherwise the lag covers the worker's whole life).
+
+    python scripts/loadgen.py --guests 200 --arrival-rate 20
+    python scripts/loadgen.py --guests 50 --run-ms 4000 --rate-429 0.05 --json out.json
+    python scripts/loadgen.py --base-url http://127.0.0.1:8000 --admin-token secret
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHIPS = ("Agenda", "Venue Map", "Speakers", "Help")
+QUESTIONS = (
+    "Where can I get coffee?",
+    "What is the demo about energy storage?",
+    "When does the keynote start?",
+    "Who should I talk to about partnerships?",
+    "Is there a session on AI in manufacturing?",
+    "Where is the nearest restroom?",
+)
+
+
+def _pct(xs, p):
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Recorder:
+    def __init__(self):
+        self.lat = defaultdict(list)
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.first_narration = []
+        self.cache_hits = 0
+        self.journeys_ok = 0
+        self.journeys_failed = 0
+
+    def add(self, name: str, ms: float, status):
+        self.lat[name].append(ms)
+        self.status[name][status] += 1
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kw) -> httpx.Response:
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, url, **kw)
+        except httpx.HTTPError as e:
+            self.add(name, (time.perf_counter() - t0) * 1000, type(e).__name__)
+            raise
+        self.add(name, (time.perf_counter() - t0) * 1000, r.status_code)
+        if r.headers.get("x-answer-cache") == "hit":
+            self.cache_hits += 1
+        return r
+
+    async def stream(self, client: httpx.AsyncClient, name: str, url: str, **kw):
+        t0 = time.perf_counter()
+        first = None
+        status = None
+        try:
+            async with client.stream("POST", url, **kw) as r:
+                status = r.status_code
+                if r.headers.get("x-answer-cache") == "hit":
+                    self.cache_hits += 1
+                async for line in r.aiter_lines():
+                    if first is None and '"narration"' in line:
+                        first = (time.perf_counter() - t0) * 1000
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            raise
+        finally:
+            self.add(name, (time.perf_counter() - t0) * 1000, status)
+            if first is not None:
+                self.first_narration.append(first)
+
+
+async def journey(i: int, args, rec: Recorder):
+    think = lambda: asyncio.sleep(random.uniform(0.5, 1.5) * args.think_ms / 1000)  # noqa: E731
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as c:
+        try:
+            await rec.call(c, "GET /register", "GET", "/register")
+            r = await rec.call(c, "POST /api/register", "POST", "/api/register",
+                               data={"name": f"Guest {i}", "company": f"Company {i % 17}"})
+            r.raise_for_status()
+            sid = r.json().get("sid", "")
+            await rec.call(c, "GET /guide", "GET", "/guide")
+            await asyncio.gather(rec.call(c, "GET /speech-token", "GET", "/speech-token"),
+                                 rec.call(c, "GET /relay-token", "GET", "/relay-token"))
+            await rec.call(c, "POST /assist/welcome", "POST", "/assist/welcome")
+            turns = random.sample(CHIPS, min(args.chips, len(CHIPS))) + \
+                [random.choice(QUESTIONS) for _ in range(args.questions)]
+            for text in turns:
+                await think()
+                body = {"text": text, "session_id": sid}
+                if args.no_stream:
+                    await rec.call(c, "POST /assist/run", "POST", "/assist/run", json=body)
+                else:
+                    await rec.stream(c, "POST /assist/stream", "/assist/stream", json=body)
+            await rec.call(c, "POST /api/session/end", "POST", "/api/session/end", json={"sid": sid})
+            rec.journeys_ok += 1
+        except Exception:
+            rec.journeys_failed += 1
+
+
+async def run_load(args) -> dict:
+    rec = Recorder()
+    admin = {"X-Admin-Token": args.admin_token} if args.admin_token else {}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=10) as c:
+        if admin:
+            await c.post("/api/admin/loop/reset", headers=admin)
+        fake0 = await _fake_stats(args)
+        t0 = time.perf_counter()
+        tasks = []
+        for i in range(args.guests):
+            tasks.append(asyncio.create_task(journey(i, args, rec)))
+            if args.arrival_rate > 0:
+                await asyncio.sleep(random.expovariate(args.arrival_rate))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+        loop = (await c.get("/api/loop/stats")).json()
+        fake1 = await _fake_stats(args)
+
+    endpoints = {}
+    for name, xs in sorted(rec.lat.items()):
+        endpoints[name] = {
+            "count": len(xs), "rps": round(len(xs) / elapsed, 2),
+            "p50_ms": round(_pct(xs, 50), 1), "p95_ms": round(_pct(xs, 95), 1), "p99_ms": round(_pct(xs, 99), 1),
+            "max_ms": round(max(xs), 1), "status": {str(k): v for k, v in rec.status[name].items()},
+        }
+    total = sum(len(xs) for xs in rec.lat.values())
+    return {
+        "guests": args.guests, "journeys_ok": rec.journeys_ok, "journeys_failed": rec.journeys_failed,
+        "elapsed_s": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 2),
+        "answer_cache_hits": rec.cache_hits,
+        "first_narration_ms": {"p50": round(_pct(rec.first_narration, 50), 1),
+                               "p95": round(_pct(rec.first_narration, 95), 1),
+                               "p99": round(_pct(rec.first_narration, 99), 1)},
+        "endpoints": endpoints,
+        "loop": loop,
+        "fake_azure": {k: v - fake0.get(k, 0) for k, v in fake1.items()
+                       if isinstance(v, int) and not k.startswith("live_")} if fake1 else None,
+    }
+
+
+async def _fake_stats(args) -> dict:
+    if not args.fake_url:
+        return {}
+    try:
+        async with httpx.AsyncClient(verify=args.fake_cert or True, timeout=5) as c:
+            return (await c.get(args.fake_url + "/_fake/stats")).json()
+    except Exception:
+        return {}
+
+
+def print_report(rep: dict):
+    print(f"{rep['guests']} guests ({rep['journeys_ok']} ok, {rep['journeys_failed']} failed) in "
+          f"{rep['elapsed_s']}s: {rep['requests']} requests, {rep['rps']} req/s, "
+          f"{rep['answer_cache_hits']} answer-cache hits")
+    print(f"{'endpoint':24s} {'count':>6s} {'req/s':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s}  status")
+    for name, e in rep["endpoints"].items():
+        print(f"{name:24s} {e['count']:6d} {e['rps']:7.1f} {e['p50_ms']:8.1f} {e['p95_ms']:8.1f} "
+              f"{e['p99_ms']:8.1f}  {e['status']}")
+    fn = rep["first_narration_ms"]
+    if fn["p50"]:
+        print(f"first narration (stream)  p50 {fn['p50']} ms  p95 {fn['p95']} ms  p99 {fn['p99']} ms")
+    lp = rep["loop"]
+    print(f"event-loop lag            p50 {lp.get('p50_ms')} ms  p95 {lp.get('p95_ms')} ms  p99 {lp.get('p99_ms')} ms"
+          f"  max {lp.get('max_lag_ms')} ms  blocked {lp.get('lag_ms_total')} ms total, "
+          f"{lp.get('over_warn')} stalls over warn")
+    if rep.get("fake_azure"):
+        print("fake azure:", rep["fake_azure"])
+
+
+# ---- subprocess wiring --------------------------------------------------------
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float, **kw):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"process exited with {proc.returncode} before {url} was ready")
+        try:
+            if httpx.get(url, timeout=1, **kw).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"timed out waiting for {url}")
+
+
+def spawn(args):
+    procs = []
+    cert_dir = tempfile.mkdtemp(prefix="harci-loadgen-")
+    fport = _free_port()
+    fake_cmd = [sys.executable, os.path.join(HERE, "fake_azure.py"), "--port", str(fport), "--cert-dir", cert_dir,
+                "--run-ms", str(args.run_ms), "--api-ms", str(args.api_ms), "--speech-ms", str(args.speech_ms),
+                "--rate-429", str(args.rate_429), "--error-rate", str(args.error_rate),
+                "--fail-rate", str(args.fail_rate)]
+    procs.append(subprocess.Popen(fake_cmd, stdout=subprocess.PIPE, text=True))
+    info = json.loads(procs[0].stdout.readline())
+    args.fake_url, args.fake_cert = info["url"], info["cert"]
+    _wait_ready(args.fake_url + "/_fake/stats", procs[0], 15, verify=args.fake_cert)
+
+    aport = _free_port()
+    args.admin_token = args.admin_token or "loadgen"
+    env = {**os.environ, "FAKE_AZURE_URL": args.fake_url, "SSL_CERT_FILE": args.fake_cert,
+           "REQUESTS_CA_BUNDLE": args.fake_cert, "ADMIN_TOKEN": args.admin_token,
+           "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"), "PYTHONPATH": ROOT}
+    app_cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(aport),
+               "--log-level", "warning", "--no-access-log"]
+    procs.append(subprocess.Popen(app_cmd, cwd=ROOT, env=env))
+    args.base_url = f"http://127.0.0.1:{aport}"
+    _wait_ready(args.base_url + "/healthz/ready", procs[1], 60)
+    return procs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--guests", type=int, default=100)
+    ap.add_argument("--arrival-rate", type=float, default=10.0, help="guests starting per second (0 = all at once)")
+    ap.add_argument("--chips", type=int, default=2, help="quick chips per guest")
+    ap.add_argument("--questions", type=int, default=2, help="free questions per guest")
+    ap.add_argument("--think-ms", type=float, default=3000, help="mean pause between turns")
+    ap.add_argument("--no-stream", action="store_true", help="use /assist/run instead of /assist/stream")
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--base-url", default=None, help="drive a running app instead of spawning one")
+    ap.add_argument("--admin-token", default=os.getenv("ADMIN_TOKEN", ""))
+    ap.add_argument("--fake-url", default=None, help="with --base-url: fake server to read /_fake/stats from")
+    ap.add_argument("--fake-cert", default=None)
+    ap.add_argument("--run-ms", type=float, default=2500, help="spawned fake: median run duration")
+    ap.add_argument("--api-ms", type=float, default=25, help="spawned fake: median Agents call latency")
+    ap.add_argument("--speech-ms", type=float, default=60, help="spawned fake: median Speech token latency")
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--json", default=None, help="also write the report here")
+    args = ap.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    procs = [] if args.base_url else spawn(args)
+    try:
+        rep = asyncio.run(run_load(args))
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+            try:
+                p.wait(10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+    print_report(rep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# scripts/startup_profile.py
+"""
+Cold-start profile of the app: where import time goes, and how long until the lifespan hook has
+run (i.e. uvicorn would start accepting connections).
+
+Each run is a fresh interpreter. One extra run uses `python -X importtime` and the script prints the
+slowest imports (cumulative, with their own self time), grouped by top-level package with --by-package.
+It also checks that the modules meant to load lazily (Azure SDK, redis, Jinja) are not imported by
+`import app.main`.
+
+Exit status is 1 when the median import+startup time exceeds --budget-ms or a lazy module was
+imported eagerly, so it can gate a CI step / image build; tests/test_startup_budget.py runs it
+under pytest:
+
+    python scripts/startup_profile.py
+    python scripts/startup_profile.py --runs 7 --budget-ms 1200 --top 30
+    python scripts/startup_profile.py --by-package --no-lifespan
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be in sys.modules right after `import app.main`
+LAZY_MODULES = ("azure.ai.projects", "azure.ai.agents", "azure.identity", "redis", "jinja2")
+
+_CHILD = r"""
+import sys, time, json, asyncio
+t0 = time.perf_counter()
+import app.main as m
+t1 = time.perf_counter()
+eager = [n for n in LAZY if n in sys.modules]
+t2 = t1
+if LIFESPAN:
+    async def _up():
+        async with m.lifespan(m.app):
+            return time.perf_counter()
+    t2 = asyncio.run(_up())
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "lifespan_ms": (t2 - t1) * 1000, "eager": eager}))
+"""
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def _measure(lifespan: bool) -> dict:
+    code = f"LAZY = {LAZY_MODULES!r}\nLIFESPAN = {lifespan!r}\n" + _CHILD
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_child_env(),
+                         capture_output=True, text=True)
+    wall = (time.perf_counter() - t0) * 1000
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        raise SystemExit(f"child process failed ({out.returncode})")
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    res["process_ms"] = wall
+    return res
+
+
+def _importtime() -> list:
+    """[(name, self_us, cumulative_us, depth)] from `-X importtime` for `import app.main`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                         cwd=ROOT, env=_child_env(), capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|")
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), depth))
+    return rows
+
+
+def _report_imports(rows: list, top: int, by_package: bool):
+    total = sum(r[1] for r in rows)
+    print(f"\n-X importtime: {len(rows)} modules, {total / 1000:.0f} ms self time in total")
+    if by_package:
+        pkgs = {}
+        for name, self_us, _, _ in rows:
+            pkg = name.split(".")[0]
+            n, t = pkgs.get(pkg, (0, 0))
+            pkgs[pkg] = (n + 1, t + self_us)
+        print(f"{'package':32s} {'modules':>8s} {'self ms':>9s} {'share':>7s}")
+        for pkg, (n, t) in sorted(pkgs.items(), key=lambda kv: -kv[1][1])[:top]:
+            print(f"{pkg:32s} {n:8d} {t / 1000:9.1f} {t / total:7.1%}")
+        return
+    print(f"{'module':56s} {'cum ms':>8s} {'self ms':>8s}")
+    for name, self_us, cum_us, depth in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"{('  ' * min(depth, 6) + name)[:56]:56s} {cum_us / 1000:8.1f} {self_us / 1000:8.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5, help="fresh-interpreter timing runs (median is reported)")
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")),
+                    help="fail when median import+startup exceeds this (env STARTUP_BUDGET_MS)")
+    ap.add_argument("--top", type=int, default=25, help="rows in the import table")
+    ap.add_argument("--by-package", action="store_true", help="aggregate import self time per top-level package")
+    ap.add_argument("--no-lifespan", action="store_true", help="time the import only, not the lifespan hook")
+    ap.add_argument("--json", action="store_true", help="print the timing summary as JSON only")
+    args = ap.parse_args()
+
+    runs = [_measure(not args.no_lifespan) for _ in range(max(1, args.runs))]
+    med = lambda k: statistics.median(r[k] for r in runs)  # noqa: E731
+    summary = {
+        "runs": len(runs),
+        "import_ms": round(med("import_ms"), 1),
+        "lifespan_ms": round(med("lifespan_ms"), 1),
+        "startup_ms": round(statistics.median(r["import_ms"] + r["lifespan_ms"] for r in runs), 1),
+        "process_ms": round(med("process_ms"), 1),
+        "budget_ms": args.budget_ms,
+        "eager_imports": sorted({n for r in runs for n in r["eager"]}),
+    }
+    summary["ok"] = summary["startup_ms"] <= args.budget_ms and not summary["eager_imports"]
+
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(f"startup (median of {len(runs)}): import {summary['import_ms']:.0f} ms + "
+              f"lifespan {summary['lifespan_ms']:.0f} ms = {summary['startup_ms']:.0f} ms "
+              f"(budget {args.budget_ms:.0f} ms); whole process {summary['process_ms']:.0f} ms")
+        if summary["eager_imports"]:
+            print("imported eagerly (should be lazy): " + ", ".join(summary["eager_imports"]))
+        _report_imports(_importtime(), args.top, args.by_package)
+        print("\nOK" if summary["ok"] else "\nFAIL")
+    sys.exit(0 if summary["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
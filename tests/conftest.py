@@ -0,0 +1,197 @@
+# tests/conftest.py
+"""
+Shared fixtures: app.main imported against a fake Agents backend.
+
+FakeAgentsClient stands in for the *sync* AIProjectClient, so every call goes through AgentOps'
+thread-pool path exactly as in a deployment without the aio SDK. Each call blocks for `call_secs`;
+a run ends `run_secs` after it was created (never, when run_secs is None) with `final_status`;
+only a completed run posts `reply`. Messages the app posts are kept in `posted` as (thread, role, content)
+and each run's additional_instructions on `runs[run_id]["instructions"]`. With stream=True it also has runs.stream, whose events interleave
+thread.run.step.* (RunStep objects, with their own ids) with the run's own, as the service does.
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.update({
+    "PROJECT_ENDPOINT": "https://fake.services.ai.azure.com/api/projects/test",
+    "AGENT_ID": "asst_test",
+    "AGENT_ASYNC_CLIENT": "0",
+    "AGENT_EAGER_INIT": "0",
+    "AGENT_RUN_TIMEOUT_SECS": "2",
+    "THREAD_POOL": "0",
+    "WELCOME_PREGEN": "0",
+    "LOG_INDEX": "0",
+    "EVENT_CONTENT_FILE": "",
+    "FAKE_AZURE_URL": "",
+    "TRANSCRIPT_DIR": tempfile.mkdtemp(prefix="harci-test-logs-"),
+})
+
+import httpx  # noqa: E402
+
+from app import main  # noqa: E402
+from app.agent_exec import AgentOps  # noqa: E402
+
+
+def _agent_message(mid: str, run_id: str, text: str):
+    return SimpleNamespace(id=mid, run_id=run_id, role=SimpleNamespace(name="AGENT"), content=text)
+
+
+class FakeAgentsClient:
+    def __init__(self, *, run_secs=0.3, call_secs=0.02, reply='{"narration": "Fresh answer.", "briefing_md": "### Fresh"}',
+                 stale_reply=None, final_status="completed", stream=False):
+        self.run_secs = run_secs
+        self.final_status = final_status
+        self.call_secs = call_secs
+        self.reply = reply
+        self.stale_reply = stale_reply   # an earlier agent answer already on every thread
+        self.threads = {}
+        self.runs = {}
+        self.posted = []
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.agents = SimpleNamespace(
+            threads=SimpleNamespace(create=self._create_thread, delete=self._delete_thread),
+            messages=SimpleNamespace(create=self._create_message, get=self._get_message, list=self._list_messages),
+            runs=SimpleNamespace(create=self._create_run, get=self._get_run, cancel=self._cancel_run,
+                                 list=self._list_runs),
+        )
+        if stream:
+            self.agents.runs.stream = self._stream_run
+
+    def _block(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.call_secs)
+
+    def _create_thread(self):
+        self._block()
+        with self._lock:
+            tid = f"thread_{next(self._ids)}"
+            msgs = [_agent_message(f"msg_{next(self._ids)}", "run_previous", self.stale_reply)] if self.stale_reply else []
+            self.threads[tid] = msgs
+        return SimpleNamespace(id=tid)
+
+    def _delete_thread(self, thread_id):
+        self._block()
+        self.threads.pop(thread_id, None)
+
+    def _create_message(self, thread_id, role="user", content=""):
+        self._block()
+        with self._lock:
+            self.posted.append((thread_id, role, content))
+        return SimpleNamespace(id=f"msg_{next(self._ids)}", role=SimpleNamespace(name=role.upper()), content=content)
+
+    def _get_message(self, thread_id, message_id):
+        self._block()
+        return next(m for m in self.threads[thread_id] if m.id == message_id)
+
+    def _list_messages(self, thread_id, limit=20, order=None):
+        self._block()
+        return list(reversed(self.threads.get(thread_id, [])))[:limit]
+
+    def _create_run(self, thread_id, agent_id, additional_instructions=None):
+        self._block()
+        with self._lock:
+            run = {"id": f"run_{next(self._ids)}", "thread_id": thread_id, "status": "in_progress", "t0": time.monotonic(),
+                   "instructions": additional_instructions}
+            self.runs[run["id"]] = run
+        return SimpleNamespace(id=run["id"], status=run["status"])
+
+    def _get_run(self, thread_id, run_id):
+        self._block()
+        with self._lock:
+            run = self.runs[run_id]
+            done = self.run_secs is not None and time.monotonic() - run["t0"] >= self.run_secs
+            if run["status"] == "in_progress" and done:
+                run["status"] = self.final_status
+                if self.final_status == "completed":
+                    self.threads[thread_id].append(_agent_message(f"msg_{next(self._ids)}", run_id, self.reply))
+        return SimpleNamespace(id=run_id, status=run["status"])
+
+    def _stream_run(self, thread_id, agent_id, additional_instructions=None):
+        run = self._create_run(thread_id, agent_id, additional_instructions)
+        return _FakeStream(self._stream_events(thread_id, run))
+
+    def _stream_events(self, thread_id, run):
+        step = SimpleNamespace(id=f"step_{next(self._ids)}", run_id=run.id, status="in_progress")
+        yield "thread.run.created", run
+        yield "thread.run.step.created", step
+        yield "thread.run.step.in_progress", step
+        deadline = time.monotonic() + 6   # never outlive the test run, even if nobody cancels
+        while run.status == "in_progress" and time.monotonic() < deadline:
+            time.sleep(0.02)
+            run = self._get_run(thread_id, run.id)
+        if run.status == "completed":
+            yield "thread.message.delta", SimpleNamespace(text=self.reply)
+        yield f"thread.run.step.{run.status}", SimpleNamespace(id=step.id, run_id=run.id, status=run.status)
+        yield f"thread.run.{run.status}", run
+
+    def _list_runs(self, thread_id, limit=20, order=None):
+        self._block()
+        ids = [rid for rid, run in self.runs.items() if run["thread_id"] == thread_id][::-1][:limit]
+        return [SimpleNamespace(id=rid, status=self.runs[rid]["status"]) for rid in ids]
+
+    def _cancel_run(self, thread_id, run_id):
+        self._block()
+        with self._lock:
+            if self.runs[run_id]["status"] == "in_progress":
+                self.runs[run_id]["status"] = "cancelled"
+        return SimpleNamespace(id=run_id, status=self.runs[run_id]["status"])
+
+
+class _FakeStream:
+    """Context manager + iterator of (event, data, raw), like the sync SDK's stream."""
+
+    def __init__(self, events):
+        self._events = events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._events.close()
+
+    def __iter__(self):
+        for ev, data in self._events:
+            yield ev, data, None
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    """Install a FakeAgentsClient as the app's Agents backend: `client = fake_agent(run_secs=...)`."""
+    if not main.AGENT_SDK_AVAILABLE:
+        pytest.skip("azure-ai-projects / azure-ai-agents not installed")
+    main._ANSWERS.invalidate()
+
+    def install(**kwargs) -> FakeAgentsClient:
+        client = FakeAgentsClient(**kwargs)
+        ops, agent = AgentOps(client, is_async=False), SimpleNamespace(id="asst_test")
+
+        async def get_ops():
+            return ops, agent
+        monkeypatch.setattr(main, "_get_agent_ops", get_ops)
+        return client
+    return install
+
+
+def post_all(requests):
+    """POST every (path, json) concurrently through the ASGI app. Returns (responses, elapsed seconds)."""
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://harci.test", timeout=30) as client:
+            t0 = time.perf_counter()
+            responses = await asyncio.gather(*(client.post(path, json=body) for path, body in requests))
+            return responses, time.perf_counter() - t0
+    return asyncio.run(go())
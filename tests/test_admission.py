@@ -0,0 +1,65 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from conftest import post_all
+from app import main
+from app.admission import AdmissionController, AdmissionRejected
+
+
+def test_freed_slots_go_round_robin_across_sessions():
+    async def go():
+        adm, granted = AdmissionController(limit=1, queue_max=10, max_wait=5), []
+        holder = adm.enter("x")
+
+        async def turn(sid, name):
+            t = adm.enter(sid)
+            await adm.wait(t)
+            granted.append(name)
+            await asyncio.sleep(0)
+            adm.release(t)
+        # guest A taps three chips before guest B asks once
+        tasks = [asyncio.create_task(turn(sid, name)) for sid, name in
+                 (("A", "a1"), ("A", "a2"), ("A", "a3"), ("B", "b1"))]
+        await asyncio.sleep(0.01)
+        waiting = adm.stats()
+        adm.release(holder)
+        await asyncio.gather(*tasks)
+        return adm, waiting, granted
+    adm, waiting, granted = asyncio.run(go())
+    assert waiting["waiting"] == 4 and waiting["sessions_waiting"] == 2
+    assert granted == ["a1", "b1", "a2", "a3"]
+    assert (adm.inflight, adm.waiting) == (0, 0)
+
+
+def test_full_queue_and_long_wait_are_shed():
+    async def go():
+        adm = AdmissionController(limit=1, queue_max=1, max_wait=0.05, retry_after=2.5)
+        holder = adm.enter("x")
+        waiter = adm.enter("A")
+        with pytest.raises(AdmissionRejected) as full:
+            adm.enter("B")
+        with pytest.raises(AdmissionRejected) as late:
+            await adm.wait(waiter)
+        adm.release(holder)
+        return adm, full.value, late.value
+    adm, full, late = asyncio.run(go())
+    assert (full.reason, full.retry_after) == ("queue_full", 2.5)
+    assert late.reason == "timeout"
+    assert adm.counters["shed_full"] == 1 and adm.counters["shed_timeout"] == 1
+    assert (adm.inflight, adm.waiting) == (0, 0)
+
+
+def test_shed_turn_gets_the_busy_payload_and_retry_after(fake_agent, monkeypatch):
+    fake_agent(run_secs=0.3)
+    monkeypatch.setattr(main, "_ADMISSION", AdmissionController(limit=1, queue_max=0, retry_after=2.5))
+    responses, _ = post_all([("/assist/run", {"text": "first question"}),
+                             ("/assist/run", {"text": "second question"})])
+
+    assert [r.status_code for r in responses] == [200, 200]
+    shed = [r for r in responses if r.json().get("busy")]
+    answered = [r for r in responses if not r.json().get("busy")]
+    assert len(shed) == 1 and len(answered) == 1
+    assert shed[0].json()["retry_after"] == 2.5 and shed[0].headers["Retry-After"] == "3"
+    assert answered[0].json()["narration"] == "Fresh answer." and "Retry-After" not in answered[0].headers
@@ -0,0 +1,15 @@
+# tests/test_agent_concurrency.py
+from conftest import post_all
+
+RUN_SECS = 0.5
+GUESTS = 8
+
+
+def test_concurrent_runs_overlap(fake_agent):
+    # Every SDK call blocks its thread; on the event loop these turns would take GUESTS x RUN_SECS or more
+    fake_agent(run_secs=RUN_SECS, call_secs=0.05)
+    responses, elapsed = post_all([("/assist/run", {"text": f"question {i}"}) for i in range(GUESTS)])
+
+    assert [r.status_code for r in responses] == [200] * GUESTS
+    assert all(r.json()["narration"] == "Fresh answer." for r in responses)
+    assert elapsed < GUESTS * RUN_SECS / 3, f"{GUESTS} turns took {elapsed:.2f}s"
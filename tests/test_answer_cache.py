@@ -0,0 +1,30 @@
+# tests/test_answer_cache.py
+import pytest
+
+from conftest import post_all
+from app import main
+
+STALE = '{"narration": "Your previous answer.", "briefing_md": "### Stale"}'
+
+
+def _cached(prompt):
+    return main._ANSWERS.get(main._answer_key(prompt))
+
+
+def test_completed_run_fills_the_cache(fake_agent):
+    fake_agent(run_secs=0.1, call_secs=0, stale_reply=STALE)
+    (r,), _ = post_all([("/assist/run", {"text": "Agenda"})])
+    assert r.json()["narration"] == "Fresh answer."
+    assert _cached("Agenda")["narration"] == "Fresh answer."
+
+
+@pytest.mark.parametrize("run_secs, final_status", [(None, "completed"), (0.1, "expired"), (0.1, "cancelled")])
+def test_unfinished_run_does_not_fill_the_cache(fake_agent, run_secs, final_status):
+    # The run times out or ends without an answer; the newest agent message on the thread is an earlier one
+    fake_agent(run_secs=run_secs, call_secs=0, stale_reply=STALE, final_status=final_status)
+    (r,), _ = post_all([("/assist/run", {"text": "Agenda"})])
+
+    assert r.status_code == 200
+    assert r.json()["narration"] != "Your previous answer."
+    assert _cached("Agenda") is None
+    assert main._answer_key("Agenda") not in main._ANSWERS._inflight   # claim released
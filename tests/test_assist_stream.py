@@ -0,0 +1,25 @@
+# tests/test_assist_stream.py
+import json
+import time
+
+from conftest import post_all
+
+
+def _final(response):
+    return [json.loads(line) for line in response.text.splitlines()][-1]
+
+
+def test_stream_answers_from_deltas(fake_agent):
+    fake_agent(run_secs=0.1, call_secs=0, stream=True)
+    (r,), _ = post_all([("/assist/stream", {"text": "question"})])
+    assert _final(r)["narration"] == "Fresh answer."
+
+
+def test_stream_deadline_cancels_the_run_not_a_step(fake_agent):
+    # Step events arrive after the run's own; the deadline must still cancel the run itself
+    client = fake_agent(run_secs=None, call_secs=0, stream=True)
+    (r,), _ = post_all([("/assist/stream", {"text": "question"})])
+    assert _final(r)["narration"] != "Fresh answer."
+
+    time.sleep(0.3)   # the cancel is fire-and-forget
+    assert [run["status"] for run in client.runs.values()] == ["cancelled"]
@@ -0,0 +1,17 @@
+# tests/test_config_reload.py
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+def test_reload_rebuilds_knowledge_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    loaded_on = []
+    monkeypatch.setattr(main._KNOWLEDGE, "load", lambda path=None: loaded_on.append(threading.current_thread()))
+
+    r = TestClient(main.app).post("/api/admin/config/reload", headers={"x-admin-token": "secret"})
+    assert r.status_code == 200 and r.json()["ok"]
+    assert len(loaded_on) == 1
+    assert loaded_on[0].name.startswith("asyncio_")   # the default executor, not the loop's thread
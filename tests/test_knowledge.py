@@ -0,0 +1,50 @@
+# tests/test_knowledge.py
+import os
+
+import pytest
+
+from conftest import ROOT
+from app.knowledge import KnowledgeIndex
+
+EXAMPLE = os.path.join(ROOT, "app", "content", "event.example.yaml")
+
+
+@pytest.fixture
+def index():
+    pytest.importorskip("yaml")
+    idx = KnowledgeIndex(EXAMPLE, min_confidence=0.75, min_margin=0.15, fallback_confidence=0.4)
+    assert idx.load() > 0
+    return idx
+
+
+def test_confident_match_is_answered_locally(index):
+    found = index.answer("Where are the restrooms?")
+    assert found is not None and "next to the lifts" in found["narration"] + found["briefing_md"]
+    assert index.counters["hits"] == 1
+
+
+def test_ambiguous_query_goes_to_the_agent_but_serves_as_fallback(index):
+    # The Main Lobby is both the registration room and next to the cloakroom: no clear winner
+    doc, confidence, margin = index.search("Main Lobby")
+    assert confidence >= index.min_confidence and margin < index.min_margin
+    assert index.answer("Main Lobby") is None
+    assert index.counters["ambiguous"] == 1
+    assert index.answer("Main Lobby", fallback=True) == doc.payload
+    assert index.counters["fallback_hits"] == 1
+
+
+def test_unknown_terms_are_left_to_the_agent(index):
+    assert index.answer("Where can I find parking?") is None
+    assert index.answer("Where can I find parking?", fallback=True) is None
+    assert index.counters["no_match"] == 2
+    # known words don't carry a question about something the content never mentions
+    assert index.answer("parking near Hall A") is None
+    assert index.answer("parking near Hall A", fallback=True) is None
+    assert index.counters["low_confidence"] == 2
+
+
+def test_partial_match_is_only_used_as_fallback(index):
+    assert index.answer("Where is Dana Whitfield speaking") is None
+    assert index.counters["low_confidence"] == 1
+    found = index.answer("Where is Dana Whitfield speaking", fallback=True)
+    assert found is not None and "Dana" in found["narration"]
@@ -0,0 +1,90 @@
+# tests/test_log_index.py
+import os
+
+import pytest
+
+from app import log_index
+from app.log_index import LogIndex
+from app.transcripts import _render_json, _render_text, feedback_record, turn_record
+
+
+def _turn(sid, text, source="agent", ms=120.0):
+    return turn_record(sid, "Ann", text, f"About {text}.", "### Brief", source, ms)
+
+
+def _append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def logs(tmp_path):
+    d = tmp_path / "logs"
+    d.mkdir()
+    _append(d / "SessLog_s1.txt", _render_text(_turn("s1", "Where is lunch?")) + _render_text(_turn("s1", "Agenda")))
+    _append(d / "SessLog_s2.jsonl", _render_json(_turn("s2", "Agenda", "cache", 3.0))
+            + _render_json(_turn("s2", "Wifi password", "knowledge", 1.0)))
+    _append(d / "Feedback_s1.txt", _render_text(feedback_record("s1", "Ann", "Great demo")))
+    return str(d), str(tmp_path / "index")
+
+
+def test_update_reads_only_what_was_appended(logs):
+    d, index_dir = logs
+    idx = LogIndex(d, index_dir)
+    first = idx.update()
+    assert (first["turns"], first["feedback"], first["files_changed"]) == (4, 1, 3)
+    again = idx.update()
+    assert (again["turns"], again["files_changed"], again["bytes"]) == (0, 0, 0)
+
+    _append(os.path.join(d, "SessLog_s1.txt"), _render_text(_turn("s1", "Agenda")))
+    _append(os.path.join(d, "SessLog_s2.jsonl"), _render_json(_turn("s2", "Where is lunch?", "busy")))
+    more = idx.update()
+    assert (more["turns"], more["files_changed"]) == (2, 2)
+
+    reopened = LogIndex(d, index_dir)
+    assert reopened.update()["turns"] == 0
+    s = reopened.summary()
+    assert (s["turns"], s["sessions"], s["feedback"]) == (6, 2, 1)
+    assert s["sources"] == {"unknown": 3, "cache": 1, "knowledge": 1, "busy": 1}   # text logs carry no source
+    top = {r["question"]: r["count"] for r in reopened.top_questions()}
+    assert top["agenda"] == 3 and top["where is lunch"] == 2
+
+
+def test_partial_records_are_held_back_until_complete(logs):
+    d, index_dir = logs
+    idx = LogIndex(d, index_dir)
+    idx.update()
+    text, line = _render_text(_turn("s1", "Closing time")), _render_json(_turn("s2", "Closing time"))
+    _append(os.path.join(d, "SessLog_s1.txt"), text[:-12])       # the writer is mid-record
+    _append(os.path.join(d, "SessLog_s2.jsonl"), line[:-10])
+    assert idx.update()["turns"] == 0
+
+    _append(os.path.join(d, "SessLog_s1.txt"), text[-12:])
+    _append(os.path.join(d, "SessLog_s2.jsonl"), line[-10:])
+    assert idx.update()["turns"] == 2
+    assert LogIndex(d, index_dir).summary()["turns"] == 6
+    assert {r["question"]: r["count"] for r in idx.top_questions()}["closing time"] == 2
+
+
+def test_interrupted_update_is_rolled_back_and_not_counted_twice(logs, monkeypatch):
+    d, index_dir = logs
+    LogIndex(d, index_dir).update()
+    _append(os.path.join(d, "SessLog_s2.jsonl"), _render_json(_turn("s3", "Parking")))
+
+    # Crash after the columns and dictionaries were appended, before meta.json is replaced
+    def crash(*_):
+        raise OSError("disk full")
+    monkeypatch.setattr(log_index.os, "replace", crash)
+    idx = LogIndex(d, index_dir)
+    with pytest.raises(OSError):
+        idx.update()
+    monkeypatch.undo()
+    assert os.path.getsize(os.path.join(index_dir, "turns.ts.f64")) == 5 * 8     # 4 committed + 1 orphan row
+    assert idx.summary()["turns"] == 4                                          # state is back to the last commit
+
+    reopened = LogIndex(d, index_dir)
+    assert reopened.update()["turns"] == 1
+    s = reopened.summary()
+    assert (s["turns"], s["sessions"]) == (5, 3)
+    assert os.path.getsize(os.path.join(index_dir, "turns.ts.f64")) == 5 * 8     # orphan truncated, not doubled
+    assert reopened.session("s3")["turns"][0]["question"] == "parking"
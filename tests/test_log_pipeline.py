@@ -0,0 +1,19 @@
+# tests/test_log_pipeline.py
+import queue
+import logging
+
+from app.log_pipeline import BoundedQueueHandler
+
+
+def test_args_are_merged_at_call_time():
+    q = queue.Queue()
+    log = logging.getLogger("harci.test.prepare")
+    log.propagate = False
+    log.addHandler(BoundedQueueHandler(q))
+    state = {"status": "queued"}
+    log.warning("run state %s", state)
+    state["status"] = "completed"   # changed before the listener formats the record
+
+    record = q.get_nowait()
+    assert record.getMessage() == "run state {'status': 'queued'}"
+    assert record.args is None
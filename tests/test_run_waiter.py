@@ -0,0 +1,88 @@
+# tests/test_run_waiter.py
+import asyncio
+
+import pytest
+
+from conftest import FakeAgentsClient
+from app import run_waiter
+from app.agent_exec import AgentOps
+from app.run_waiter import AutoWaiter, RunExpired, get_waiter
+
+
+@pytest.mark.parametrize("mode", ["shared", "backoff", "auto"])
+def test_deadline_raises_and_cancels(mode):
+    client = FakeAgentsClient(run_secs=None, call_secs=0)
+    ops = AgentOps(client, is_async=False)
+
+    async def go():
+        with pytest.raises(RunExpired) as err:
+            await get_waiter(mode).run(ops, client._create_thread().id, "asst_test", timeout=0.3)
+        await asyncio.sleep(0.1)   # the cancel is fire-and-forget
+        return err.value.run
+    run = asyncio.run(go())
+    assert client.runs[run.id]["status"] == "cancelled"
+
+
+def test_stream_errors_pause_streaming_instead_of_disabling_it(monkeypatch):
+    monkeypatch.setattr(run_waiter, "RUN_STREAM_MAX_FAILURES", 2)
+    monkeypatch.setattr(run_waiter, "RUN_STREAM_RETRY_SECS", 0.2)
+    client = FakeAgentsClient(run_secs=0, call_secs=0)
+    attempts = []
+
+    def broken_stream(**kwargs):
+        attempts.append(kwargs)
+        raise TypeError("bug in our event handling")
+    client.agents.runs.stream = broken_stream
+    ops = AgentOps(client, is_async=False)
+    waiter = AutoWaiter()
+
+    async def go():
+        tid = client._create_thread().id
+        for _ in range(3):   # two failures pause streaming; the third run polls without trying
+            assert run_waiter.run_status(await waiter.run(ops, tid, "asst_test", timeout=2)) == "completed"
+        assert len(attempts) == 2
+        await asyncio.sleep(0.25)
+        await waiter.run(ops, tid, "asst_test", timeout=2)
+        assert len(attempts) == 3
+    asyncio.run(go())
+
+
+def test_sdk_without_stream_uses_poller():
+    client = FakeAgentsClient(run_secs=0, call_secs=0)
+    ops = AgentOps(client, is_async=False)
+    assert not ops.can_stream
+
+    async def go():
+        return await AutoWaiter().run(ops, client._create_thread().id, "asst_test", timeout=2)
+    assert run_waiter.run_status(asyncio.run(go())) == "completed"
+
+
+def test_stream_deadline_expires_the_run_not_a_step():
+    # The fake stream sends thread.run.step.* events (RunSteps, own ids) after the run's own events
+    client = FakeAgentsClient(run_secs=None, call_secs=0, stream=True)
+    ops = AgentOps(client, is_async=False)
+
+    async def go():
+        with pytest.raises(RunExpired) as err:
+            await get_waiter("stream").run(ops, client._create_thread().id, "asst_test", timeout=0.3)
+        await asyncio.sleep(0.1)
+        return err.value.run
+    run = asyncio.run(go())
+    assert run.id in client.runs
+    assert client.runs[run.id]["status"] == "cancelled"
+
+
+def test_stream_failing_after_creating_the_run_reuses_it():
+    client = FakeAgentsClient(run_secs=0.2, call_secs=0)
+
+    def stream_then_drop(**kwargs):
+        client._create_run(**kwargs)
+        raise ConnectionError("stream dropped before the first event")
+    client.agents.runs.stream = stream_then_drop
+    ops = AgentOps(client, is_async=False)
+
+    async def go():
+        return await AutoWaiter().run(ops, client._create_thread().id, "asst_test", timeout=2)
+    run = asyncio.run(go())
+    assert run_waiter.run_status(run) == "completed"
+    assert list(client.runs) == [run.id]   # polled the run the stream created; no second run
@@ -0,0 +1,141 @@
+# tests/test_session_store.py
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import session_store
+from app.session_store import MemorySessionStore, RedisSessionStore, Session
+
+fakeredis = pytest.importorskip("fakeredis")   # test-only dependency for the Redis store
+
+
+def _sess(sid: str, secs: float = 600, active: bool = True) -> Session:
+    now = datetime.utcnow()
+    return Session(sid=sid, name="Ann", company="ACME", created_at=now, last_active=now,
+                   expires_at=now + timedelta(seconds=secs), active=active)
+
+
+# -- memory ---------------------------------------------------------------------
+def test_memory_store_evicts_inactive_first_then_least_recently_used():
+    async def go():
+        store = MemorySessionStore(max_sessions=3)
+        await store.save(_sess("a"))
+        await store.save(_sess("b", active=False))
+        await store.save(_sess("c"))
+        await store.get("a")                      # a is now more recent than c
+        await store.save(_sess("d"))              # full: the inactive one goes, although newer than a
+        first = set(store._sessions)
+        await store.save(_sess("e"))              # no inactive left: least recently used overall
+        return store, first, set(store._sessions)
+    store, first, second = asyncio.run(go())
+    assert first == {"a", "c", "d"}
+    assert second == {"a", "d", "e"}
+    assert store.counters["evicted"] == 2 and store.counters["evicted_active"] == 1
+
+
+def test_memory_store_sweeps_expired_and_requeues_slid_sessions():
+    async def go():
+        store = MemorySessionStore(max_sessions=0)
+        await store.save(_sess("gone", secs=-1))
+        slid = _sess("slid", secs=-1)
+        await store.save(slid)
+        slid.expires_at = datetime.utcnow() + timedelta(minutes=5)   # slid on the shared object, not re-saved
+        await store.save(_sess("live"))
+        n = await store.sweep()
+        return store, n
+    store, n = asyncio.run(go())
+    assert n == 1 and set(store._sessions) == {"slid", "live"}
+    assert store.counters["expired"] == 1
+    assert store._due["slid"] > datetime.utcnow()     # back in the heap under its new expiry
+
+
+# -- redis ----------------------------------------------------------------------
+@pytest.fixture
+def redis_store():
+    server = fakeredis.FakeServer()
+    store = RedisSessionStore(client=fakeredis.FakeAsyncRedis(server=server), prefix="t:")
+    return store, fakeredis.FakeRedis(server=server)
+
+
+def test_redis_update_merges_fields_from_stale_copies(redis_store):
+    store, _ = redis_store
+
+    async def go():
+        await store.save(_sess("s1"))
+        a, b = await store.get("s1"), await store.get("s1")
+        a.agent_thread_id = "thread_1"
+        b.active = False
+        await store.update(a, ["agent_thread_id"])
+        await store.update(b, ["active"])          # b still holds the old thread id; must not write it
+        return await store.get("s1")
+    got = asyncio.run(go())
+    assert got.agent_thread_id == "thread_1" and got.active is False
+
+
+def test_redis_update_retries_when_the_watched_key_changes(redis_store, monkeypatch):
+    store, other = redis_store
+    decode = RedisSessionStore._decode
+    raced = []
+
+    def racing_decode(raw):
+        sess = decode(raw)
+        if sess and not raced:                     # another worker writes between WATCH and EXEC
+            raced.append(1)
+            sess2 = decode(raw)
+            sess2.agent_thread_id = "thread_other"
+            other.set("t:s1", sess2.to_json(), ex=600)
+        return sess
+    monkeypatch.setattr(store, "_decode", racing_decode)
+
+    async def go():
+        await store.save(_sess("s1"))
+        mine = _sess("s1")
+        mine.thread_turns = 7
+        await store.update(mine, ["thread_turns"])
+        monkeypatch.undo()
+        return await store.get("s1")
+    got = asyncio.run(go())
+    assert raced
+    assert got.thread_turns == 7 and got.agent_thread_id == "thread_other"   # retried on top of the race
+
+
+def test_redis_ttl_and_expiry_index(redis_store, monkeypatch):
+    store, other = redis_store
+
+    async def go():
+        await store.save(_sess("s1", secs=30))
+        await store.save(_sess("s2", secs=300))
+        await store.save(_sess("gone", secs=-5))    # already expired: not written at all
+        live = await store.count()
+        ttls = other.ttl("t:s1"), other.ttl("t:s2")
+        real = time.time
+        monkeypatch.setattr(session_store.time, "time", lambda: real() + 60)
+        later = await store.count()                 # s1's index entry is trimmed by score
+        await store.update(_sess("gone"), ["active"])   # no record: update is a no-op
+        monkeypatch.undo()
+        return live, later, ttls
+    live, later, (ttl1, ttl2) = asyncio.run(go())
+    assert (live, later) == (2, 1)
+    assert 0 < ttl1 <= 30 and 270 < ttl2 <= 300
+    assert other.get("t:gone") is None
+    assert [m.decode() for m in other.zrange("t:index", 0, -1)] == ["s2"]
+
+
+def test_memory_store_removals_are_exported_on_metrics(monkeypatch):
+    from app import main
+
+    async def go():
+        store = MemorySessionStore(max_sessions=1)
+        await store.save(_sess("a", secs=-1, active=False))
+        await store.save(_sess("b"))               # evicts a
+        await store.save(_sess("c", secs=-1))       # evicts b (active)
+        await store.sweep()                         # c expired
+        monkeypatch.setattr(main, "_SESSIONS", store)
+        return await main.REGISTRY.render()
+    text = asyncio.run(go())
+    assert "# TYPE harci_sessions_removed_total counter" in text
+    assert 'harci_sessions_removed_total{reason="expired"} 1' in text
+    assert 'harci_sessions_removed_total{reason="evicted"} 2' in text
+    assert 'harci_sessions_removed_total{reason="evicted_active"} 1' in text
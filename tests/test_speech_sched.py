@@ -0,0 +1,46 @@
+# tests/test_speech_sched.py
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+from app import main
+from app.speech_sched import HALF_OPEN, OPEN, SpeechResource, SpeechScheduler
+from app.token_cache import CredentialCache
+
+
+def test_half_open_probe_answered_with_4xx_is_probed_again(monkeypatch):
+    res = SpeechResource("westeurope", "k1", "we:k1")
+    sched = SpeechScheduler([res])
+    sched._trip(res, 0.0)
+    res.open_until = 0.0                       # cooldown over
+    assert sched.due_probes() == [res] and res.state == HALF_OPEN
+
+    sched.begin(res)
+    sched.record(res, 20.0, 401)               # probe gets a caller-side error
+    assert res.state == OPEN and not res.probing
+
+    res.open_until = 0.0
+    assert sched.due_probes() == [res]         # not stuck at probing=True
+
+
+def test_transport_error_moves_the_token_to_the_next_resource(monkeypatch):
+    bad, good = SpeechResource("westeurope", "k1", "we:k1"), SpeechResource("northeurope", "k2", "ne:k2")
+    monkeypatch.setattr(main, "_sched", SpeechScheduler([bad, good], mode="least"))
+    bad.latency_ewma, good.latency_ewma = 10.0, 500.0   # the failing resource is picked first
+
+    async def request(region, method, url, **kw):
+        if region == "westeurope":
+            raise httpx.ConnectError("connection refused")
+        return SimpleNamespace(status_code=200, text="tok-ne")
+    monkeypatch.setattr(main, "http_pool", SimpleNamespace(request=request))
+
+    async def go():
+        cache = CredentialCache("speech-token", main._fetch_speech_token, min_ttl_left=60, refresh_ahead=120)
+        try:
+            return await main._scheduled_token(cache, "sid-1")
+        finally:
+            cache.close()
+    res, entry = asyncio.run(go())
+    assert res is good and entry.value == "tok-ne"
+    assert bad.consecutive_failures == 1 and bad.state != OPEN   # one failure: not yet tripped, still avoided
@@ -0,0 +1,20 @@
+# tests/test_startup_budget.py
+import os
+import sys
+import json
+import subprocess
+
+from conftest import ROOT
+
+BUDGET_MS = os.getenv("STARTUP_BUDGET_MS", "1500")
+
+
+def test_cold_start_within_budget():
+    out = subprocess.run([sys.executable, os.path.join(ROOT, "scripts", "startup_profile.py"),
+                          "--runs", "3", "--json", "--budget-ms", BUDGET_MS],
+                         cwd=ROOT, capture_output=True, text=True, timeout=300)
+    assert out.stdout.strip(), out.stderr
+    summary = json.loads(out.stdout.strip().splitlines()[-1])
+    assert not summary["eager_imports"], f"imported at startup, should be lazy: {summary['eager_imports']}"
+    assert summary["startup_ms"] <= summary["budget_ms"], f"cold start {summary['startup_ms']} ms over budget"
+    assert out.returncode == 0
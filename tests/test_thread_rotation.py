@@ -0,0 +1,60 @@
+# tests/test_thread_rotation.py
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app import main
+from app import thread_context
+from app.session_store import Session
+
+QUESTIONS = ["Where is the keynote?", "When is lunch?", "Who speaks on the energy panel?"]
+
+
+def _ask_in_turn(sid, questions, before_last=None):
+    """Sequential turns on one event loop, so the background rotation between them gets to run."""
+    async def go():
+        now = datetime.utcnow()
+        await main._SESSIONS.save(Session(sid=sid, name="Ann Lee", company="ACME", created_at=now,
+                                          last_active=now, expires_at=now + timedelta(hours=1)))
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://harci.test", timeout=30) as client:
+            for i, q in enumerate(questions):
+                if before_last and i == len(questions) - 1:
+                    await asyncio.gather(*filter(None, [main._THREAD_SYNC.get(sid)]))
+                    before_last()
+                r = await client.post("/assist/run", json={"text": q, "session_id": sid})
+                assert r.status_code == 200 and r.json()["narration"] == "Fresh answer."
+        pending = main._THREAD_SYNC.get(sid)
+        if pending is not None:
+            await pending
+        return await main._SESSIONS.get(sid)
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("limit, value, rotate_after", [("THREAD_MAX_TURNS", 2, 2), ("THREAD_MAX_TOKENS", 1, 1)])
+def test_long_thread_is_rotated_with_a_recap(fake_agent, monkeypatch, limit, value, rotate_after):
+    monkeypatch.setattr(thread_context, "THREAD_MAX_TURNS", 100)
+    monkeypatch.setattr(thread_context, "THREAD_MAX_TOKENS", 10 ** 6)
+    monkeypatch.setattr(thread_context, limit, value)
+    fake = fake_agent(run_secs=0.05, call_secs=0.001)
+    sid = f"rotate-{limit.lower()}"
+    questions = QUESTIONS[:rotate_after + 1]
+
+    # The preamble goes out again on the new thread, which alone would cross a 1-token limit: once the
+    # rotation is done, lift it so the last turn doesn't rotate as well
+    lift = (lambda: monkeypatch.setattr(thread_context, limit, 10 ** 6)) if limit == "THREAD_MAX_TOKENS" else None
+    sess = _ask_in_turn(sid, questions, before_last=lift)
+
+    runs = list(fake.runs.values())
+    old, new = runs[0]["thread_id"], runs[-1]["thread_id"]
+    assert new != old and old not in fake.threads                          # the next turn moved; old thread deleted
+    assert {r["thread_id"] for r in runs[:rotate_after]} == {old}
+    recap = [c for t, role, c in fake.posted if t == new and role == "assistant"]
+    assert len(recap) == 1 and all(q in recap[0] for q in questions[:rotate_after])
+    assert fake.posted.index((new, "assistant", recap[0])) < fake.posted.index((new, "user", questions[-1]))
+    # agent_ctx_seeded was cleared: the first run on the new thread carries the preamble again
+    assert runs[0]["instructions"] and runs[-1]["instructions"]
+    assert all(not r["instructions"] for r in runs[1:rotate_after])
+    assert sess.agent_thread_id == new and sess.thread_rotations == 1 and sess.thread_turns == 1
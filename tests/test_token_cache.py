@@ -0,0 +1,25 @@
+# tests/test_token_cache.py
+import asyncio
+
+from app.token_cache import CredentialCache
+
+
+def test_short_ttl_is_cached_and_not_refreshed_every_second():
+    fetches = []
+
+    async def fetch(_ctx):
+        fetches.append(1)
+        return f"token-{len(fetches)}", 4.0   # shorter than both margins below
+
+    async def go():
+        cache = CredentialCache("test", fetch, min_ttl_left=60, refresh_ahead=120)
+        first = await cache.get("k")
+        for _ in range(5):
+            assert (await cache.get("k")) is first
+        await asyncio.sleep(1.5)   # capped refresh-ahead: renewal at TTL/2, not every second
+        n = len(fetches)
+        cache.close()
+        return cache, n
+    cache, n = asyncio.run(go())
+    assert cache.counters["hits"] == 5
+    assert n == 1
@@ -0,0 +1,61 @@
+# tests/test_turns.py
+import asyncio
+
+import pytest
+
+from app.turns import TurnCoordinator, TurnSuperseded
+
+
+def _work(log, name, secs=0.1):
+    async def work(turn):
+        log.append(f"{name} start")
+        try:
+            await asyncio.sleep(secs)
+        finally:
+            log.append(f"{name} end")
+        return name
+    return work
+
+
+def test_latest_turn_wins_and_runs_after_the_superseded_one_settles():
+    async def go():
+        turns, log = TurnCoordinator(mode="latest"), []
+        first, _ = turns.start("s1", "r1", "run", _work(log, "first", 5))
+        await asyncio.sleep(0.02)
+        second, _ = turns.start("s1", "r2", "run", _work(log, "second"))
+        with pytest.raises(TurnSuperseded):
+            await first.result()
+        return turns, log, await second.result()
+    turns, log, result = asyncio.run(go())
+    assert result == "second"
+    assert log == ["first start", "first end", "second start", "second end"]   # never overlapping on the thread
+    assert turns.counters["superseded"] == 1 and turns.stats()["sessions"] == 0
+
+
+def test_queue_mode_runs_both_turns_in_order():
+    async def go():
+        turns, log = TurnCoordinator(mode="queue"), []
+        first, _ = turns.start("s1", "r1", "run", _work(log, "first"))
+        second, _ = turns.start("s1", "r2", "run", _work(log, "second"))
+        return turns, log, await first.result(), await second.result()
+    turns, log, *results = asyncio.run(go())
+    assert results == ["first", "second"] and turns.counters["queued"] == 1
+    assert log == ["first start", "first end", "second start", "second end"]
+
+
+def test_same_request_id_joins_the_turn_instead_of_running_again():
+    async def go():
+        turns, log = TurnCoordinator(mode="latest"), []
+        first, joined1 = turns.start("s1", "tap-1", "run", _work(log, "first"))
+        dup, joined2 = turns.start("s1", "tap-1", "run", _work(log, "dup"))
+        r1, r2 = await first.result(), await dup.result()
+        late, joined3 = turns.start("s1", "tap-1", "run", _work(log, "late"))     # finished, within the TTL
+        other, joined4 = turns.start("s1", "tap-1", "stream", _work(log, "other"))  # different kind: its own turn
+        await other.result()
+        return turns, log, (first, dup, late), (joined1, joined2, joined3, joined4), (r1, r2)
+    turns, log, (first, dup, late), joined, results = asyncio.run(go())
+    assert dup is first and late is first
+    assert joined == (False, True, True, False)
+    assert results == ("first", "first")
+    assert log == ["first start", "first end", "other start", "other end"]
+    assert turns.counters["coalesced"] == 2 and turns.counters["superseded"] == 0
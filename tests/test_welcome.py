@@ -0,0 +1,29 @@
+# tests/test_welcome.py
+import pytest
+
+from app import main
+
+
+@pytest.fixture(autouse=True)
+def no_skeleton(monkeypatch):
+    monkeypatch.setattr(main, "_WELCOME_SKELETON", None)
+
+
+def test_full_name_greeting_becomes_the_template():
+    main._remember_skeleton("Ada Lovelace", {"narration": "Welcome, Ada Lovelace!", "briefing_md": "### Hi Ada Lovelace"})
+    assert main._template_welcome("Alan Turing") == {"narration": "Welcome, Alan Turing!", "briefing_md": "### Hi Alan Turing"}
+
+
+def test_first_name_greeting_is_not_reused_for_other_guests():
+    main._remember_skeleton("Ada Lovelace", {"narration": "Welcome, Ada!", "briefing_md": "### Enjoy the event, Ada"})
+    assert main._WELCOME_SKELETON is None
+    welcome = main._template_welcome("Alan Turing")
+    assert welcome == main._fallback_welcome("Alan Turing")
+    assert "Ada" not in welcome["narration"] + welcome["briefing_md"]
+
+
+def test_greeting_that_also_uses_a_first_name_is_not_reused():
+    main._remember_skeleton("Ann Lee", {"narration": "Welcome Ann Lee! Ann, you'll love the keynote.",
+                                        "briefing_md": "### Welcome Ann Lee"})
+    assert main._WELCOME_SKELETON is None
+    assert "Ann" not in main._template_welcome("Bo Chen")["narration"]